@@ -59,6 +59,7 @@ def create_app(config_name=None):
             "*",  # 允許所有來源（開發環境）
         ],
         async_mode="threading",  # 使用 threading 模式，更兼容
+        message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE"),  # 跨行程推播（匯入腳本）
         logger=True,  # 啟用 Socket.IO 日誌
         engineio_logger=True,  # 啟用 Engine.IO 日誌
         ping_timeout=60,
@@ -0,0 +1,303 @@
+"""
+向量化回測 - 以選股器的條件語法定義進出場，在 股票 × 交易日 矩陣上一次模擬
+
+策略（POST /api/stocks/backtest 的 JSON）：
+    entry           進場條件，如 "sma20 crosses above sma50 and rsi14 < 70"
+    exit            出場條件；省略時進場條件不成立即出場
+    position_size   每個部位占權益的比例；省略時持有中的部位等權重
+    initial_capital 初始資金
+    commission      手續費率（買賣皆收）
+    tax             交易稅率（賣出時收）
+
+訊號於當日收盤判斷並以收盤價成交，次一交易日起計入報酬。每日依目標權重
+再平衡，成本以目標權重的變動計算（價格漂移造成的權重變化不計成本）。
+模擬在行程池中執行，不佔用 Socket.IO 伺服器的執行緒；工作紀錄保存在
+行程內，多個 worker 部署時查詢需回到同一個行程。
+"""
+import math
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+
+from .correlation import daily_returns
+from .indicators import forward_fill
+from .price_cache import load_price_panel
+from .screener import CROSSES, FIELDS, compare, parse_filter, term_matrix
+
+TRADING_DAYS_PER_YEAR = 252
+MAX_TRADES = 1000  # 回傳的交易明細上限
+
+DEFAULT_COMMISSION = 0.001425
+DEFAULT_TAX = 0.003
+DEFAULT_CAPITAL = 1_000_000
+
+Strategy = namedtuple(
+    "Strategy", "entry exit position_size initial_capital commission tax lookback"
+)
+
+
+def parse_strategy(spec):
+    """驗證策略設定並解析條件，格式錯誤時拋出 ValueError"""
+    entry = parse_filter(str(spec.get("entry") or ""))
+    exit_conditions = parse_filter(str(spec["exit"])) if spec.get("exit") else None
+
+    position_size = spec.get("position_size")
+    if position_size is not None:
+        position_size = float(position_size)
+        if not 0 < position_size <= 1:
+            raise ValueError("position_size 必須介於 0 與 1 之間")
+
+    initial_capital = float(spec.get("initial_capital", DEFAULT_CAPITAL))
+    commission = float(spec.get("commission", DEFAULT_COMMISSION))
+    tax = float(spec.get("tax", DEFAULT_TAX))
+    if initial_capital <= 0:
+        raise ValueError("initial_capital 必須大於 0")
+    if not (0 <= commission < 0.1 and 0 <= tax < 0.1):
+        raise ValueError("commission 與 tax 必須介於 0 與 0.1 之間")
+
+    conditions = entry + (exit_conditions or [])
+    lookback = max(term.lookback for c in conditions for term in (c.left, c.right))
+    if any(condition.op in CROSSES for condition in conditions):
+        lookback += 1
+    return Strategy(
+        entry, exit_conditions, position_size, initial_capital, commission, tax, lookback
+    )
+
+
+def load_backtest_panel(stock_ids, start, end, strategy):
+    """載入回測區間加上指標暖機期的價格矩陣（在請求執行緒中讀取資料庫）"""
+    warmup_days = int(strategy.lookback * 7 / 5) + 14
+    # 報酬需要收盤價與漲跌價差（change_percentage 亦由兩者推導）
+    needed = {"close_price", "change_amount"}
+    for condition in strategy.entry + (strategy.exit or []):
+        needed.update(term.field for term in (condition.left, condition.right))
+    fields = [field for field in FIELDS.values() if field in needed]
+    return load_price_panel(start - timedelta(days=warmup_days), end, stock_ids, fields)
+
+
+def signal_matrix(panel, conditions):
+    """所有條件皆成立的 (股票數, 交易日數) 布林矩陣"""
+    values = {}
+    mask = np.ones((len(panel.stock_ids), len(panel.dates)), dtype=bool)
+    for condition in conditions:
+        for term in (condition.left, condition.right):
+            if term.label not in values:
+                values[term.label] = term_matrix(panel, term)
+        mask &= compare(condition.op, values[condition.left.label], values[condition.right.label])
+    return mask
+
+
+def positions(entry, exit=None):
+    """由進出場訊號推導每日收盤後是否持有（同日皆成立時以出場為準）"""
+    if exit is None:
+        return entry.copy()
+    state = np.where(exit, 0.0, np.where(entry, 1.0, np.nan))
+    return forward_fill(state) == 1.0
+
+
+def target_weights(held, position_size=None):
+    """每日目標權重；固定比例合計超過 100% 時等比例縮減"""
+    held = held.astype(np.float64)
+    if position_size is None:
+        return held / np.maximum(held.sum(axis=0), 1.0)
+    weights = held * position_size
+    return weights / np.maximum(weights.sum(axis=0), 1.0)
+
+
+def run_backtest(panel, strategy, start):
+    """計算訊號並模擬（純 NumPy，於行程池中執行），回傳結果 dict"""
+    entry = signal_matrix(panel, strategy.entry)
+    exit_signal = signal_matrix(panel, strategy.exit) if strategy.exit else None
+    close = forward_fill(panel["close_price"])
+    returns = np.nan_to_num(daily_returns(panel["close_price"], panel["change_amount"]))
+
+    # 暖機期只用於計算指標，部位自回測起日起算
+    first = int(np.searchsorted(panel.dates, np.datetime64(start, "D")))
+    dates = panel.dates[first:]
+    close, returns = close[:, first:], returns[:, first:]
+    entry = entry[:, first:]
+    if exit_signal is not None:
+        exit_signal = exit_signal[:, first:]
+
+    held = positions(entry, exit_signal) & ~np.isnan(close)
+    weights = target_weights(held, strategy.position_size)
+
+    # 前一日收盤後的權重承擔當日報酬；當日的調整成本自當日權益扣除
+    daily = np.zeros(len(dates))
+    if len(dates) > 1:
+        daily[1:] = (weights[:, :-1] * returns[:, 1:]).sum(axis=0)
+    delta = np.diff(weights, axis=1, prepend=0.0)
+    costs = (
+        np.clip(delta, 0, None) * strategy.commission
+        + np.clip(-delta, 0, None) * (strategy.commission + strategy.tax)
+    ).sum(axis=0)
+    daily -= costs
+    equity = strategy.initial_capital * np.cumprod(1.0 + daily)
+
+    trades = _trades(panel.stocks, dates, close, held)
+    return {
+        "start_date": str(dates[0]) if len(dates) else None,
+        "end_date": str(dates[-1]) if len(dates) else None,
+        "stocks": panel.stocks,
+        "equity": {
+            "dates": np.datetime_as_string(dates).tolist(),
+            "values": np.round(equity, 2).tolist(),
+        },
+        "stats": _stats(strategy.initial_capital, daily, equity, weights, trades),
+        "trades": trades[:MAX_TRADES],
+        "trades_truncated": len(trades) > MAX_TRADES,
+    }
+
+
+def _trades(stocks, dates, close, held):
+    """由持有矩陣的狀態變化找出每筆交易（區間結束時仍持有者標記為 open）"""
+    padded = np.pad(held.astype(np.int8), ((0, 0), (1, 1)))
+    changes = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(changes == 1)
+    _, ends = np.nonzero(changes == -1)  # 逐列掃描，與進場一一對應
+
+    last = len(dates) - 1
+    exits = np.minimum(ends, last)
+    entry_prices = close[rows, starts]
+    exit_prices = close[rows, exits]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trade_returns = exit_prices / entry_prices - 1.0
+
+    trades = []
+    for i in np.argsort(starts, kind="stable"):
+        trades.append(
+            {
+                "symbol": stocks[rows[i]]["symbol"],
+                "entry_date": str(dates[starts[i]]),
+                "entry_price": _number(entry_prices[i]),
+                "exit_date": str(dates[exits[i]]),
+                "exit_price": _number(exit_prices[i]),
+                "return": _number(trade_returns[i], 4),
+                "holding_days": int(exits[i] - starts[i]),
+                "open": bool(ends[i] > last),
+            }
+        )
+    return trades
+
+
+def _stats(initial_capital, daily, equity, weights, trades):
+    if not len(equity):
+        return {}
+    total_return = equity[-1] / initial_capital - 1.0
+    years = len(daily) / TRADING_DAYS_PER_YEAR
+    volatility = daily[1:].std(ddof=1) if len(daily) > 2 else np.nan
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    closed = [t["return"] for t in trades if not t["open"] and t["return"] is not None]
+    with np.errstate(over="ignore"):
+        annualized = np.power(1.0 + total_return, 1.0 / years)
+
+    return {
+        "final_equity": _number(equity[-1]),
+        "total_return": _number(total_return, 4),
+        "annualized_return": _number(annualized - 1.0, 4),
+        "annualized_volatility": _number(volatility * math.sqrt(TRADING_DAYS_PER_YEAR), 4),
+        "sharpe_ratio": _number(
+            daily[1:].mean() / volatility * math.sqrt(TRADING_DAYS_PER_YEAR)
+            if volatility
+            else np.nan,
+            2,
+        ),
+        "max_drawdown": _number(drawdown.min(), 4),
+        "exposure": _number(weights.sum(axis=0).mean(), 4),
+        "trades": len(trades),
+        "win_rate": _number(np.mean([r > 0 for r in closed]) if closed else np.nan, 4),
+        "average_trade_return": _number(np.mean(closed) if closed else np.nan, 4),
+    }
+
+
+def _number(value, digits=2):
+    value = float(value)
+    return None if not math.isfinite(value) else round(value, digits)
+
+
+class BacktestJobs:
+    """回測工作（行程內紀錄），只保留最近 max_jobs 筆已完成的工作"""
+
+    def __init__(self, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self, workers):
+        with self._lock:
+            if self._executor is None:
+                # spawn 避免在多執行緒的伺服器行程中 fork
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            return self._executor
+
+    def _run(self, panel, strategy, start):
+        workers = current_app.config.get("BACKTEST_WORKERS", 2)
+        if workers <= 0:
+            # 不使用行程池（開發 / 測試用），在請求中直接執行
+            future = Future()
+            try:
+                future.set_result(run_backtest(panel, strategy, start))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        try:
+            return self._get_executor(workers).submit(run_backtest, panel, strategy, start)
+        except BrokenProcessPool:
+            # 工作行程異常結束後整個池無法再使用，重建一次
+            with self._lock:
+                self._executor = None
+            return self._get_executor(workers).submit(run_backtest, panel, strategy, start)
+
+    def submit(self, user_id, panel, strategy, start):
+        """送出回測，回傳工作 id"""
+        job_id = uuid.uuid4().hex
+        future = self._run(panel, strategy, start)
+        with self._lock:
+            self._jobs[job_id] = {
+                "user_id": user_id,
+                "created_at": datetime.utcnow(),
+                "future": future,
+            }
+            finished = [key for key, job in self._jobs.items() if job["future"].done()]
+            for key in finished[: max(len(self._jobs) - self.max_jobs, 0)]:
+                del self._jobs[key]
+        return job_id
+
+    def status(self, job_id, user_id):
+        """工作狀態與結果；不存在或不屬於該使用者時回傳 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+
+        future = job["future"]
+        status = {"id": job_id, "created_at": job["created_at"].isoformat()}
+        if not future.done():
+            status["status"] = "running" if future.running() else "queued"
+        elif future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = str(future.exception())
+        else:
+            status["status"] = "completed"
+            status["result"] = future.result()
+        return status
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._jobs.clear()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+backtest_jobs = BacktestJobs()
@@ -1,65 +1,303 @@
+import base64
+import binascii
+import json
 from datetime import datetime, timedelta
-
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+
+import numpy as np
+from app import columnar
+from app.backtest import backtest_jobs, load_backtest_panel, parse_strategy
+from app.correlation import correlation_matrix
+from app.database_adapter import DatabaseAdapter
 from app.decorators import token_required
-from app.extensions import db
-from app.models import Stock, StockPrice, UserStock
+from app.downsampling import lttb
+from app.extensions import db, socketio
+from app.http_cache import ConditionalGet, stock_validator
+from app.indicators import cached_indicators, parse_indicator_set, to_json_values
+from app.market_statistics import market_statistics, market_statistics_version
+from app.market_trends import cold_database_enabled
+from app.models import (
+    LatestQuote,
+    Stock,
+    StockPrice,
+    StockPriceRollup,
+    StockRanking,
+    StockStatistics,
+    UserStock,
+)
+from app.models_cold import MarketTrendAnalysis
+from app.portfolio import invalidate_user, portfolio_valuation
+from app.price_cache import PriceSeries, price_cache
+from app.price_history import archival_cutoff, load_history, series_statistics
+from app.quote_push import load_quote_payloads, quote_payload, room_for
+from app.screener import screen
+from app.search_index import stock_search_index
 from flask import Blueprint, jsonify, request
 from flask_cors import CORS
-from sqlalchemy import desc, func
+from flask_socketio import emit, join_room, leave_room
+from sqlalchemy import desc, text
 
 stocks_bp = Blueprint("stocks_bp", __name__)
 CORS(stocks_bp)
 
+# 關注清單查詢讀取的 stock_prices 欄位
+WATCHLIST_PRICE_COLUMNS = [
+    "id",
+    "stock_id",
+    "trade_date",
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "change_amount",
+    "volume",
+    "turnover",
+    "transaction_count",
+]
+
+# /history 預設與最大回傳點數，超過時以 LTTB 降採樣
+DEFAULT_HISTORY_POINTS = 1000
+MAX_HISTORY_POINTS = 5000
+
+# /quotes 單次可查詢的股票數
+MAX_QUOTE_SYMBOLS = 100
+
+# /correlation 單次計算的股票數（矩陣大小為平方）
+MAX_CORRELATION_STOCKS = 300
+
+# /movers 預設回傳筆數（上限為每日保存的排行深度）
+DEFAULT_MOVERS_LIMIT = 20
+
+# /backtest 股票池上限與預設回測天數
+MAX_BACKTEST_STOCKS = 500
+DEFAULT_BACKTEST_DAYS = 365
+
+
+def _parse_date_range(default_days=30):
+    """解析 start_date/end_date 或 days 參數，回傳 (start, end)；end 為 None 表示至今"""
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    if start_date and end_date:
+        return (
+            datetime.strptime(start_date, "%Y-%m-%d").date(),
+            datetime.strptime(end_date, "%Y-%m-%d").date(),
+        )
+
+    # 使用天數限制
+    days = request.args.get("days", default_days, type=int)
+    return datetime.now().date() - timedelta(days=days), None
+
+
+def _stock_list_item(stock, latest_price):
+    """股票列表的單筆輸出格式"""
+    stock_data = stock.to_dict()
+
+    if latest_price:
+        stock_data.update(
+            {
+                "latest_price": latest_price.to_dict(),
+                "last_updated": latest_price.trade_date.isoformat(),
+            }
+        )
+
+    return stock_data
+
+
+def _encode_cursor(data):
+    """將分頁位置編碼為不透明的游標字串"""
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token):
+    """解析游標字串，格式錯誤時拋出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("無效的分頁游標") from e
+
+    valid = isinstance(cursor, dict) and (
+        (set(cursor) == {"s"} and isinstance(cursor["s"], str))
+        or (set(cursor) == {"o"} and isinstance(cursor["o"], int) and cursor["o"] >= 0)
+    )
+    if not valid:
+        raise ValueError("無效的分頁游標")
+    return cursor
+
+
+def _rows_in_order(query, ids):
+    """只查詢指定 ids 的 (Stock, LatestQuote)，並依 ids 的順序排列"""
+    rows = query.filter(Stock.id.in_(ids)).all() if ids else []
+    position = {stock_id: i for i, stock_id in enumerate(ids)}
+    rows.sort(key=lambda row: position[row[0].id])
+    return rows
+
+
+def _keyset_page(query, cursor, per_page, search, exchange, market_type, include_total):
+    """游標分頁：一般列表依代號 keyset（symbol > 上一頁最後代號），搜尋結果依排序位置
+
+    總數只在 include_total 時由記憶體搜尋索引估算，不發出 COUNT(*)。
+    """
+    if search:
+        matched = stock_search_index.search(search, exchange=exchange, market_type=market_type)
+        offset = cursor.get("o", 0)
+        page_ids = [stock["id"] for stock in matched[offset : offset + per_page]]
+        rows = _rows_in_order(query, page_ids)
+        has_next = offset + per_page < len(matched)
+        next_cursor = _encode_cursor({"o": offset + per_page}) if has_next else None
+        total = len(matched)
+    else:
+        if exchange:
+            query = query.filter(Stock.exchange == exchange)
+        if market_type:
+            query = query.filter(Stock.market_type == market_type)
+        if "s" in cursor:
+            query = query.filter(Stock.symbol > cursor["s"])
+
+        # 多取一筆判斷是否還有下一頁
+        rows = query.order_by(Stock.symbol).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = _encode_cursor({"s": rows[-1][0].symbol}) if has_next and rows else None
+        total = (
+            stock_search_index.count(exchange=exchange, market_type=market_type)
+            if include_total
+            else None
+        )
+
+    return rows, {
+        "per_page": per_page,
+        "has_next": has_next,
+        "next_cursor": next_cursor,
+        "total": total,
+    }
+
+
+def _paginate_ids(query, ids, page, per_page):
+    """依 ids 的順序分頁，只查詢當頁的 (Stock, LatestQuote)，回傳與 paginate 相同屬性的物件"""
+    total = len(ids)
+    rows = _rows_in_order(query, ids[(page - 1) * per_page : page * per_page])
+
+    pages = (total + per_page - 1) // per_page
+    return SimpleNamespace(
+        items=rows, total=total, pages=pages, has_next=page < pages, has_prev=page > 1
+    )
+
+
+def _parse_symbols(raw):
+    """解析以逗號分隔的字串或列表，回傳去重後的大寫代號（保留順序）"""
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    return list(dict.fromkeys(str(symbol).strip().upper() for symbol in raw if str(symbol).strip()))
+
+
+def _universe_ids(symbols, exchange, market_type, limit):
+    """依代號或市場區隔取得股票 id，最多 limit + 1 筆以便判斷是否超過上限；皆未指定時回傳 None"""
+    query = db.session.query(Stock.id)
+    if symbols:
+        query = query.filter(Stock.symbol.in_(symbols[: limit + 1]))
+    elif exchange or market_type:
+        if exchange:
+            query = query.filter(Stock.exchange == exchange)
+        if market_type:
+            query = query.filter(Stock.market_type == market_type)
+    else:
+        return None
+    return [row[0] for row in query.limit(limit + 1)]
+
+
+def _find_stock_with_quote(symbol):
+    """以單一查詢取得股票及其最新報價，股票不存在時回傳 None"""
+    return (
+        db.session.query(Stock, LatestQuote)
+        .outerjoin(LatestQuote, LatestQuote.stock_id == Stock.id)
+        .filter(Stock.symbol == symbol)
+        .first()
+    )
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def _rollup_columns(rollups):
+    """週 / 月 K 線的欄式輸出，欄位與 PriceSeries.to_columns 相同"""
+    columns = {
+        "trade_date": np.array([r.period_start for r in rollups], dtype="datetime64[D]"),
+        "last_trade_date": np.array([r.last_trade_date for r in rollups], dtype="datetime64[D]"),
+        "trade_days": np.array([r.trade_days for r in rollups], dtype=np.int64),
+    }
+    for field in PriceSeries.FLOAT_FIELDS + PriceSeries.INT_FIELDS:
+        columns[field] = _float_column(getattr(r, field) for r in rollups)
+    return columns
+
+
+def _quote_columns(quotes):
+    """quote_payload 列表的欄式輸出"""
+    columns = {}
+    for field in ("symbol", "name", "exchange", "market_type"):
+        columns[field] = [quote[field] for quote in quotes]
+    for field in ("price", "change", "change_percent", "volume", "high", "low", "open"):
+        columns[field] = _float_column(quote[field] for quote in quotes)
+    columns["timestamp"] = np.array([q["timestamp"] for q in quotes], dtype="datetime64[D]")
+    columns["last_updated"] = [quote["last_updated"] for quote in quotes]
+    return columns
+
 
 @stocks_bp.route("", methods=["GET"])
 @token_required
 def get_stocks(current_user):
     """獲取股票列表，支援搜尋和分頁"""
     # 獲取查詢參數
-    page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
     search = request.args.get("search", "").strip()
     exchange = request.args.get("exchange", "").strip()
     market_type = request.args.get("market_type", "").strip()
 
-    # 構建查詢
-    query = Stock.query
+    # 構建查詢（最新報價由 latest_quotes 投影一次 JOIN 取得）
+    query = Stock.query.add_entity(LatestQuote).outerjoin(
+        LatestQuote, LatestQuote.stock_id == Stock.id
+    )
 
-    # 搜尋條件
-    if search:
-        query = query.filter(
-            db.or_(Stock.symbol.like(f"%{search}%"), Stock.name.like(f"%{search}%"))
+    # 傳入 after（第一頁為空字串）時改用游標分頁，每頁成本固定
+    after = request.args.get("after")
+    if after is not None:
+        try:
+            cursor = _decode_cursor(after) if after else {}
+        except ValueError:
+            return jsonify({"error": "無效的分頁游標"}), 400
+
+        include_total = request.args.get("include_total", "").lower() in ("1", "true")
+        items, pagination = _keyset_page(
+            query, cursor, per_page, search, exchange, market_type, include_total
+        )
+        return jsonify(
+            {"stocks": [_stock_list_item(*row) for row in items], "pagination": pagination}
         )
 
-    if exchange:
-        query = query.filter(Stock.exchange == exchange)
-
-    if market_type:
-        query = query.filter(Stock.market_type == market_type)
-
-    # 排序和分頁
-    query = query.order_by(Stock.symbol)
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-
-    stocks = []
-    for stock in pagination.items:
-        stock_data = stock.to_dict()
+    if search:
+        # 搜尋由記憶體索引依相關度排序，只查詢當頁股票
+        matched = stock_search_index.search(search, exchange=exchange, market_type=market_type)
+        pagination = _paginate_ids(
+            query, [stock["id"] for stock in matched], page=page, per_page=per_page
+        )
+    else:
+        if exchange:
+            query = query.filter(Stock.exchange == exchange)
 
-        # 獲取最新價格
-        latest_price = stock.get_latest_price()
-        if latest_price:
-            stock_data.update(
-                {
-                    "latest_price": latest_price.to_dict(),
-                    "last_updated": latest_price.trade_date.isoformat(),
-                }
-            )
+        if market_type:
+            query = query.filter(Stock.market_type == market_type)
 
-        stocks.append(stock_data)
+        # 排序和分頁
+        query = query.order_by(Stock.symbol)
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
 
     return jsonify(
         {
-            "stocks": stocks,
+            "stocks": [_stock_list_item(*row) for row in pagination.items],
             "pagination": {
                 "page": page,
                 "pages": pagination.pages,
@@ -77,45 +315,40 @@ def get_stocks(current_user):
 def get_stock_detail(current_user, symbol):
     """獲取單支股票詳細資訊"""
     try:
-        stock = Stock.query.filter_by(symbol=symbol).first()
-        if not stock:
+        row = _find_stock_with_quote(symbol)
+        if not row:
             return jsonify({"error": "股票不存在"}), 404
 
+        stock, latest_price = row
+        validator = stock_validator(stock, latest_price)
+        if validator.is_fresh():
+            return validator.not_modified()
+
         stock_data = stock.to_dict()
 
-        # 獲取最新價格
-        latest_price = stock.get_latest_price()
         if latest_price:
             stock_data["latest_price"] = latest_price.to_dict()
             stock_data["change_percentage"] = latest_price.change_percentage
 
-        # 獲取價格統計
-        price_stats = (
-            db.session.query(
-                func.count(StockPrice.id).label("total_records"),
-                func.min(StockPrice.trade_date).label("first_date"),
-                func.max(StockPrice.trade_date).label("last_date"),
-                func.avg(StockPrice.close_price).label("avg_price"),
-                func.max(StockPrice.high_price).label("max_high"),
-                func.min(StockPrice.low_price).label("min_low"),
-            )
-            .filter_by(stock_id=stock.id)
-            .first()
-        )
-
-        if price_stats and price_stats.total_records > 0:
-            stock_data["statistics"] = {
-                "total_records": price_stats.total_records,
-                "first_date": (
-                    price_stats.first_date.isoformat() if price_stats.first_date else None
-                ),
-                "last_date": price_stats.last_date.isoformat() if price_stats.last_date else None,
-                "average_price": float(price_stats.avg_price) if price_stats.avg_price else None,
-                "highest_price": float(price_stats.max_high) if price_stats.max_high else None,
-                "lowest_price": float(price_stats.min_low) if price_stats.min_low else None,
-            }
-
-        return jsonify(stock_data)
+        # 價格統計由匯入流程增量維護（含已封存到冷資料庫的價格），這裡只需以主鍵讀取
+        statistics = StockStatistics.query.get(stock.id)
+        complete = True
+        if statistics and statistics.total_records > 0:
+            stock_data["statistics"] = statistics.to_dict()
+        elif archival_cutoff() is not None:
+            # 熱資料庫沒有這支股票的價格（如已全部封存的下市股票），改讀冷熱合併的序列
+            series, complete = load_history(stock.id, quote=latest_price)
+            if len(series):
+                stock_data.setdefault("latest_price", series.to_records(len(series) - 1)[0])
+                stock_data["statistics"] = series_statistics(series)
+        stock_data["complete"] = complete
+
+        response = jsonify(stock_data)
+        if not complete:
+            # 冷資料庫逾時的部分結果不可被快取或以 ETag 重新驗證
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return validator.apply(response)
 
     except Exception as e:
         return jsonify({"error": f"獲取股票詳情失敗: {str(e)}"}), 500
@@ -124,49 +357,143 @@ def get_stock_detail(current_user, symbol):
 @stocks_bp.route("/<symbol>/history", methods=["GET"])
 @token_required
 def get_stock_history(current_user, symbol):
-    """獲取股票歷史價格資料"""
+    """獲取股票歷史價格資料（由行程內欄式快取切片）"""
     try:
-        stock = Stock.query.filter_by(symbol=symbol).first()
-        if not stock:
+        row = _find_stock_with_quote(symbol)
+        if not row:
             return jsonify({"error": "股票不存在"}), 404
 
-        # 獲取查詢參數
-        days = request.args.get("days", 30, type=int)
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
+        stock, latest_quote = row
+        mimetype = columnar.negotiate()
+        if mimetype is None:
+            return jsonify({"error": "伺服器未安裝 pyarrow，無法提供 Arrow 格式"}), 406
+        try:
+            start, end = _parse_date_range()
+        except ValueError:
+            return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
+
+        validator = stock_validator(stock, latest_quote, variant=mimetype, window=(start, end))
+        if validator.is_fresh():
+            return validator.not_modified()
+
+        binary = mimetype != columnar.JSON
+        resolution = request.args.get("resolution", "day")
+        if resolution not in ("day",) + StockPriceRollup.RESOLUTIONS:
+            return jsonify({"error": "resolution 必須為 day、week 或 month"}), 400
+        max_points = request.args.get("max_points", DEFAULT_HISTORY_POINTS, type=int)
+        max_points = min(max(max_points, 3), MAX_HISTORY_POINTS)
+
+        complete = True
+        if resolution == "day":
+            # 起日早於封存界線時一併讀取冷資料庫
+            series, complete = load_history(stock.id, start, end, quote=latest_quote)
+            lo, hi = series.date_range(start, end)
+            total_points = hi - lo
+            # 超過點數上限時以 LTTB 降採樣，而不是截斷
+            index = None
+            if total_points > max_points:
+                close = series["close_price"][lo:hi]
+                index = lo + lttb(series.dates[lo:hi].astype(np.int64), close, max_points)
+            if binary:
+                history_data = series.to_columns(lo, hi, index=index)
+            else:
+                history_data = series.to_records(lo, hi, index=index)
+        else:
+            # 週 / 月 K 線由匯入時預先計算的彙總表讀取，包含 start 所在的期間
+            first_period = StockPriceRollup.period_start_of(resolution, start)
+            query = StockPriceRollup.query.filter(
+                StockPriceRollup.stock_id == stock.id,
+                StockPriceRollup.resolution == resolution,
+                StockPriceRollup.period_start >= first_period,
+            )
+            if end:
+                query = query.filter(StockPriceRollup.period_start <= end)
+            rollups = query.order_by(StockPriceRollup.period_start).all()
+
+            total_points = len(rollups)
+            if total_points > max_points:
+                x = [rollup.period_start.toordinal() for rollup in rollups]
+                y = [
+                    np.nan if rollup.close_price is None else float(rollup.close_price)
+                    for rollup in rollups
+                ]
+                rollups = [rollups[i] for i in lttb(x, y, max_points)]
+            if binary:
+                history_data = _rollup_columns(rollups)
+            else:
+                history_data = [rollup.to_dict() for rollup in rollups]
+
+        count = len(history_data["trade_date"]) if binary else len(history_data)
+        summary = {
+            "symbol": symbol,
+            "name": stock.name,
+            "resolution": resolution,
+            "count": count,
+            "total_points": total_points,
+            "downsampled": count < total_points,
+            "complete": complete,
+        }
+        if binary:
+            response = columnar.columnar_response(history_data, mimetype, summary)
+        else:
+            response = jsonify({**summary, "history": history_data})
+        if not complete:
+            # 冷資料庫逾時的部分結果不可被快取或以 ETag 重新驗證
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return validator.apply(response)
+
+    except Exception as e:
+        return jsonify({"error": f"獲取歷史資料失敗: {str(e)}"}), 500
 
-        # 構建查詢
-        query = StockPrice.query.filter_by(stock_id=stock.id)
 
-        if start_date and end_date:
-            try:
-                start = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end = datetime.strptime(end_date, "%Y-%m-%d").date()
-                query = query.filter(StockPrice.trade_date >= start, StockPrice.trade_date <= end)
-            except ValueError:
-                return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
-        else:
-            # 使用天數限制
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=days)
-            query = query.filter(StockPrice.trade_date >= start_date)
+@stocks_bp.route("/<symbol>/indicators", methods=["GET"])
+@token_required
+def get_stock_indicators(current_user, symbol):
+    """獲取技術指標（以整段歷史向量化計算，依最新交易日快取）"""
+    try:
+        row = _find_stock_with_quote(symbol)
+        if not row:
+            return jsonify({"error": "股票不存在"}), 404
 
-        # 排序並獲取資料
-        prices = query.order_by(StockPrice.trade_date.desc()).limit(500).all()
+        stock, latest_quote = row
+        try:
+            start, end = _parse_date_range()
+        except ValueError:
+            return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
 
-        history_data = [price.to_dict() for price in reversed(prices)]
+        validator = stock_validator(stock, latest_quote, window=(start, end))
+        if validator.is_fresh():
+            return validator.not_modified()
 
-        return jsonify(
-            {
-                "symbol": symbol,
-                "name": stock.name,
-                "history": history_data,
-                "count": len(history_data),
-            }
+        try:
+            indicator_set = parse_indicator_set(
+                request.args.get("set", "sma20,ema12,rsi14,macd,bbands")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        series = price_cache.get(stock.id, quote=latest_quote)
+        results = cached_indicators(series, indicator_set)
+        lo, hi = series.date_range(start, end)
+
+        return validator.apply(
+            jsonify(
+                {
+                    "symbol": symbol,
+                    "name": stock.name,
+                    "dates": np.datetime_as_string(series.dates[lo:hi]).tolist(),
+                    "close": to_json_values(series["close_price"], lo, hi),
+                    "indicators": {
+                        name: to_json_values(values, lo, hi) for name, values in results.items()
+                    },
+                    "count": hi - lo,
+                }
+            )
         )
 
     except Exception as e:
-        return jsonify({"error": f"獲取歷史資料失敗: {str(e)}"}), 500
+        return jsonify({"error": f"獲取技術指標失敗: {str(e)}"}), 500
 
 
 @stocks_bp.route("/<symbol>/realtime", methods=["GET"])
@@ -174,71 +501,131 @@ def get_stock_history(current_user, symbol):
 def get_realtime_data(current_user, symbol):
     """獲取即時股票資料（使用最新的資料庫記錄）"""
     try:
-        stock = Stock.query.filter_by(symbol=symbol).first()
-        if not stock:
+        row = _find_stock_with_quote(symbol)
+        if not row:
             return jsonify({"error": "股票不存在"}), 404
 
-        latest_price = stock.get_latest_price()
+        stock, latest_price = row
         if not latest_price:
             return jsonify({"error": "暫無價格資料"}), 404
 
-        realtime_data = {
-            "symbol": symbol,
-            "name": stock.name,
-            "exchange": stock.exchange,
-            "market_type": stock.market_type,
-            "price": float(latest_price.close_price) if latest_price.close_price else 0,
-            "change": float(latest_price.change_amount) if latest_price.change_amount else 0,
-            "change_percent": latest_price.change_percentage,
-            "volume": latest_price.volume,
-            "high": float(latest_price.high_price) if latest_price.high_price else 0,
-            "low": float(latest_price.low_price) if latest_price.low_price else 0,
-            "open": float(latest_price.open_price) if latest_price.open_price else 0,
-            "timestamp": latest_price.trade_date.isoformat(),
-            "last_updated": (
-                latest_price.created_at.isoformat() if latest_price.created_at else None
-            ),
-        }
+        validator = stock_validator(stock, latest_price)
+        if validator.is_fresh():
+            return validator.not_modified()
 
-        return jsonify(realtime_data)
+        return validator.apply(jsonify(quote_payload(stock, latest_price)))
 
     except Exception as e:
         return jsonify({"error": f"獲取即時資料失敗: {str(e)}"}), 500
 
 
+@stocks_bp.route("/quotes", methods=["GET"])
+@token_required
+def get_quotes(current_user):
+    """批次取得多支股票的即時報價（?symbols=1101,2330），以單一查詢完成"""
+    try:
+        symbols = _parse_symbols(request.args.get("symbols", ""))
+        if not symbols:
+            return jsonify({"error": "請提供 symbols 參數"}), 400
+        if len(symbols) > MAX_QUOTE_SYMBOLS:
+            return jsonify({"error": f"一次最多查詢 {MAX_QUOTE_SYMBOLS} 支股票"}), 400
+
+        mimetype = columnar.negotiate()
+        if mimetype is None:
+            return jsonify({"error": "伺服器未安裝 pyarrow，無法提供 Arrow 格式"}), 406
+
+        found = {payload["symbol"]: payload for payload in load_quote_payloads(symbols=symbols)}
+        quotes = [found[symbol] for symbol in symbols if symbol in found]
+        missing = [symbol for symbol in symbols if symbol not in found]
+        if mimetype != columnar.JSON:
+            response = columnar.columnar_response(
+                _quote_columns(quotes), mimetype, {"missing": missing}
+            )
+        else:
+            response = jsonify({"quotes": quotes, "missing": missing})
+        response.vary.add("Accept")
+        return response
+
+    except Exception as e:
+        return jsonify({"error": f"批次獲取報價失敗: {str(e)}"}), 500
+
+
 @stocks_bp.route("/user", methods=["GET"])
 @token_required
 def get_user_stocks(current_user):
-    """獲取用戶關注的股票"""
+    """獲取用戶關注的股票（單一集合式查詢取得最新與前一交易日價格）"""
     try:
-        # 先獲取用戶關注的股票
-        user_stocks = (
-            db.session.query(Stock)
-            .join(UserStock, Stock.id == UserStock.stock_id)
-            .filter(UserStock.user_id == current_user.id)
-            .all()
+        adapter = DatabaseAdapter.from_connection_string(str(db.engine.url))
+        ranked_prices = adapter.get_latest_rows_query(
+            "stock_prices",
+            WATCHLIST_PRICE_COLUMNS,
+            partition_column="stock_id",
+            order_column="trade_date",
+            where="stock_id IN (SELECT stock_id FROM user_stocks WHERE user_id = :user_id)",
+            max_rank=2,
         )
+        price_columns = ", ".join(f"p.{column} AS p_{column}" for column in WATCHLIST_PRICE_COLUMNS)
+        rows = db.session.execute(
+            text(
+                f"SELECT s.id, s.symbol, s.name, s.exchange, s.market_type, "
+                f"us.quantity, us.cost_basis, {price_columns}, p.row_rank "
+                f"FROM user_stocks us "
+                f"JOIN stocks s ON s.id = us.stock_id "
+                f"LEFT JOIN ({ranked_prices}) p ON p.stock_id = s.id "
+                f"WHERE us.user_id = :user_id "
+                f"ORDER BY s.symbol, p.row_rank"
+            ).columns(
+                **{
+                    f"p_{column}": StockPrice.__table__.c[column].type
+                    for column in WATCHLIST_PRICE_COLUMNS
+                }
+            ),
+            {"user_id": current_user.id},
+        ).mappings()
+
+        stocks_by_id = {}
+        for row in rows:
+            stock_data = stocks_by_id.get(row["id"])
+            if stock_data is None:
+                stock_data = stocks_by_id[row["id"]] = {
+                    "id": row["id"],
+                    "symbol": row["symbol"],
+                    "name": row["name"],
+                    "exchange": row["exchange"],
+                    "market_type": row["market_type"],
+                    "quantity": float(row["quantity"]) if row["quantity"] is not None else None,
+                    "cost_basis": (
+                        float(row["cost_basis"]) if row["cost_basis"] is not None else None
+                    ),
+                }
 
-        stocks_data = []
-        for stock in user_stocks:
-            stock_data = stock.to_dict()
+            if row["row_rank"] is None:
+                continue
 
-            # 獲取每支股票的最新價格
-            latest_price = (
-                StockPrice.query.filter_by(stock_id=stock.id)
-                .order_by(StockPrice.trade_date.desc())
-                .first()
+            price = StockPrice(
+                **{column: row[f"p_{column}"] for column in WATCHLIST_PRICE_COLUMNS}
             )
-
-            if latest_price:
+            if row["row_rank"] == 1:
                 stock_data.update(
                     {
-                        "latest_price": latest_price.to_dict(),
-                        "change_percentage": latest_price.change_percentage,
+                        "latest_price": price.to_dict(),
+                        "change_percentage": price.change_percentage,
+                        "previous_close": (
+                            float(price.close_price - price.change_amount)
+                            if price.close_price is not None and price.change_amount is not None
+                            else None
+                        ),
+                        "day_range": {
+                            "high": float(price.high_price) if price.high_price else None,
+                            "low": float(price.low_price) if price.low_price else None,
+                        },
                     }
                 )
-            stocks_data.append(stock_data)
+            elif price.close_price is not None:
+                # 有前一交易日記錄時以其收盤價為準
+                stock_data["previous_close"] = float(price.close_price)
 
+        stocks_data = list(stocks_by_id.values())
         return jsonify({"user_stocks": stocks_data, "count": len(stocks_data)})
 
     except Exception as e:
@@ -288,6 +675,7 @@ def unfollow_stock(current_user, symbol):
 
         db.session.delete(user_stock)
         db.session.commit()
+        invalidate_user(current_user.id)
 
         return jsonify({"message": f"成功取消關注 {stock.name} ({symbol})"}), 200
 
@@ -296,6 +684,70 @@ def unfollow_stock(current_user, symbol):
         return jsonify({"error": f"取消關注失敗: {str(e)}"}), 500
 
 
+@stocks_bp.route("/<symbol>/holding", methods=["PUT"])
+@token_required
+def update_holding(current_user, symbol):
+    """設定持股股數與每股平均成本（null 表示清除），尚未關注時一併關注"""
+    try:
+        stock = Stock.query.filter_by(symbol=symbol).first()
+        if not stock:
+            return jsonify({"error": "股票不存在"}), 404
+
+        data = request.get_json(silent=True) or {}
+        values = {}
+        for field in ("quantity", "cost_basis"):
+            value = data.get(field)
+            if value is not None:
+                try:
+                    value = Decimal(str(value))
+                except InvalidOperation:
+                    return jsonify({"error": f"{field} 必須為數字"}), 400
+                if not value.is_finite() or value < 0:
+                    return jsonify({"error": f"{field} 必須為非負數"}), 400
+            values[field] = value
+
+        user_stock = UserStock.query.filter_by(user_id=current_user.id, stock_id=stock.id).first()
+        if not user_stock:
+            user_stock = UserStock(user_id=current_user.id, stock_id=stock.id)
+            db.session.add(user_stock)
+        user_stock.quantity = values["quantity"]
+        user_stock.cost_basis = values["cost_basis"]
+        db.session.commit()
+        invalidate_user(current_user.id)
+
+        return jsonify(
+            {
+                "symbol": symbol,
+                "quantity": float(user_stock.quantity) if user_stock.quantity is not None else None,
+                "cost_basis": (
+                    float(user_stock.cost_basis) if user_stock.cost_basis is not None else None
+                ),
+            }
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"更新持股失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/portfolio", methods=["GET"])
+@token_required
+def get_portfolio(current_user):
+    """持股的每日市值與損益序列（依使用者快取，持股或價格變更後重新計算）"""
+    try:
+        try:
+            start, end = _parse_date_range(default_days=365)
+        except ValueError:
+            return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
+
+        end = end or datetime.now().date()
+        result = portfolio_valuation(current_user.id, start, end)
+        return jsonify({"start_date": start.isoformat(), "end_date": end.isoformat(), **result})
+
+    except Exception as e:
+        return jsonify({"error": f"獲取投資組合失敗: {str(e)}"}), 500
+
+
 @stocks_bp.route("/search", methods=["GET"])
 @token_required
 def search_stocks(current_user):
@@ -307,21 +759,22 @@ def search_stocks(current_user):
         if not query:
             return jsonify({"stocks": []})
 
-        # 搜尋股票
-        stocks = (
-            Stock.query.filter(
-                db.or_(Stock.symbol.like(f"%{query}%"), Stock.name.like(f"%{query}%"))
-            )
-            .limit(limit)
-            .all()
-        )
+        # 由記憶體索引取得依相關度排序的股票，再一次取得其最新報價
+        matched = stock_search_index.search(query, limit=limit)
+        quotes = {}
+        if matched:
+            quotes = {
+                quote.stock_id: quote
+                for quote in LatestQuote.query.filter(
+                    LatestQuote.stock_id.in_([stock["id"] for stock in matched])
+                )
+            }
 
         results = []
-        for stock in stocks:
-            stock_data = stock.to_dict()
+        for stock in matched:
+            stock_data = dict(stock)
+            latest_price = quotes.get(stock["id"])
 
-            # 獲取最新價格
-            latest_price = stock.get_latest_price()
             if latest_price:
                 stock_data["current_price"] = (
                     float(latest_price.close_price) if latest_price.close_price else None
@@ -336,46 +789,307 @@ def search_stocks(current_user):
         return jsonify({"error": f"搜尋失敗: {str(e)}"}), 500
 
 
-@stocks_bp.route("/statistics", methods=["GET"])
+@stocks_bp.route("/movers", methods=["GET"])
 @token_required
-def get_market_statistics(current_user):
-    """獲取市場統計資訊"""
+def get_movers(current_user):
+    """每日排行（漲跌幅、成交量、成交金額）的前後 N 名，讀取匯入時預先排序的結果"""
     try:
-        # 基本統計
-        total_stocks = Stock.query.count()
-        total_prices = StockPrice.query.count()
-
-        # 交易所分布
-        exchange_stats = (
-            db.session.query(Stock.exchange, func.count(Stock.id).label("count"))
-            .group_by(Stock.exchange)
+        metric = request.args.get("by", "change_pct")
+        if metric not in StockRanking.METRICS:
+            return jsonify({"error": "by 必須為 change_pct、volume 或 turnover"}), 400
+        limit = request.args.get("limit", DEFAULT_MOVERS_LIMIT, type=int)
+        limit = min(max(limit, 1), StockRanking.DEPTH)
+        date_param = request.args.get("date")
+
+        # 指定日期非交易日時取之前最近的交易日
+        latest = db.session.query(db.func.max(StockRanking.trade_date)).filter(
+            StockRanking.metric == metric
+        )
+        if date_param:
+            try:
+                as_of = datetime.strptime(date_param, "%Y-%m-%d").date()
+            except ValueError:
+                return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
+            latest = latest.filter(StockRanking.trade_date <= as_of)
+        trade_date = latest.scalar()
+        if trade_date is None:
+            return jsonify({"by": metric, "date": None, "ranked_count": 0, "top": [], "bottom": []})
+
+        rows = (
+            db.session.query(StockRanking, Stock)
+            .join(Stock, Stock.id == StockRanking.stock_id)
+            .filter(
+                StockRanking.trade_date == trade_date,
+                StockRanking.metric == metric,
+                db.or_(
+                    StockRanking.rank <= limit,
+                    StockRanking.rank > StockRanking.ranked_count - limit,
+                ),
+            )
+            .order_by(StockRanking.rank)
             .all()
         )
 
-        # 市場類型分布
-        market_type_stats = (
-            db.session.query(Stock.market_type, func.count(Stock.id).label("count"))
-            .group_by(Stock.market_type)
-            .all()
+        def item(ranking, stock):
+            return {
+                "rank": ranking.rank,
+                "symbol": stock.symbol,
+                "name": stock.name,
+                "exchange": stock.exchange,
+                "market_type": stock.market_type,
+                "value": float(ranking.value) if ranking.value is not None else None,
+            }
+
+        ranked_count = rows[0][0].ranked_count if rows else 0
+        return jsonify(
+            {
+                "by": metric,
+                "date": trade_date.isoformat(),
+                "ranked_count": ranked_count,
+                "top": [item(r, s) for r, s in rows if r.rank <= limit],
+                "bottom": [item(r, s) for r, s in reversed(rows) if r.rank > ranked_count - limit],
+            }
         )
 
-        # 最新更新日期
-        latest_update = db.session.query(func.max(StockPrice.trade_date)).scalar()
+    except Exception as e:
+        return jsonify({"error": f"獲取排行失敗: {str(e)}"}), 500
+
 
+@stocks_bp.route("/screener", methods=["GET"])
+@token_required
+def screen_stocks(current_user):
+    """全市場選股：在指定交易日一次向量化評估篩選條件"""
+    try:
+        expression = request.args.get("filter", "").strip()
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = min(max(request.args.get("per_page", 50, type=int), 1), 200)
+        date_param = request.args.get("date")
+
+        try:
+            as_of = datetime.strptime(date_param, "%Y-%m-%d").date() if date_param else None
+        except ValueError:
+            return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
+
+        try:
+            trade_date, matches = screen(
+                expression,
+                as_of=as_of,
+                exchange=request.args.get("exchange", "").strip() or None,
+                market_type=request.args.get("market_type", "").strip() or None,
+                sort=request.args.get("sort", "").strip() or None,
+                descending=request.args.get("order", "desc") != "asc",
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        total = len(matches)
+        pages = (total + per_page - 1) // per_page
         return jsonify(
             {
-                "total_stocks": total_stocks,
-                "total_price_records": total_prices,
-                "latest_update": latest_update.isoformat() if latest_update else None,
-                "exchange_distribution": [
-                    {"exchange": stat[0], "count": stat[1]} for stat in exchange_stats
-                ],
-                "market_type_distribution": [
-                    {"market_type": stat[0] or "一般", "count": stat[1]}
-                    for stat in market_type_stats
-                ],
+                "filter": expression,
+                "date": trade_date,
+                "stocks": matches[(page - 1) * per_page : page * per_page],
+                "pagination": {
+                    "page": page,
+                    "pages": pages,
+                    "per_page": per_page,
+                    "total": total,
+                    "has_next": page < pages,
+                    "has_prev": page > 1,
+                },
             }
         )
 
+    except Exception as e:
+        return jsonify({"error": f"選股失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/correlation", methods=["GET"])
+@token_required
+def get_correlation(current_user):
+    """多支股票（或整個市場區隔）的日報酬相關係數矩陣"""
+    try:
+        symbols = _parse_symbols(request.args.get("symbols", ""))
+        exchange = request.args.get("exchange", "").strip()
+        market_type = request.args.get("market_type", "").strip()
+        min_periods = max(request.args.get("min_periods", 20, type=int), 2)
+
+        try:
+            start, end = _parse_date_range(default_days=365)
+        except ValueError:
+            return jsonify({"error": "日期格式錯誤，請使用 YYYY-MM-DD 格式"}), 400
+
+        stock_ids = _universe_ids(symbols, exchange, market_type, MAX_CORRELATION_STOCKS)
+        if stock_ids is None:
+            return jsonify({"error": "請提供 symbols，或以 exchange / market_type 指定市場區隔"}), 400
+        if len(stock_ids) > MAX_CORRELATION_STOCKS:
+            return jsonify({"error": f"一次最多計算 {MAX_CORRELATION_STOCKS} 支股票"}), 400
+        if len(stock_ids) < 2:
+            return jsonify({"error": "至少需要兩支存在的股票"}), 400
+
+        end = end or datetime.now().date()
+        result = correlation_matrix(stock_ids, start, end, min_periods)
+
+        return jsonify(
+            {
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "min_periods": min_periods,
+                "symbols": [stock["symbol"] for stock in result["stocks"]],
+                "stocks": result["stocks"],
+                "trading_days": result["dates"],
+                "matrix": result["matrix"],
+                "observations": result["observations"],
+            }
+        )
+
+    except Exception as e:
+        return jsonify({"error": f"計算相關係數失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/backtest", methods=["POST"])
+@token_required
+def create_backtest(current_user):
+    """送出回測工作（於行程池中執行），回傳工作 id 供 GET /backtest/<id> 查詢結果"""
+    try:
+        spec = request.get_json(silent=True) or {}
+        try:
+            strategy = parse_strategy(spec)
+            end = spec.get("end_date")
+            end = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.now().date()
+            start = spec.get("start_date")
+            start = (
+                datetime.strptime(start, "%Y-%m-%d").date()
+                if start
+                else end - timedelta(days=DEFAULT_BACKTEST_DAYS)
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"回測設定錯誤: {str(e)}"}), 400
+        if start > end:
+            return jsonify({"error": "start_date 不可晚於 end_date"}), 400
+
+        stock_ids = _universe_ids(
+            _parse_symbols(spec.get("symbols") or ""),
+            str(spec.get("exchange") or "").strip(),
+            str(spec.get("market_type") or "").strip(),
+            MAX_BACKTEST_STOCKS,
+        )
+        if stock_ids is None:
+            return jsonify({"error": "請提供 symbols，或以 exchange / market_type 指定市場區隔"}), 400
+        if len(stock_ids) > MAX_BACKTEST_STOCKS:
+            return jsonify({"error": f"一次最多回測 {MAX_BACKTEST_STOCKS} 支股票"}), 400
+        if not stock_ids:
+            return jsonify({"error": "找不到符合的股票"}), 404
+
+        # 資料在請求中讀取，指標計算與模擬交由行程池
+        panel = load_backtest_panel(stock_ids, start, end, strategy)
+        job_id = backtest_jobs.submit(current_user.id, panel, strategy, start)
+        return jsonify(backtest_jobs.status(job_id, current_user.id)), 202
+
+    except Exception as e:
+        return jsonify({"error": f"建立回測失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/backtest/<job_id>", methods=["GET"])
+@token_required
+def get_backtest(current_user, job_id):
+    """查詢回測工作狀態，完成後包含權益曲線、交易明細與績效統計"""
+    try:
+        status = backtest_jobs.status(job_id, current_user.id)
+        if status is None:
+            return jsonify({"error": "回測工作不存在"}), 404
+        return jsonify(status)
+
+    except Exception as e:
+        return jsonify({"error": f"獲取回測結果失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/market-overview", methods=["GET"])
+@token_required
+def get_market_overview(current_user):
+    """各市場類型的每日趨勢統計（只讀冷資料庫，由 db_manager.py market-trends 產生）"""
+    try:
+        if not cold_database_enabled():
+            return jsonify({"error": "未啟用冷資料庫，無法提供市場概覽"}), 503
+
+        days = min(max(request.args.get("days", 30, type=int), 1), 365)
+        market_type = request.args.get("market_type", "").strip()
+
+        query = MarketTrendAnalysis.query
+        if market_type:
+            query = query.filter(MarketTrendAnalysis.market_type == market_type)
+        latest = query.with_entities(db.func.max(MarketTrendAnalysis.analysis_date)).scalar()
+        if latest is None:
+            return jsonify({"latest_date": None, "days": days, "trends": [], "count": 0})
+
+        rows = (
+            query.filter(MarketTrendAnalysis.analysis_date > latest - timedelta(days=days))
+            .order_by(MarketTrendAnalysis.analysis_date, MarketTrendAnalysis.market_type)
+            .all()
+        )
+        return jsonify(
+            {
+                "latest_date": latest.isoformat(),
+                "days": days,
+                "trends": [row.to_dict() for row in rows],
+                "count": len(rows),
+            }
+        )
+
+    except Exception as e:
+        return jsonify({"error": f"獲取市場概覽失敗: {str(e)}"}), 500
+
+
+@stocks_bp.route("/statistics", methods=["GET"])
+@token_required
+def get_market_statistics(current_user):
+    """獲取市場統計資訊（依資料版本快取）"""
+    try:
+        version = market_statistics_version()
+        validator = ConditionalGet(version, version[1])
+        if validator.is_fresh():
+            return validator.not_modified()
+
+        return validator.apply(jsonify(market_statistics(version)))
+
     except Exception as e:
         return jsonify({"error": f"獲取統計資料失敗: {str(e)}"}), 500
+
+
+@socketio.on("subscribe_quotes")
+def handle_subscribe_quotes(data):
+    """訂閱報價推播：加入 quote:<symbol> 房間，並立即回傳目前報價"""
+    try:
+        symbols = _parse_symbols((data or {}).get("symbols") or [])
+        if not symbols:
+            emit("error", {"message": "缺少必要參數"})
+            return
+        if len(symbols) > MAX_QUOTE_SYMBOLS:
+            emit("error", {"message": f"一次最多訂閱 {MAX_QUOTE_SYMBOLS} 支股票"})
+            return
+
+        for symbol in symbols:
+            join_room(room_for(symbol))
+
+        emit(
+            "subscribed_quotes",
+            {"symbols": symbols, "quotes": load_quote_payloads(symbols=symbols)},
+        )
+
+    except Exception as e:
+        print(f"訂閱報價錯誤: {e}")
+        emit("error", {"message": "訂閱報價失敗"})
+
+
+@socketio.on("unsubscribe_quotes")
+def handle_unsubscribe_quotes(data):
+    """取消訂閱報價推播"""
+    try:
+        symbols = _parse_symbols((data or {}).get("symbols") or [])
+        for symbol in symbols:
+            leave_room(room_for(symbol))
+        emit("unsubscribed_quotes", {"symbols": symbols})
+
+    except Exception as e:
+        print(f"取消訂閱報價錯誤: {e}")
+        emit("error", {"message": "取消訂閱報價失敗"})
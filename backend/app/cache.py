@@ -0,0 +1,65 @@
+"""
+行程內快取工具
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """執行緒安全的固定容量 LRU 快取"""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._inflight = {}  # 計算中的鍵 -> 鎖
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+            if value is self._MISSING:
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """取得快取值；未命中時同一個鍵只由一個執行緒呼叫 factory，其餘等待其結果"""
+        value = self.get(key, self._MISSING)
+        if value is not self._MISSING:
+            return value
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                value = self.get(key, self._MISSING)
+                if value is self._MISSING:
+                    value = factory()
+                    self.set(key, value)
+                return value
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+
+    def invalidate(self, predicate=None):
+        """移除符合條件的鍵（predicate 為 None 時清空）"""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
@@ -0,0 +1,136 @@
+"""
+欄式二進位回應 - 以型別陣列傳送價格序列，取代逐筆 to_dict 的 JSON
+
+用戶端以 Accept 標頭選擇格式：
+    application/x-msgpack（或 application/msgpack）
+        {"length": n, "metadata": {...}, "columns": [{"name", "type", "data"}, ...]}
+        float64 / int64 / date32 欄位的 data 為 little-endian 原始位元組
+        （date32 為 1970-01-01 起的天數），string 欄位為字串陣列；NULL 以 NaN 表示。
+    application/vnd.apache.arrow.stream
+        Arrow IPC 串流（單一 RecordBatch），metadata 以 JSON 存於 schema 的
+        "metadata" 鍵；需安裝 pyarrow。
+整數欄位（volume 等）與價格快取相同以 float64 傳送，2^53 以內可精確表示。
+"""
+import json
+
+import msgpack
+import numpy as np
+from flask import current_app, request
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow 為選用相依，未安裝時不提供 Arrow 格式
+    pa = None
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_MSGPACK_ALIASES = ("application/msgpack",)
+
+_DTYPES = {"float64": "<f8", "int64": "<i8", "date32": "<i4"}
+
+
+def arrow_available():
+    return pa is not None
+
+
+def negotiate():
+    """依 Accept 標頭選擇回應格式，回傳 MIME 類型；要求 Arrow 但未安裝 pyarrow 時回傳 None"""
+    accept = request.accept_mimetypes
+    offered = [JSON, MSGPACK, *_MSGPACK_ALIASES, ARROW]
+    best = accept.best_match(offered, default=JSON)
+    if best in _MSGPACK_ALIASES:
+        return MSGPACK
+    if best == ARROW and pa is None:
+        # 用戶端同時接受 JSON 時退回 JSON，只接受 Arrow 時無法滿足
+        fallback = accept.best_match([JSON, MSGPACK, *_MSGPACK_ALIASES])
+        if fallback is None:
+            return None
+        return MSGPACK if fallback in _MSGPACK_ALIASES else fallback
+    return best
+
+
+def columnar_response(columns, mimetype, metadata=None):
+    """將 欄位名稱 -> 陣列 編碼為指定格式的回應
+
+    陣列型別：datetime64[D] 為日期，浮點數為 float64，整數為 int64，
+    其他（字串列表）為 string。
+    """
+    metadata = metadata or {}
+    if mimetype == ARROW:
+        body = encode_arrow(columns, metadata)
+    else:
+        body = encode_msgpack(columns, metadata)
+    return current_app.response_class(body, mimetype=mimetype)
+
+
+def _column_type(values):
+    if isinstance(values, np.ndarray):
+        if np.issubdtype(values.dtype, np.datetime64):
+            return "date32"
+        if np.issubdtype(values.dtype, np.integer):
+            return "int64"
+        if np.issubdtype(values.dtype, np.floating):
+            return "float64"
+    return "string"
+
+
+def _typed(values, kind):
+    if kind == "date32":
+        return values.astype("datetime64[D]").astype(_DTYPES[kind])
+    return np.asarray(values, dtype=_DTYPES[kind])
+
+
+def encode_msgpack(columns, metadata=None):
+    length = 0
+    encoded = []
+    for name, values in columns.items():
+        kind = _column_type(values)
+        if kind == "string":
+            data = [None if value is None else str(value) for value in values]
+        else:
+            data = _typed(values, kind).tobytes()
+        encoded.append({"name": name, "type": kind, "data": data})
+        length = len(values)
+    payload = {"length": length, "metadata": metadata or {}, "columns": encoded}
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def decode_msgpack(body):
+    """encode_msgpack 的反向操作（供 Python 用戶端與測試使用），回傳 (欄位, metadata)"""
+    payload = msgpack.unpackb(body, raw=False)
+    columns = {}
+    for column in payload["columns"]:
+        kind, data = column["type"], column["data"]
+        if kind == "string":
+            columns[column["name"]] = data
+        elif kind == "date32":
+            columns[column["name"]] = np.frombuffer(data, "<i4").astype("datetime64[D]")
+        else:
+            columns[column["name"]] = np.frombuffer(data, _DTYPES[kind])
+    return columns, payload["metadata"]
+
+
+def encode_arrow(columns, metadata=None):
+    if pa is None:
+        raise RuntimeError("未安裝 pyarrow，無法輸出 Arrow 格式")
+
+    arrays = []
+    for values in columns.values():
+        kind = _column_type(values)
+        if kind == "date32":
+            arrays.append(pa.array(_typed(values, kind), type=pa.int32()).cast(pa.date32()))
+        elif kind == "float64":
+            arrays.append(pa.array(_typed(values, kind), from_pandas=True))
+        elif kind == "int64":
+            arrays.append(pa.array(_typed(values, kind)))
+        else:
+            arrays.append(pa.array(list(values), type=pa.string()))
+
+    batch = pa.RecordBatch.from_arrays(arrays, names=list(columns))
+    schema = batch.schema.with_metadata({"metadata": json.dumps(metadata or {})})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+    return sink.getvalue().to_pybytes()
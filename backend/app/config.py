@@ -21,6 +21,13 @@ class Config:
     # Redis
     REDIS_URL = os.environ.get("REDIS_URL") or "redis://localhost:6379/0"
 
+    # Socket.IO message queue (e.g. redis://stock-insight-redis:6379/0) so that importer
+    # processes and multiple workers can emit to the same clients; unset = in-process only
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+
+    # Quote pushes within this window are coalesced per symbol (latest quote wins)
+    QUOTE_PUSH_COALESCE_MS = int(os.environ.get("QUOTE_PUSH_COALESCE_MS", 500))
+
     # JWT Configuration
     JWT_SECRET_KEY = SECRET_KEY
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(
@@ -38,6 +45,15 @@ class Config:
     LOG_DIR = os.path.join(basedir, "..", "logs")
     LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
+    # In-process price cache (NumPy arrays per stock)
+    PRICE_CACHE_MAX_MB = int(os.environ.get("PRICE_CACHE_MAX_MB", 256))
+
+    # Backtest worker processes (0 = run inside the request, for development and tests)
+    BACKTEST_WORKERS = int(os.environ.get("BACKTEST_WORKERS", 2))
+
+    # In-memory stock search index: seconds between staleness checks against the stocks table
+    SEARCH_INDEX_CHECK_SECONDS = int(os.environ.get("SEARCH_INDEX_CHECK_SECONDS", 30))
+
     # API Keys (for future use)
     STOCK_API_KEY = os.environ.get("STOCK_API_KEY")
     NEWS_API_KEY = os.environ.get("NEWS_API_KEY")
@@ -74,6 +90,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    BACKTEST_WORKERS = 0
 
 
 class DualDatabaseConfig(Config):
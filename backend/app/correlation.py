@@ -0,0 +1,75 @@
+"""
+報酬相關係數矩陣 - 在 股票 × 交易日 矩陣上一次計算所有配對
+
+日報酬以 change_amount / (close_price - change_amount) 計算，前一交易日缺漏
+（停牌）時仍能得到正確報酬。各配對只使用兩者皆有報酬的交易日（pairwise），
+以矩陣乘法一次求出所有配對的重疊天數、總和與平方和。
+"""
+import numpy as np
+
+from .cache import LRUCache
+from .models import LatestQuote
+from .price_cache import load_price_panel
+
+# (全市場版本, 股票 id 組合, 起日, 迄日, 最少重疊天數) -> 結果
+correlation_cache = LRUCache(maxsize=64)
+
+
+def daily_returns(close, change):
+    """由收盤價與漲跌價差計算日報酬，無法計算的位置為 NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        previous = close - change
+        returns = change / previous
+    return np.where(np.isfinite(returns) & (previous > 0), returns, np.nan)
+
+
+def pairwise_correlation(returns, min_periods=2):
+    """對 (股票數, 交易日數) 的報酬矩陣計算 Pearson 相關係數，回傳 (相關係數, 重疊天數)
+
+    重疊天數不足 min_periods 或任一方變異為 0 的配對為 NaN。
+    """
+    valid = ~np.isnan(returns)
+    mask = valid.astype(np.float64)
+    values = np.where(valid, returns, 0.0)
+    squares = values * values
+
+    count = mask @ mask.T
+    sum_x = values @ mask.T  # [i, j]：i 在兩者皆有資料日的報酬總和
+    sum_y = sum_x.T
+    sum_xy = values @ values.T
+    sum_xx = squares @ mask.T
+    sum_yy = sum_xx.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / count
+        var_x = sum_xx - sum_x * sum_x / count
+        var_y = sum_yy - sum_y * sum_y / count
+        corr = cov / np.sqrt(var_x * var_y)
+
+    # 浮點誤差可能讓結果略超出 [-1, 1]
+    corr = np.clip(corr, -1.0, 1.0)
+    corr[(count < min_periods) | ~np.isfinite(corr)] = np.nan
+    np.fill_diagonal(corr, np.where(np.diag(count) >= min_periods, 1.0, np.nan))
+    return corr, count.astype(np.int64)
+
+
+def correlation_matrix(stock_ids, start, end, min_periods=20):
+    """計算股票在 [start, end] 的報酬相關係數矩陣（依資料版本快取）"""
+    stock_ids = tuple(sorted(set(stock_ids)))
+    key = (LatestQuote.market_version(), stock_ids, start, end, min_periods)
+    return correlation_cache.get_or_set(
+        key, lambda: _compute(stock_ids, start, end, min_periods)
+    )
+
+
+def _compute(stock_ids, start, end, min_periods):
+    panel = load_price_panel(start, end, stock_ids, fields=("close_price", "change_amount"))
+    returns = daily_returns(panel["close_price"], panel["change_amount"])
+    corr, count = pairwise_correlation(returns, min_periods)
+
+    return {
+        "stocks": panel.stocks,
+        "dates": len(panel.dates),
+        "matrix": [[None if np.isnan(v) else round(v, 4) for v in row] for row in corr.tolist()],
+        "observations": count.tolist(),
+    }
@@ -6,6 +6,21 @@ from typing import Dict, Any, Optional
 from sqlalchemy import text, Column, Integer, String, DateTime, Text, Boolean, Numeric
 from sqlalchemy.dialects import mssql, postgresql
 from datetime import datetime
+from itertools import islice
+
+
+def chunked(iterable, size=1000):
+    """依序切成每批最多 size 筆的列表
+
+    MSSQL 單一語句最多 2100 個綁定參數（DatabaseAdapter.MSSQL_MAX_PARAMETERS），
+    以 IN (...) 篩選大量 id 或代號時每批 1000 筆，並保留其他條件使用的參數。
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class DatabaseAdapter:
@@ -164,6 +179,40 @@ class DatabaseAdapter:
             # 其他數據庫使用 LIMIT - 使用 format 而不是 f-string
             return "{} LIMIT {}".format(query, int(limit))
     
+    def get_latest_rows_query(self, table: str, columns: list, partition_column: str,
+                              order_column: str, where: Optional[str] = None,
+                              max_rank: int = 1) -> str:
+        """獲取每組最新 N 筆記錄的查詢，結果附帶 row_rank 欄位（1 為最新）
+
+        PostgreSQL 取單筆時使用 DISTINCT ON，其餘情況使用 ROW_NUMBER 視窗函數
+        （MSSQL、PostgreSQL 與 SQLite 3.25+ 皆支援）。where 為內部組成的條件片段，
+        值必須以綁定參數傳入。
+        """
+        # 驗證參數以防止 SQL 注入
+        for identifier in [table, partition_column, order_column, *columns]:
+            if not isinstance(identifier, str) or not identifier.replace('_', '').isalnum():
+                raise ValueError("表名與欄位名稱只能包含字母、數字和底線")
+        if not isinstance(max_rank, int) or max_rank < 1 or max_rank > 100:
+            raise ValueError("max_rank 必須是 1-100 之間的整數")
+
+        columns_str = ', '.join(columns)
+        where_clause = " WHERE {}".format(where) if where else ""
+
+        if self.is_postgresql and max_rank == 1:
+            return (
+                "SELECT DISTINCT ON ({partition}) {columns}, 1 AS row_rank FROM {table}{where} "
+                "ORDER BY {partition}, {order} DESC"
+            ).format(partition=partition_column, columns=columns_str, table=table,
+                     where=where_clause, order=order_column)
+
+        return (
+            "SELECT {columns}, row_rank FROM ("
+            "SELECT {columns}, ROW_NUMBER() OVER "
+            "(PARTITION BY {partition} ORDER BY {order} DESC) AS row_rank "
+            "FROM {table}{where}) ranked WHERE row_rank <= {max_rank}"
+        ).format(columns=columns_str, partition=partition_column, order=order_column,
+                 table=table, where=where_clause, max_rank=int(max_rank))
+
     def escape_identifier(self, identifier: str) -> str:
         """轉義標識符"""
         # 驗證標識符以防止 SQL 注入
@@ -195,64 +244,94 @@ class DatabaseAdapter:
         else:
             return "{} LIKE '%{}%'".format(column, safe_search_term)
     
-    def get_upsert_query(self, table: str, columns: Dict[str, Any], 
-                        conflict_columns: list) -> str:
-        """獲取 UPSERT 查詢語法"""
+    # 單一語句的綁定參數上限（MSSQL 2100、舊版 SQLite 999）與 VALUES 列數上限
+    MSSQL_MAX_PARAMETERS = 2100
+    POSTGRESQL_MAX_PARAMETERS = 32767
+    GENERIC_MAX_PARAMETERS = 999
+    MAX_VALUES_ROWS = 1000
+
+    def get_upsert_query(self, table: str, columns: Dict[str, Any],
+                         conflict_columns: list, rows: int = 1,
+                         update: bool = True) -> str:
+        """獲取多列 UPSERT 查詢語法
+
+        columns 的鍵為寫入的欄位，第 i 列的值以綁定參數 :{欄位}_{i} 傳入（見
+        get_upsert_params）。衝突以 conflict_columns（須有唯一約束）判斷；update 為
+        False 時已存在的列保持不變，只新增不存在的列。
+        """
+        column_names = list(columns)
+        for identifier in [table, *column_names, *conflict_columns]:
+            if not isinstance(identifier, str) or not identifier.replace('_', '').isalnum():
+                raise ValueError("表名與欄位名稱只能包含字母、數字和底線")
+        if not conflict_columns or any(col not in column_names for col in conflict_columns):
+            raise ValueError("衝突欄位必須包含在寫入欄位中")
+        max_rows = self.get_max_upsert_rows(len(column_names))
+        if not isinstance(rows, int) or rows < 1 or rows > max_rows:
+            raise ValueError("rows 超過單一語句可寫入的列數")
+
+        update_columns = []
+        if update:
+            update_columns = [col for col in column_names if col not in conflict_columns]
         if self.is_mssql:
             # MSSQL 使用 MERGE
-            return self._get_mssql_merge_query(table, columns, conflict_columns)
+            return self._get_mssql_merge_query(table, column_names, conflict_columns,
+                                               rows, update_columns)
+        # PostgreSQL 與 SQLite 3.24+ 皆支援 ON CONFLICT
+        return self._get_on_conflict_query(table, column_names, conflict_columns,
+                                           rows, update_columns)
+
+    def get_max_upsert_rows(self, column_count: int) -> int:
+        """單一 UPSERT 語句最多可寫入的列數"""
+        if self.is_mssql:
+            limit = self.MSSQL_MAX_PARAMETERS - 1
         elif self.is_postgresql:
-            # PostgreSQL 使用 ON CONFLICT
-            return self._get_postgresql_upsert_query(table, columns, conflict_columns)
+            limit = self.POSTGRESQL_MAX_PARAMETERS
         else:
-            # 通用的 INSERT OR REPLACE
-            return self._get_generic_upsert_query(table, columns, conflict_columns)
-    
-    def _get_mssql_merge_query(self, table: str, columns: Dict[str, Any], 
-                              conflict_columns: list) -> str:
-        """生成 MSSQL MERGE 查詢"""
-        # 驗證表名和欄位名
-        if not isinstance(table, str) or not table.replace('_', '').isalnum():
-            raise ValueError("表名只能包含字母、數字和底線")
-        for key in columns.keys():
-            if not isinstance(key, str) or not key.replace('_', '').isalnum():
-                raise ValueError("欄位名稱只能包含字母、數字和底線")
-        
-        # 簡化實現，實際使用時可以擴展
-        set_parts = []
-        for k in columns.keys():
-            set_parts.append("{} = VALUES({})".format(k, k))
-        set_clause = ', '.join(set_parts)
-        return "INSERT INTO {} ... ON DUPLICATE KEY UPDATE {}".format(table, set_clause)
-    
-    def _get_postgresql_upsert_query(self, table: str, columns: Dict[str, Any], 
-                                   conflict_columns: list) -> str:
-        """生成 PostgreSQL ON CONFLICT 查詢"""
-        # 驗證表名和欄位名
-        if not isinstance(table, str) or not table.replace('_', '').isalnum():
-            raise ValueError("表名只能包含字母、數字和底線")
-        for key in columns.keys():
-            if not isinstance(key, str) or not key.replace('_', '').isalnum():
-                raise ValueError("欄位名稱只能包含字母、數字和底線")
-        for col in conflict_columns:
-            if not isinstance(col, str) or not col.replace('_', '').isalnum():
-                raise ValueError("衝突欄位名稱只能包含字母、數字和底線")
-        
-        conflict_cols = ', '.join(conflict_columns)
-        set_parts = []
-        for k in columns.keys():
-            if k not in conflict_columns:
-                set_parts.append("{} = EXCLUDED.{}".format(k, k))
-        set_clause = ', '.join(set_parts)
-        return "INSERT INTO {} ... ON CONFLICT ({}) DO UPDATE SET {}".format(table, conflict_cols, set_clause)
-    
-    def _get_generic_upsert_query(self, table: str, columns: Dict[str, Any], 
-                                 conflict_columns: list) -> str:
-        """生成通用 UPSERT 查詢"""
-        # 驗證表名
-        if not isinstance(table, str) or not table.replace('_', '').isalnum():
-            raise ValueError("表名只能包含字母、數字和底線")
-        return "INSERT OR REPLACE INTO {} ...".format(table)
+            limit = self.GENERIC_MAX_PARAMETERS
+        return max(1, min(self.MAX_VALUES_ROWS, limit // max(column_count, 1)))
+
+    @staticmethod
+    def get_upsert_params(rows: list, columns) -> Dict[str, Any]:
+        """將 dict 列表轉為 get_upsert_query 使用的綁定參數"""
+        params = {}
+        for i, row in enumerate(rows):
+            for col in columns:
+                params["{}_{}".format(col, i)] = row.get(col)
+        return params
+
+    @staticmethod
+    def _values_rows(columns: list, rows: int) -> str:
+        return ', '.join(
+            "({})".format(', '.join(":{}_{}".format(col, i) for col in columns))
+            for i in range(rows)
+        )
+
+    def _get_mssql_merge_query(self, table: str, columns: list, conflict_columns: list,
+                               rows: int, update_columns: list) -> str:
+        """生成 MSSQL MERGE 查詢（HOLDLOCK 避免並行寫入同一鍵時的競爭）"""
+        columns_str = ', '.join(columns)
+        on_clause = ' AND '.join("target.{0} = source.{0}".format(col) for col in conflict_columns)
+        query = (
+            "MERGE INTO {table} WITH (HOLDLOCK) AS target "
+            "USING (VALUES {values}) AS source ({columns}) ON {on}"
+        ).format(table=table, values=self._values_rows(columns, rows), columns=columns_str,
+                 on=on_clause)
+        if update_columns:
+            query += " WHEN MATCHED THEN UPDATE SET {}".format(
+                ', '.join("{0} = source.{0}".format(col) for col in update_columns))
+        query += " WHEN NOT MATCHED THEN INSERT ({}) VALUES ({});".format(
+            columns_str, ', '.join("source.{}".format(col) for col in columns))
+        return query
+
+    def _get_on_conflict_query(self, table: str, columns: list, conflict_columns: list,
+                               rows: int, update_columns: list) -> str:
+        """生成 INSERT ... ON CONFLICT 查詢"""
+        query = "INSERT INTO {} ({}) VALUES {} ON CONFLICT ({})".format(
+            table, ', '.join(columns), self._values_rows(columns, rows), ', '.join(conflict_columns))
+        if update_columns:
+            return query + " DO UPDATE SET {}".format(
+                ', '.join("{0} = EXCLUDED.{0}".format(col) for col in update_columns))
+        return query + " DO NOTHING"
 
 
 class ModelFieldAdapter:
@@ -0,0 +1,46 @@
+"""
+圖表降採樣 - Largest-Triangle-Three-Buckets (LTTB)
+
+在保留走勢形狀（高點、低點、轉折）的前提下，把長序列縮減為固定點數，
+避免長區間圖表截斷資料或傳送過大的回應。
+"""
+import numpy as np
+
+
+def lttb(x, y, max_points):
+    """回傳保留點的索引（遞增）；NaN 的點不會被選取，點數不超過 max_points 時全部保留"""
+    if max_points < 3:
+        raise ValueError("max_points 至少為 3")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= max_points:
+        return valid
+
+    vx, vy = x[valid], y[valid]
+    n = len(valid)
+    # 頭尾固定保留，中間切成 max_points - 2 個桶
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        # 下一個桶的平均點（最後一個桶以終點代替）
+        if bucket + 2 < len(edges):
+            next_lo, next_hi = edges[bucket + 1], edges[bucket + 2]
+            avg_x, avg_y = vx[next_lo:next_hi].mean(), vy[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = vx[-1], vy[-1]
+
+        # 與前一個選取點、下一桶平均點構成的三角形面積最大者
+        areas = np.abs(
+            (vx[previous] - avg_x) * (vy[lo:hi] - vy[previous])
+            - (vx[previous] - vx[lo:hi]) * (avg_y - vy[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return valid[selected]
@@ -0,0 +1,74 @@
+"""
+條件式 GET - 以資料版本產生 ETag / Last-Modified，未變更時回傳 304
+
+價格相關回應只會在匯入新交易日後改變，版本取自 latest_quotes 的
+(trade_date, refreshed_at)；以天數指定日期區間的回應另隨當天日期改變。
+端點先以版本判斷，304 時不執行查詢主體也不序列化回應。
+"""
+import hashlib
+from datetime import datetime, time, timezone
+
+from flask import current_app, request
+
+
+class ConditionalGet:
+    """由資料版本推導的回應驗證器
+
+    ETag 同時包含路徑與查詢參數，不同參數的回應不會共用；variant 為依 Accept
+    協商出的回應格式，有指定時 ETag 也隨之不同並附上 Vary: Accept。
+    """
+
+    def __init__(self, version, last_modified=None, variant=None):
+        self.variant = variant
+        key = (request.path, sorted(request.args.items(multi=True)), version, variant)
+        self.etag = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        # HTTP 日期只到秒；資料庫中的時間為 UTC
+        self.last_modified = (
+            last_modified.replace(microsecond=0, tzinfo=timezone.utc) if last_modified else None
+        )
+
+    def is_fresh(self):
+        """用戶端的快取是否仍然有效（有 If-None-Match 時優先判斷，忽略 If-Modified-Since）"""
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        since = request.if_modified_since
+        return self.last_modified is not None and since is not None and self.last_modified <= since
+
+    def not_modified(self):
+        return self.apply(current_app.response_class(status=304))
+
+    def apply(self, response):
+        """為成功的回應附上驗證標頭"""
+        response.set_etag(self.etag)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified
+        # 允許瀏覽器保存，但每次使用前都需向伺服器驗證
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        if self.variant is not None:
+            response.vary.add("Accept")
+        return response
+
+
+def stock_validator(stock, latest_quote, variant=None, window=None):
+    """單支股票回應的驗證器：股票資料更新時間 + 最新交易日 + 匯入世代（投影刷新時間）
+
+    window 為解析後的 (start, end) 日期區間；以天數指定（end 為 None）的區間隨日期
+    移動，沒有新的匯入時 ETag 與 Last-Modified 也會在隔天改變。
+    """
+    changed = [stock.updated_at]
+    version = (stock.id, stock.updated_at, None, None, window)
+    if latest_quote is not None:
+        changed.append(latest_quote.refreshed_at)
+        version = (
+            stock.id,
+            stock.updated_at,
+            latest_quote.trade_date,
+            latest_quote.refreshed_at,
+            window,
+        )
+    if window is not None and window[1] is None:
+        # 本地午夜換算為 UTC，與 _parse_date_range 以本地日期計算的起日一致
+        midnight = datetime.combine(datetime.now().date(), time())
+        changed.append(midnight.astimezone(timezone.utc).replace(tzinfo=None))
+    return ConditionalGet(version, max((t for t in changed if t), default=None), variant)
@@ -0,0 +1,218 @@
+"""
+技術指標計算 - 以 NumPy 向量化計算，沿最後一個軸（時間軸）運算
+
+所有函數接受 shape 為 (..., T) 的 float 陣列，可同時計算單支股票或多支股票；
+資料不足的位置以 NaN 表示。遞迴型指標（EMA、RSI、MACD）遇到序列中間的 NaN
+會使其後的值皆為 NaN，單支股票請透過 compute_indicators 排除無成交日。
+"""
+import re
+
+import numpy as np
+
+from .cache import LRUCache
+
+# 指標名稱 -> 預設週期
+INDICATOR_DEFAULTS = {"sma": 20, "ema": 12, "rsi": 14, "macd": None, "bbands": 20}
+MAX_PERIOD = 250
+
+_INDICATOR_PATTERN = re.compile(r"^(sma|ema|rsi|macd|bbands)(\d+)?$")
+
+# (stock_id, 報價版本, 指標組合) -> 計算結果
+indicator_cache = LRUCache(maxsize=512)
+
+
+def sma(values, window):
+    """簡單移動平均；視窗內任一值為 NaN 時結果為 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    if window < 1 or values.shape[-1] < window:
+        return result
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    sums = _rolling_sum(filled, window)
+    counts = _rolling_sum(valid.astype(np.float64), window)
+    result[..., window - 1 :] = np.where(counts == window, sums / window, np.nan)
+    return result
+
+
+def rolling_std(values, window):
+    """移動母體標準差（ddof=0）"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = sma(values, window)
+    mean_of_squares = sma(values * values, window)
+    return np.sqrt(np.maximum(mean_of_squares - mean * mean, 0.0))
+
+
+def ema(values, span):
+    """指數移動平均，以前 span 筆的簡單平均作為起始值"""
+    return _recursive_smooth(values, 2.0 / (span + 1), span)
+
+
+def rsi(close, period=14):
+    """相對強弱指標（Wilder 平滑）"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.full(close.shape, np.nan)
+    delta[..., 1:] = np.diff(close, axis=-1)
+
+    gains = np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0))
+    losses = np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0))
+    avg_gain = _recursive_smooth(gains, 1.0 / period, period)
+    avg_loss = _recursive_smooth(losses, 1.0 / period, period)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        result = 100.0 - 100.0 / (1.0 + rs)
+    # 期間內完全沒有下跌時 RSI 為 100
+    return np.where((avg_loss == 0) & ~np.isnan(avg_gain), 100.0, result)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD 線、訊號線與柱狀體"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+
+def bbands(close, window=20, num_std=2.0):
+    """布林通道"""
+    middle = sma(close, window)
+    deviation = rolling_std(close, window) * num_std
+    return {"upper": middle + deviation, "middle": middle, "lower": middle - deviation}
+
+
+def forward_fill(values):
+    """沿時間軸以前一個有效值填補 NaN（序列開頭的 NaN 保留）"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(values.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    filled = np.take_along_axis(values, index, axis=-1)
+    # 第一個有效值之前仍為 NaN
+    return np.where(np.maximum.accumulate(valid, axis=-1), filled, np.nan)
+
+
+def parse_indicator_set(spec):
+    """解析 "sma20,ema12,rsi14,macd,bbands" 格式，回傳 [(名稱, 類型, 週期)]"""
+    indicators = []
+    for token in (part.strip().lower() for part in spec.split(",")):
+        if not token:
+            continue
+        match = _INDICATOR_PATTERN.match(token)
+        if not match:
+            raise ValueError(f"不支援的指標: {token}")
+
+        kind, period = match.group(1), match.group(2)
+        if kind == "macd":
+            if period:
+                raise ValueError("macd 不接受週期參數")
+            period = None
+        else:
+            period = int(period) if period else INDICATOR_DEFAULTS[kind]
+            if not 1 <= period <= MAX_PERIOD:
+                raise ValueError(f"{token} 的週期必須介於 1-{MAX_PERIOD}")
+
+        name = kind if period is None else f"{kind}{period}"
+        if name not in [existing[0] for existing in indicators]:
+            indicators.append((name, kind, period))
+
+    if not indicators:
+        raise ValueError("至少需要指定一個指標")
+    return indicators
+
+
+def compute_indicators(close, indicators):
+    """依 parse_indicator_set 的結果計算單支股票的指標，回傳 名稱 -> 陣列或 {子序列: 陣列}
+
+    無成交（收盤價為 NULL）的交易日不參與計算，該日結果為 NaN。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    valid = ~np.isnan(close)
+    compact = _compute_compact(close[valid], indicators)
+
+    def expand(values):
+        if isinstance(values, dict):
+            return {key: expand(sub) for key, sub in values.items()}
+        full = np.full(close.shape, np.nan)
+        full[valid] = values
+        return full
+
+    return {name: expand(values) for name, values in compact.items()}
+
+
+def _compute_compact(close, indicators):
+    results = {}
+    for name, kind, period in indicators:
+        if kind == "sma":
+            results[name] = sma(close, period)
+        elif kind == "ema":
+            results[name] = ema(close, period)
+        elif kind == "rsi":
+            results[name] = rsi(close, period)
+        elif kind == "macd":
+            results[name] = macd(close)
+        elif kind == "bbands":
+            results[name] = bbands(close, period)
+    return results
+
+
+def cached_indicators(series, indicators):
+    """以 (股票, 報價版本, 指標組合) 快取整段歷史的指標，下次匯入前重複呼叫不需重算"""
+    key = (series.stock_id, series.version, tuple(name for name, _, _ in indicators))
+    results = indicator_cache.get(key)
+    if results is None:
+        results = compute_indicators(series["close_price"], indicators)
+        indicator_cache.set(key, results)
+    return results
+
+
+def to_json_values(values, lo=0, hi=None, digits=4):
+    """將陣列切片轉為 JSON 可用的列表，NaN 轉為 None"""
+    if isinstance(values, dict):
+        return {key: to_json_values(sub, lo, hi, digits) for key, sub in values.items()}
+    rounded = np.round(values[lo:hi], digits)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+def _rolling_sum(values, window):
+    """沿時間軸的移動總和，回傳長度為 T - window + 1"""
+    cumulative = np.cumsum(values, axis=-1)
+    sums = cumulative[..., window - 1 :].copy()
+    sums[..., 1:] -= cumulative[..., :-window]
+    return sums
+
+
+def _recursive_smooth(values, alpha, window):
+    """遞迴平滑 s = alpha * x + (1 - alpha) * s，以第一個完整視窗的簡單平均起始
+
+    以分塊的封閉形式 s_j = d^(j+1) * s_prev + alpha * d^j * cumsum(x_k * d^-k) 計算，
+    迴圈次數只與分塊數有關；分塊大小確保 d^-k 不會溢位。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim > 1:
+        return np.apply_along_axis(_recursive_smooth, -1, values, alpha, window)
+
+    result = np.full(values.shape, np.nan)
+    seeds = sma(values, window)
+    seeded = np.flatnonzero(~np.isnan(seeds))
+    if not len(seeded):
+        return result
+
+    start = seeded[0]
+    state = seeds[start]
+    result[start] = state
+    rest = values[start + 1 :]
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        result[start + 1 :] = rest
+        return result
+
+    block = int(max(1, min(256, 600.0 / -np.log(decay))))
+    position = start + 1
+    for offset in range(0, len(rest), block):
+        chunk = rest[offset : offset + block]
+        powers = decay ** np.arange(len(chunk))
+        smoothed = powers * (decay * state + alpha * np.cumsum(chunk / powers))
+        result[position + offset : position + offset + len(chunk)] = smoothed
+        state = smoothed[-1]
+    return result
@@ -0,0 +1,55 @@
+"""
+市場統計 - 以資料版本快取，並發的未命中只觸發一次重新計算
+
+快取鍵為 latest_quotes 的全市場版本加上股票數：匯入腳本刷新投影後版本改變，
+其他行程下次請求即重新計算；同行程的寫入者則由 sync_price_projections 直接清空。
+"""
+from .cache import LRUCache
+from .extensions import db
+from .models import LatestQuote, Stock, StockStatistics
+
+# (全市場版本, 股票數) -> 統計結果
+market_statistics_cache = LRUCache(maxsize=4)
+
+
+def market_statistics_version():
+    """(最新交易日, 最後刷新時間, 有報價的股票數, 股票數)，只查詢兩張小表"""
+    return LatestQuote.market_version() + (Stock.query.count(),)
+
+
+def market_statistics(version=None):
+    """取得市場統計（依資料版本快取），version 可傳入已查詢的版本"""
+    if version is None:
+        version = market_statistics_version()
+    return market_statistics_cache.get_or_set(version, lambda: _compute(version))
+
+
+def _compute(version):
+    latest_update, _, _, total_stocks = version
+
+    # 價格筆數由統計摘要加總，不再 COUNT 整張 stock_prices
+    total_prices = db.session.query(db.func.sum(StockStatistics.total_records)).scalar()
+
+    # 交易所分布
+    exchange_stats = (
+        db.session.query(Stock.exchange, db.func.count(Stock.id)).group_by(Stock.exchange).all()
+    )
+
+    # 市場類型分布
+    market_type_stats = (
+        db.session.query(Stock.market_type, db.func.count(Stock.id))
+        .group_by(Stock.market_type)
+        .all()
+    )
+
+    return {
+        "total_stocks": total_stocks,
+        "total_price_records": int(total_prices or 0),
+        "latest_update": latest_update.isoformat() if latest_update else None,
+        "exchange_distribution": [
+            {"exchange": stat[0], "count": stat[1]} for stat in exchange_stats
+        ],
+        "market_type_distribution": [
+            {"market_type": stat[0] or "一般", "count": stat[1]} for stat in market_type_stats
+        ],
+    }
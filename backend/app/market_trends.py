@@ -0,0 +1,214 @@
+"""
+市場趨勢彙總 - 將每日各市場類型的統計寫入冷資料庫的 market_trend_analysis
+
+每個區間只讀取一次 stock_prices，以 (交易日, 市場類型) 分組後用 bincount
+一次算出所有組的成交量、成交金額、平均漲跌幅與漲跌幅離散程度（volatility_index，
+當日個股漲跌幅的標準差）。寫入時先刪除區間內既有的列再新增，重跑結果相同。
+市場概覽端點只讀冷資料庫，不影響熱資料庫的交易負載。
+已封存到冷資料庫 stock_prices_history 的交易日也一併讀取（同一股票同日以熱資料為準）。
+匯入腳本與監看服務在刷新投影後以 rollup_new_trade_days 彙總有新價格的交易日。
+"""
+from datetime import timedelta
+
+import numpy as np
+from flask import current_app
+
+from .extensions import db
+from .models import Stock, StockPrice
+from .models_cold import MarketTrendAnalysis, StockPriceHistory
+
+# 每批讀取的交易日曆天數，限制單次載入的列數
+CHUNK_DAYS = 31
+# 漲跌停判定（台股漲跌幅限制為 10%，以 9.5% 容許價格跳動單位的誤差）
+LIMIT_MOVE_PCT = 9.5
+
+
+def cold_database_enabled():
+    """是否設定了冷資料庫（DualDatabaseConfig）"""
+    binds = current_app.config.get("SQLALCHEMY_BINDS") or {}
+    return "cold" in binds and current_app.config.get("DUAL_DATABASE_ENABLED", False)
+
+
+def compute_market_trends(dates, market_types, close, change, volume, turnover):
+    """依 (交易日, 市場類型) 分組計算統計，輸入為等長陣列，回傳 MarketTrendAnalysis 欄位 dict 列表"""
+    if not len(dates):
+        return []
+
+    market_types = np.array(["" if m is None else m for m in market_types], dtype=object)
+    type_values, type_index = np.unique(market_types, return_inverse=True)
+    day_values, day_index = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+    groups, group_index = np.unique(day_index * len(type_values) + type_index, return_inverse=True)
+    count = len(groups)
+
+    def total(weights):
+        return np.bincount(group_index, weights=weights, minlength=count)
+
+    close = np.asarray(close, dtype=np.float64)
+    change = np.asarray(change, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        previous = close - change
+        pct = np.where(previous > 0, change / previous * 100, np.nan)
+    valid = ~np.isnan(pct)
+    pct_values = np.where(valid, pct, 0.0)
+    turnover = np.nan_to_num(np.asarray(turnover, dtype=np.float64))
+
+    stocks = total(None)
+    priced = total(valid)
+    pct_sum = total(pct_values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = pct_sum / priced
+        variance = np.maximum(total(pct_values * pct_values) / priced - mean * mean, 0.0)
+        weighted_turnover = total(np.where(valid, turnover, 0.0))
+        weighted = total(pct_values * turnover) / weighted_turnover
+    advancers = total(change > 0)
+    decliners = total(change < 0)
+    unchanged = total(change == 0)
+    limit_up = total(pct_values >= LIMIT_MOVE_PCT)
+    limit_down = total(pct_values <= -LIMIT_MOVE_PCT)
+    total_volume = total(np.nan_to_num(np.asarray(volume, dtype=np.float64)))
+    total_turnover = total(turnover)
+
+    results = []
+    for i, group in enumerate(groups):
+        day, market_type = divmod(int(group), len(type_values))
+        results.append(
+            {
+                "analysis_date": day_values[day].astype(object),
+                "market_type": type_values[market_type] or None,
+                "total_volume": int(total_volume[i]),
+                "total_turnover": int(total_turnover[i]),
+                "avg_price_change": _round(mean[i]),
+                "volatility_index": _round(np.sqrt(variance[i])),
+                "trend_data": {
+                    "stocks": int(stocks[i]),
+                    "advancers": int(advancers[i]),
+                    "decliners": int(decliners[i]),
+                    "unchanged": int(unchanged[i]),
+                    "limit_up": int(limit_up[i]),
+                    "limit_down": int(limit_down[i]),
+                    "advance_decline_ratio": (
+                        _round(advancers[i] / decliners[i]) if decliners[i] else None
+                    ),
+                    "turnover_weighted_change": _round(weighted[i]),
+                },
+            }
+        )
+    return results
+
+
+def _round(value, digits=4):
+    value = float(value)
+    return None if not np.isfinite(value) else round(value, digits)
+
+
+def load_day_prices(start, end):
+    """讀取 [start, end] 的價格與市場類型（熱資料庫，設定冷資料庫時併入已封存的價格）"""
+    rows = (
+        db.session.query(
+            StockPrice.trade_date,
+            Stock.market_type,
+            StockPrice.close_price,
+            StockPrice.change_amount,
+            StockPrice.volume,
+            StockPrice.turnover,
+            StockPrice.stock_id,
+        )
+        .join(Stock, Stock.id == StockPrice.stock_id)
+        .filter(StockPrice.trade_date >= start, StockPrice.trade_date <= end)
+        .all()
+    )
+    if cold_database_enabled():
+        rows += _load_archived_day_prices(start, end, {(row[6], row[0]) for row in rows})
+    columns = list(zip(*rows)) if rows else [[] for _ in range(7)]
+    numeric = [
+        np.array([np.nan if v is None else float(v) for v in column], dtype=np.float64)
+        for column in columns[2:6]
+    ]
+    return (np.array(columns[0], dtype="datetime64[D]"), list(columns[1]), *numeric)
+
+
+def _load_archived_day_prices(start, end, hot_keys):
+    """冷資料庫中 [start, end] 的價格，欄位與 load_day_prices 相同；略過熱資料已有的股票日
+
+    兩個資料庫無法 JOIN，市場類型由熱資料庫的 stocks 對應。
+    """
+    history = StockPriceHistory
+    rows = (
+        db.session.query(
+            history.trade_date,
+            history.stock_id,
+            history.close_price,
+            history.change_amount,
+            history.volume,
+            history.turnover,
+        )
+        .filter(history.trade_date >= start, history.trade_date <= end)
+        .all()
+    )
+    if not rows:
+        return []
+    market_types = dict(db.session.query(Stock.id, Stock.market_type))
+    return [
+        (trade_date, market_types.get(stock_id), close, change, volume, turnover, stock_id)
+        for trade_date, stock_id, close, change, volume, turnover in rows
+        if (stock_id, trade_date) not in hot_keys
+    ]
+
+
+def rollup_new_trade_days(new_since):
+    """匯入後彙總有新價格的交易日（new_since 為 股票 id -> 最早的新交易日），回傳寫入的列數
+
+    也補上次彙總之後尚未彙總的交易日，之前失敗的彙總會在下次匯入時補齊。
+    未設定冷資料庫時不執行。
+    """
+    days = [day for day in new_since.values() if day is not None]
+    if not days or not cold_database_enabled():
+        return 0
+    start = min(days)
+    last = db.session.query(db.func.max(MarketTrendAnalysis.analysis_date)).scalar()
+    if last is not None:
+        start = min(start, last + timedelta(days=1))
+    return rollup_market_trends(start)
+
+
+def rollup_market_trends(start=None, end=None):
+    """計算並寫入 [start, end] 的市場趨勢，回傳寫入的列數
+
+    start 為 None 時自冷資料庫最後一個分析日的隔天開始（尚無資料時從最早的交易日），
+    end 為 None 時到最新交易日。每批在同一個交易中刪除後重新寫入。
+    """
+    if start is None:
+        last = db.session.query(db.func.max(MarketTrendAnalysis.analysis_date)).scalar()
+        start = last + timedelta(days=1) if last else _first_trade_date()
+    if end is None:
+        end = db.session.query(db.func.max(StockPrice.trade_date)).scalar()
+    if start is None or end is None or start > end:
+        return 0
+
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), end)
+        trends = compute_market_trends(*load_day_prices(chunk_start, chunk_end))
+        try:
+            MarketTrendAnalysis.query.filter(
+                MarketTrendAnalysis.analysis_date >= chunk_start,
+                MarketTrendAnalysis.analysis_date <= chunk_end,
+            ).delete(synchronize_session=False)
+            db.session.add_all(MarketTrendAnalysis(**trend) for trend in trends)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        written += len(trends)
+        chunk_start = chunk_end + timedelta(days=1)
+    return written
+
+
+def _first_trade_date():
+    """最早的交易日（設定冷資料庫時包含已封存的價格）"""
+    first = db.session.query(db.func.min(StockPrice.trade_date)).scalar()
+    if cold_database_enabled():
+        archived = db.session.query(db.func.min(StockPriceHistory.trade_date)).scalar()
+        first = min(filter(None, (first, archived)), default=None)
+    return first
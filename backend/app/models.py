@@ -1,13 +1,18 @@
+import itertools
+import operator
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
+import numpy as np
 from cryptography.fernet import Fernet
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy.types import LargeBinary
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from .database_adapter import chunked
 from .extensions import db
+from .models_cold import StockPriceHistory
 
 # This should be set as an environment variable in a real application
 _fernet_key = os.environ.get("FERNET_KEY")
@@ -77,6 +82,9 @@ class UserStock(db.Model):
     __tablename__ = "user_stocks"
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
     stock_id = db.Column(db.Integer, db.ForeignKey("stocks.id"), primary_key=True)
+    # 持股資訊（選填）：股數與每股平均成本
+    quantity = db.Column(db.Numeric(18, 4))
+    cost_basis = db.Column(db.Numeric(12, 4))
 
     user = relationship("User", back_populates="stocks")
     stock = relationship("Stock", back_populates="users")
@@ -94,6 +102,12 @@ class Stock(db.Model):
 
     users = relationship("UserStock", back_populates="stock")
     prices = relationship("StockPrice", back_populates="stock", cascade="all, delete-orphan")
+    latest_quote = relationship(
+        "LatestQuote", back_populates="stock", uselist=False, cascade="all, delete-orphan"
+    )
+    statistics = relationship(
+        "StockStatistics", back_populates="stock", uselist=False, cascade="all, delete-orphan"
+    )
 
     def to_dict(self):
         return {
@@ -165,6 +179,611 @@ class StockPrice(db.Model):
         return 0
 
 
+class LatestQuote(db.Model):
+    """最新報價投影 - 每支股票一列，由匯入腳本及任何價格寫入者刷新"""
+
+    __tablename__ = "latest_quotes"
+    stock_id = db.Column(db.Integer, db.ForeignKey("stocks.id"), primary_key=True)
+    price_id = db.Column(db.Integer, nullable=False)  # 來源 stock_prices.id
+    trade_date = db.Column(db.Date, nullable=False)
+
+    open_price = db.Column(db.Numeric(10, 2))
+    high_price = db.Column(db.Numeric(10, 2))
+    low_price = db.Column(db.Numeric(10, 2))
+    close_price = db.Column(db.Numeric(10, 2))
+    change_amount = db.Column(db.Numeric(10, 2))
+
+    volume = db.Column(db.BigInteger)
+    turnover = db.Column(db.BigInteger)
+    transaction_count = db.Column(db.Integer)
+
+    created_at = db.Column(db.DateTime)  # 來源價格記錄的建立時間
+    refreshed_at = db.Column(db.DateTime, server_default=db.func.now())  # 投影刷新時間
+
+    stock = relationship("Stock", back_populates="latest_quote")
+
+    # 與 StockPrice 相同的欄位，刷新時直接 INSERT ... SELECT
+    PRICE_COLUMNS = (
+        "trade_date",
+        "open_price",
+        "high_price",
+        "low_price",
+        "close_price",
+        "change_amount",
+        "volume",
+        "turnover",
+        "transaction_count",
+        "created_at",
+    )
+
+    def to_dict(self):
+        """與 StockPrice.to_dict 相同的格式"""
+        return {
+            "id": self.price_id,
+            "stock_id": self.stock_id,
+            "trade_date": self.trade_date.isoformat() if self.trade_date else None,
+            "open_price": float(self.open_price) if self.open_price else None,
+            "high_price": float(self.high_price) if self.high_price else None,
+            "low_price": float(self.low_price) if self.low_price else None,
+            "close_price": float(self.close_price) if self.close_price else None,
+            "change_amount": float(self.change_amount) if self.change_amount else None,
+            "volume": self.volume,
+            "turnover": self.turnover,
+            "transaction_count": self.transaction_count,
+        }
+
+    @property
+    def change_percentage(self):
+        """計算漲跌幅百分比"""
+        if self.close_price and self.change_amount:
+            prev_close = float(self.close_price) - float(self.change_amount)
+            if prev_close != 0:
+                return round((float(self.change_amount) / prev_close) * 100, 2)
+        return 0
+
+    @classmethod
+    def market_version(cls):
+        """全市場資料版本 (最新交易日, 最後刷新時間, 有報價的股票數)，供快取判斷是否過期"""
+        row = db.session.query(
+            db.func.max(cls.trade_date), db.func.max(cls.refreshed_at), db.func.count(cls.stock_id)
+        ).one()
+        return tuple(row)
+
+    @classmethod
+    def refresh(cls, stock_ids=None):
+        """以集合式 SQL 重建最新報價（stock_ids 為 None 時重建全部），由呼叫者 commit"""
+        if stock_ids is None:
+            cls._refresh_chunk(None)
+            return
+
+        for chunk in chunked(sorted(set(stock_ids))):
+            cls._refresh_chunk(chunk)
+
+    @classmethod
+    def _refresh_chunk(cls, stock_ids):
+        latest = db.session.query(
+            StockPrice.stock_id.label("stock_id"),
+            db.func.max(StockPrice.trade_date).label("trade_date"),
+        )
+        if stock_ids is not None:
+            latest = latest.filter(StockPrice.stock_id.in_(stock_ids))
+        latest = latest.group_by(StockPrice.stock_id).subquery()
+
+        source = db.select(
+            StockPrice.stock_id,
+            StockPrice.id,
+            *[getattr(StockPrice, name) for name in cls.PRICE_COLUMNS],
+            db.literal(datetime.utcnow(), type_=db.DateTime),
+        ).select_from(
+            StockPrice.__table__.join(
+                latest,
+                db.and_(
+                    StockPrice.stock_id == latest.c.stock_id,
+                    StockPrice.trade_date == latest.c.trade_date,
+                ),
+            )
+        )
+
+        delete = cls.__table__.delete()
+        if stock_ids is not None:
+            delete = delete.where(cls.stock_id.in_(stock_ids))
+        db.session.execute(delete)
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ["stock_id", "price_id", *cls.PRICE_COLUMNS, "refreshed_at"], source
+            )
+        )
+
+
+class StockStatistics(db.Model):
+    """每支股票的價格統計摘要 - 匯入新交易日時增量更新，詳情頁以主鍵直接讀取"""
+
+    __tablename__ = "stock_statistics"
+    stock_id = db.Column(db.Integer, db.ForeignKey("stocks.id"), primary_key=True)
+    total_records = db.Column(db.Integer, nullable=False, default=0)
+    first_date = db.Column(db.Date)
+    last_date = db.Column(db.Date)
+
+    close_sum = db.Column(db.Numeric(20, 2))  # 收盤價總和，平均價 = close_sum / close_count
+    close_count = db.Column(db.Integer, nullable=False, default=0)  # 有收盤價的筆數
+    max_high = db.Column(db.Numeric(10, 2))  # 歷史最高價
+    min_low = db.Column(db.Numeric(10, 2))  # 歷史最低價
+    high_52w = db.Column(db.Numeric(10, 2))  # 最後交易日往前 52 週最高價
+    low_52w = db.Column(db.Numeric(10, 2))  # 最後交易日往前 52 週最低價
+
+    last_price_id = db.Column(db.Integer, nullable=False, default=0)  # 已納入統計的最大價格 id
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+    stock = relationship("Stock", back_populates="statistics")
+
+    WINDOW_52W = timedelta(days=365)
+
+    def to_dict(self):
+        average = None
+        if self.close_count and self.close_sum is not None:
+            average = round(float(self.close_sum) / self.close_count, 2)
+        return {
+            "total_records": self.total_records,
+            "first_date": self.first_date.isoformat() if self.first_date else None,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+            "average_price": average,
+            "highest_price": float(self.max_high) if self.max_high else None,
+            "lowest_price": float(self.min_low) if self.min_low else None,
+            "high_52w": float(self.high_52w) if self.high_52w else None,
+            "low_52w": float(self.low_52w) if self.low_52w else None,
+        }
+
+    @classmethod
+    def refresh(cls, stock_ids=None, full=False, archive=False):
+        """併入 last_price_id 之後新增的價格（full=True 時整段重算），由呼叫者 commit
+
+        價格資料只會新增，因此以自增 id 作為水位即可涵蓋補匯入的舊交易日；
+        修改或刪除既有價格後請以 full=True 重算。archive=True（設定冷資料庫）時，整段重算
+        與 52 週區間也納入已封存到冷資料庫的價格。回傳 股票 id -> 新併入熱資料價格的最早
+        交易日。
+        """
+        if stock_ids is None:
+            stock_ids = [row[0] for row in db.session.query(Stock.id)]
+        new_since = {}
+        for chunk in chunked(sorted(set(stock_ids))):
+            new_since.update(cls._refresh_chunk(chunk, full, archive))
+        return new_since
+
+    @classmethod
+    def unsynced(cls, stock_ids):
+        """stock_ids 中有價格尚未併入統計（id 大於 last_price_id）的股票 id
+
+        匯入在每個檔案後 commit、最後才刷新投影；中途失敗時以此水位找出仍需刷新的股票，
+        不依賴匯入當次記憶體中的集合。每支股票只以 EXISTS 查看水位之後是否有價格，
+        不彙總整段歷史。
+        """
+        pending = db.session.query(StockPrice.id).filter(
+            StockPrice.stock_id == Stock.id,
+            StockPrice.id > db.func.coalesce(cls.last_price_id, 0),
+        )
+        result = set()
+        for chunk in chunked(sorted(set(stock_ids))):
+            rows = (
+                db.session.query(Stock.id)
+                .outerjoin(cls, cls.stock_id == Stock.id)
+                .filter(Stock.id.in_(chunk), pending.exists())
+            )
+            result.update(row[0] for row in rows)
+        return result
+
+    @classmethod
+    def _refresh_chunk(cls, stock_ids, full, archive):
+        delta = db.session.query(
+            StockPrice.stock_id,
+            db.func.count(StockPrice.id),
+            db.func.min(StockPrice.trade_date),
+            db.func.max(StockPrice.trade_date),
+            db.func.sum(StockPrice.close_price),
+            db.func.count(StockPrice.close_price),
+            db.func.max(StockPrice.high_price),
+            db.func.min(StockPrice.low_price),
+            db.func.max(StockPrice.id),
+        ).filter(StockPrice.stock_id.in_(stock_ids))
+        if not full:
+            delta = delta.outerjoin(cls, cls.stock_id == StockPrice.stock_id).filter(
+                StockPrice.id > db.func.coalesce(cls.last_price_id, 0)
+            )
+        delta = delta.group_by(StockPrice.stock_id).all()
+        hot_first = {row[0]: row[2] for row in delta}
+        if full and archive:
+            delta = cls._with_archived(stock_ids, delta)
+
+        existing = {row.stock_id: row for row in cls.query.filter(cls.stock_id.in_(stock_ids))}
+        if full:
+            for stats in existing.values():
+                stats._reset()
+
+        changed, new_since = [], {}
+        for stock_id, count, first, last, close_sum, close_count, high, low, max_id in delta:
+            stats = existing.get(stock_id)
+            if stats is None:
+                stats = cls(stock_id=stock_id)
+                stats._reset()
+                db.session.add(stats)
+
+            stats.total_records += count
+            stats.first_date = _combine(min, stats.first_date, first)
+            stats.last_date = _combine(max, stats.last_date, last)
+            stats.close_sum = _combine(operator.add, stats.close_sum, close_sum)
+            stats.close_count += close_count
+            stats.max_high = _combine(max, stats.max_high, high)
+            stats.min_low = _combine(min, stats.min_low, low)
+            stats.last_price_id = max(stats.last_price_id, max_id)
+            changed.append(stats)
+            # 週 / 月 K 線與排行只由熱資料重算，封存的交易日保留原結果
+            new_since[stock_id] = hot_first.get(stock_id)
+
+        cls._refresh_52w(changed, archive)
+        return new_since
+
+    @classmethod
+    def _with_archived(cls, stock_ids, delta):
+        """併入冷資料庫中早於各股票熱資料第一個交易日的價格（同一交易日以熱資料為準）"""
+        history = StockPriceHistory
+        hot_first = {row[0]: row[2] for row in delta}
+        conditions = [history.stock_id.in_([s for s in stock_ids if s not in hot_first])]
+        conditions += [
+            db.and_(history.stock_id == stock_id, history.trade_date < first)
+            for stock_id, first in hot_first.items()
+        ]
+        archived = (
+            db.session.query(
+                history.stock_id,
+                db.func.count(history.id),
+                db.func.min(history.trade_date),
+                db.func.max(history.trade_date),
+                db.func.sum(history.close_price),
+                db.func.count(history.close_price),
+                db.func.max(history.high_price),
+                db.func.min(history.low_price),
+            )
+            .filter(db.or_(*conditions))
+            .group_by(history.stock_id)
+        )
+
+        merged = {row[0]: list(row) for row in delta}
+        for stock_id, count, first, last, close_sum, close_count, high, low in archived:
+            row = merged.setdefault(stock_id, [stock_id, 0, None, None, None, 0, None, None, 0])
+            row[1] += count
+            row[2] = _combine(min, row[2], first)
+            row[3] = _combine(max, row[3], last)
+            row[4] = _combine(operator.add, row[4], close_sum)
+            row[5] += close_count
+            row[6] = _combine(max, row[6], high)
+            row[7] = _combine(min, row[7], low)
+        return list(merged.values())
+
+    @classmethod
+    def _refresh_52w(cls, changed, archive=False):
+        """52 週區間會隨最後交易日移動，只能對區間內的價格重新彙總（每支股票約 250 筆）
+
+        archive=True 時區間內已封存的部分由冷資料庫補上（最高 / 最低價不受重複日影響）。
+        """
+        by_last_date = {}
+        for stats in changed:
+            stats.high_52w = stats.low_52w = None
+            by_last_date.setdefault(stats.last_date, {})[stats.stock_id] = stats
+
+        # 同一批匯入的股票通常有相同的最後交易日，因此多半只需一次查詢
+        for last_date, group in by_last_date.items():
+            tables = (StockPrice, StockPriceHistory) if archive else (StockPrice,)
+            for table in tables:
+                rows = (
+                    db.session.query(
+                        table.stock_id,
+                        db.func.max(table.high_price),
+                        db.func.min(table.low_price),
+                    )
+                    .filter(
+                        table.stock_id.in_(list(group)),
+                        table.trade_date > last_date - cls.WINDOW_52W,
+                        table.trade_date <= last_date,
+                    )
+                    .group_by(table.stock_id)
+                )
+                for stock_id, high, low in rows:
+                    stats = group[stock_id]
+                    stats.high_52w = _combine(max, stats.high_52w, high)
+                    stats.low_52w = _combine(min, stats.low_52w, low)
+
+    def _reset(self):
+        self.total_records = 0
+        self.close_count = 0
+        self.last_price_id = 0
+        self.first_date = self.last_date = self.close_sum = None
+        self.max_high = self.min_low = self.high_52w = self.low_52w = None
+
+
+class StockPriceRollup(db.Model):
+    """週 / 月 K 線彙總 - 匯入時由日線預先計算，供長區間圖表使用"""
+
+    __tablename__ = "stock_price_rollups"
+    id = db.Column(db.Integer, primary_key=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey("stocks.id"), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # week / month
+    period_start = db.Column(db.Date, nullable=False)  # 週一或每月一日
+    last_trade_date = db.Column(db.Date, nullable=False)  # 期間內最後交易日
+    trade_days = db.Column(db.Integer, nullable=False)  # 期間內交易日數
+
+    open_price = db.Column(db.Numeric(10, 2))  # 期間第一筆開盤價
+    high_price = db.Column(db.Numeric(10, 2))
+    low_price = db.Column(db.Numeric(10, 2))
+    close_price = db.Column(db.Numeric(10, 2))  # 期間最後一筆收盤價
+    change_amount = db.Column(db.Numeric(10, 2))  # 期間內漲跌價差合計
+
+    volume = db.Column(db.BigInteger)
+    turnover = db.Column(db.BigInteger)
+    transaction_count = db.Column(db.BigInteger)
+
+    __table_args__ = (
+        db.UniqueConstraint("stock_id", "resolution", "period_start", name="uq_rollup_period"),
+    )
+
+    RESOLUTIONS = ("week", "month")
+
+    @staticmethod
+    def period_start_of(resolution, day):
+        if resolution == "week":
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    def to_dict(self):
+        """與 StockPrice.to_dict 相同的欄位，trade_date 為期間起始日"""
+        return {
+            "id": self.id,
+            "stock_id": self.stock_id,
+            "trade_date": self.period_start.isoformat(),
+            "last_trade_date": self.last_trade_date.isoformat(),
+            "trade_days": self.trade_days,
+            "open_price": float(self.open_price) if self.open_price else None,
+            "high_price": float(self.high_price) if self.high_price else None,
+            "low_price": float(self.low_price) if self.low_price else None,
+            "close_price": float(self.close_price) if self.close_price else None,
+            "change_amount": float(self.change_amount) if self.change_amount else None,
+            "volume": self.volume,
+            "turnover": self.turnover,
+            "transaction_count": self.transaction_count,
+        }
+
+    @classmethod
+    def refresh(cls, new_since):
+        """重算 new_since（股票 id -> 最早的新交易日）起受影響的週與月，由呼叫者 commit
+
+        只需重讀最早受影響的週 / 月之後的日線，每日匯入約為每支股票一個月的資料。
+        """
+        by_cutoff = {}
+        for stock_id, day in new_since.items():
+            if day is None:
+                continue
+            cutoff = min(cls.period_start_of(resolution, day) for resolution in cls.RESOLUTIONS)
+            by_cutoff.setdefault(cutoff, []).append(stock_id)
+
+        for cutoff, stock_ids in by_cutoff.items():
+            for chunk in chunked(sorted(stock_ids)):
+                cls._refresh_chunk(chunk, cutoff)
+
+    @classmethod
+    def _refresh_chunk(cls, stock_ids, cutoff):
+        rows = (
+            db.session.query(
+                StockPrice.stock_id,
+                StockPrice.trade_date,
+                StockPrice.open_price,
+                StockPrice.high_price,
+                StockPrice.low_price,
+                StockPrice.close_price,
+                StockPrice.change_amount,
+                StockPrice.volume,
+                StockPrice.turnover,
+                StockPrice.transaction_count,
+            )
+            .filter(StockPrice.stock_id.in_(stock_ids), StockPrice.trade_date >= cutoff)
+            .order_by(StockPrice.stock_id, StockPrice.trade_date)
+            .all()
+        )
+
+        rollups = []
+        for resolution in cls.RESOLUTIONS:
+            groups = itertools.groupby(
+                rows, key=lambda row: (row[0], cls.period_start_of(resolution, row[1]))
+            )
+            for (stock_id, period_start), period in groups:
+                period = list(period)
+                if period_start < cutoff:
+                    # 起始早於 cutoff 的週 / 月不含新資料，這裡也只讀到部分日線，保留原彙總
+                    continue
+                rollups.append(cls._aggregate(stock_id, resolution, period_start, period))
+
+        db.session.execute(
+            cls.__table__.delete().where(
+                db.and_(cls.stock_id.in_(stock_ids), cls.period_start >= cutoff)
+            )
+        )
+        if rollups:
+            db.session.execute(cls.__table__.insert(), rollups)
+
+    @staticmethod
+    def _aggregate(stock_id, resolution, period_start, period):
+        def values(index):
+            return [row[index] for row in period if row[index] is not None]
+
+        opens, highs, lows, closes, changes = (values(i) for i in range(2, 7))
+        volumes, turnovers, transactions = (values(i) for i in range(7, 10))
+        return {
+            "stock_id": stock_id,
+            "resolution": resolution,
+            "period_start": period_start,
+            "last_trade_date": period[-1][1],
+            "trade_days": len(period),
+            "open_price": opens[0] if opens else None,
+            "high_price": max(highs) if highs else None,
+            "low_price": min(lows) if lows else None,
+            "close_price": closes[-1] if closes else None,
+            "change_amount": sum(changes) if changes else None,
+            "volume": sum(volumes) if volumes else None,
+            "turnover": sum(turnovers) if turnovers else None,
+            "transaction_count": sum(transactions) if transactions else None,
+        }
+
+
+class StockRanking(db.Model):
+    """每日排行（漲跌幅、成交量、成交金額）- 匯入時預先排序，每日每項只保存前後各 DEPTH 名"""
+
+    __tablename__ = "stock_rankings"
+    trade_date = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # 由大到小的名次，1 為最大
+    stock_id = db.Column(db.Integer, db.ForeignKey("stocks.id"), nullable=False)
+    value = db.Column(db.Numeric(20, 4))
+    ranked_count = db.Column(db.Integer, nullable=False)  # 當日參與排名的股票數
+
+    stock = relationship("Stock")
+
+    METRICS = ("change_pct", "volume", "turnover")
+    DEPTH = 100
+    CHUNK_DAYS = 31  # 每批重算的日曆天數
+
+    @classmethod
+    def refresh(cls, new_since):
+        """重算 new_since（股票 id -> 最早的新交易日）之後每個交易日的排行，由呼叫者 commit"""
+        days = [day for day in new_since.values() if day is not None]
+        if days:
+            cls.rebuild(min(days))
+
+    @classmethod
+    def rebuild(cls, start, end=None):
+        if end is None:
+            end = db.session.query(db.func.max(StockPrice.trade_date)).scalar()
+        while end is not None and start <= end:
+            chunk_end = min(start + timedelta(days=cls.CHUNK_DAYS - 1), end)
+            rows = (
+                db.session.query(
+                    StockPrice.trade_date,
+                    StockPrice.stock_id,
+                    StockPrice.close_price,
+                    StockPrice.change_amount,
+                    StockPrice.volume,
+                    StockPrice.turnover,
+                )
+                .filter(StockPrice.trade_date >= start, StockPrice.trade_date <= chunk_end)
+                .all()
+            )
+            db.session.execute(
+                cls.__table__.delete().where(
+                    db.and_(cls.trade_date >= start, cls.trade_date <= chunk_end)
+                )
+            )
+            rankings = cls._rank(rows)
+            if rankings:
+                db.session.execute(cls.__table__.insert(), rankings)
+            start = chunk_end + timedelta(days=1)
+
+    @classmethod
+    def _rank(cls, rows):
+        """一次排序區間內所有交易日：依 (交易日, 數值遞減, 股票 id) 排序後取每日頭尾"""
+        if not rows:
+            return []
+
+        def column(index):
+            return np.array(
+                [np.nan if row[index] is None else float(row[index]) for row in rows],
+                dtype=np.float64,
+            )
+
+        trade_dates = np.array([row[0] for row in rows], dtype="datetime64[D]")
+        stock_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        close, change = column(2), column(3)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            previous = close - change
+            change_pct = np.where(previous > 0, np.round(change / previous * 100, 2), np.nan)
+        values = {"change_pct": change_pct, "volume": column(4), "turnover": column(5)}
+
+        days, day_index = np.unique(trade_dates, return_inverse=True)
+        rankings = []
+        for metric in cls.METRICS:
+            valid = ~np.isnan(values[metric])
+            metric_values, metric_days = values[metric][valid], day_index[valid]
+            metric_ids = stock_ids[valid]
+            order = np.lexsort((metric_ids, -metric_values, metric_days))
+
+            counts = np.bincount(metric_days, minlength=len(days))
+            starts = np.cumsum(counts) - counts
+            sorted_days = metric_days[order]
+            ranks = np.arange(len(order)) - starts[sorted_days]
+            totals = counts[sorted_days]
+            keep = (ranks < cls.DEPTH) | (ranks >= totals - cls.DEPTH)
+
+            for i in np.flatnonzero(keep):
+                position = order[i]
+                rankings.append(
+                    {
+                        "trade_date": days[sorted_days[i]].astype(object),
+                        "metric": metric,
+                        "rank": int(ranks[i]) + 1,
+                        "stock_id": int(metric_ids[position]),
+                        "value": float(metric_values[position]),
+                        "ranked_count": int(totals[i]),
+                    }
+                )
+        return rankings
+
+
+def _combine(func, current, value):
+    """合併可能為 NULL 的彙總值"""
+    if current is None:
+        return value
+    if value is None:
+        return current
+    return func(current, value)
+
+
+class ImportManifest(db.Model):
+    """已匯入的 CSV 檔案紀錄 - 重跑匯入時略過大小、修改時間或內容未變的檔案"""
+
+    __tablename__ = "import_manifest"
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True, nullable=False)  # 相對於資料目錄的路徑
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256
+    rows_imported = db.Column(db.Integer, nullable=False, default=0)  # 累計新增的價格列數
+    last_trade_date = db.Column(db.Date)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def snapshot(cls):
+        """所有紀錄依目錄分組：目錄名稱 -> {path -> (size, mtime_ns, content_hash)}
+
+        供解析端判斷檔案是否變更；每個股票目錄以目錄名稱直接取得自己的紀錄。
+        """
+        snapshot = {}
+        rows = db.session.query(cls.path, cls.size, cls.mtime_ns, cls.content_hash)
+        for path, size, mtime_ns, content_hash in rows:
+            directory = path.partition("/")[0]
+            snapshot.setdefault(directory, {})[path] = (size, mtime_ns, content_hash)
+        return snapshot
+
+    @classmethod
+    def record(cls, path, size, mtime_ns, content_hash, rows_imported=0, last_trade_date=None):
+        """新增或更新一個檔案的紀錄，由呼叫者 commit（與價格寫入在同一個交易）"""
+        entry = cls.query.filter_by(path=path).first()
+        if entry is None:
+            entry = cls(path=path, rows_imported=0)
+            db.session.add(entry)
+        entry.size = size
+        entry.mtime_ns = mtime_ns
+        entry.content_hash = content_hash
+        entry.rows_imported += rows_imported
+        if last_trade_date is not None:
+            entry.last_trade_date = max(filter(None, (entry.last_trade_date, last_trade_date)))
+        return entry
+
+
 class News(db.Model):
     __tablename__ = "news"
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,133 @@
+"""
+投資組合估值 - 以一次對齊的陣列運算計算持股的每日市值與損益
+
+持股取自 user_stocks 的 quantity / cost_basis（每股平均成本），未填股數的關注股票
+不列入。價格以 股票 × 交易日 矩陣一次載入，停牌日沿用前一收盤價。
+結果依 (使用者, 持股內容, 全市場資料版本, 區間) 快取：持股變更或匯入新價格後
+鍵值不同即重新計算，寫入端另外主動清除舊項目。
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from .cache import LRUCache
+from .extensions import db
+from .indicators import forward_fill
+from .models import LatestQuote, UserStock
+from .price_cache import load_price_panel
+
+# 區間起日前多載入的天數，讓起日前最後一個收盤價可沿用
+PRICE_LOOKBACK_DAYS = 30
+
+portfolio_cache = LRUCache(maxsize=256)
+
+
+def load_holdings(user_id):
+    """使用者有填股數的持股，回傳 ((stock_id, 股數, 每股成本), ...)"""
+    rows = (
+        db.session.query(UserStock.stock_id, UserStock.quantity, UserStock.cost_basis)
+        .filter(UserStock.user_id == user_id, UserStock.quantity.isnot(None))
+        .order_by(UserStock.stock_id)
+        .all()
+    )
+    return tuple(
+        (stock_id, float(quantity), None if cost is None else float(cost))
+        for stock_id, quantity, cost in rows
+    )
+
+
+def portfolio_valuation(user_id, start, end):
+    """使用者投資組合在 [start, end] 的每日市值與損益（快取）"""
+    holdings = load_holdings(user_id)
+    key = (user_id, holdings, LatestQuote.market_version(), start, end)
+    return portfolio_cache.get_or_set(key, lambda: _compute(holdings, start, end))
+
+
+def invalidate_user(user_id):
+    """持股變更後清除該使用者的快取項目"""
+    portfolio_cache.invalidate(lambda key: key[0] == user_id)
+
+
+def _compute(holdings, start, end):
+    if not holdings:
+        return {"holdings": [], "series": _series([], [], [], []), "summary": _summary(0, 0, 0)}
+
+    by_id = {stock_id: (quantity, cost) for stock_id, quantity, cost in holdings}
+    panel = load_price_panel(
+        start - timedelta(days=PRICE_LOOKBACK_DAYS), end, list(by_id), fields=("close_price",)
+    )
+    quantity = np.array([by_id[stock["id"]][0] for stock in panel.stocks], dtype=np.float64)
+    cost = np.array([by_id[stock["id"]][1] for stock in panel.stocks], dtype=np.float64)
+
+    close = forward_fill(panel["close_price"])
+    first = int(np.searchsorted(panel.dates, np.datetime64(start, "D")))
+    previous = close[:, first - 1] if first > 0 else np.full(len(quantity), np.nan)
+    dates, close = panel.dates[first:], close[:, first:]
+
+    values = close * quantity[:, None]
+    priced = ~np.isnan(values)
+    value = np.where(priced.any(axis=0), np.nansum(values, axis=0), np.nan)
+
+    # 損益只計入有填成本的持股，且各持股自有收盤價的日期起才扣除成本
+    has_cost = ~np.isnan(cost)
+    total_cost = float((quantity * cost)[has_cost].sum())
+    costed = values[has_cost] - (quantity * cost)[has_cost, None]
+    pnl = np.where((~np.isnan(costed)).any(axis=0), np.nansum(costed, axis=0), np.nan)
+
+    # 每日損益 = 股數 × 收盤價變動；上市前或無前值的部分不計
+    changes = np.diff(close, axis=1, prepend=previous[:, None]) * quantity[:, None]
+    daily_pnl = np.where(priced.any(axis=0), np.nansum(changes, axis=0), np.nan)
+
+    last_close = close[:, -1] if len(dates) else np.full(len(quantity), np.nan)
+    market_values = last_close * quantity
+    market_value = float(np.nansum(market_values))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unrealized = market_values - quantity * cost
+        unrealized_pct = unrealized / (quantity * cost) * 100
+        weights = market_values / market_value * 100
+
+    holdings_data = []
+    for i, stock in enumerate(panel.stocks):
+        holdings_data.append(
+            {
+                "symbol": stock["symbol"],
+                "name": stock["name"],
+                "quantity": float(quantity[i]),
+                "cost_basis": _number(cost[i], 4),
+                "last_price": _number(last_close[i]),
+                "market_value": _number(market_values[i]),
+                "unrealized_pnl": _number(unrealized[i]),
+                "unrealized_pnl_pct": _number(unrealized_pct[i]),
+                "weight": _number(weights[i]),
+            }
+        )
+
+    costed_value = float(np.nansum(market_values[has_cost]))
+    return {
+        "holdings": holdings_data,
+        "series": _series(dates, value, pnl, daily_pnl),
+        "summary": _summary(market_value, total_cost, costed_value - total_cost),
+    }
+
+
+def _series(dates, value, pnl, daily_pnl):
+    return {
+        "dates": np.datetime_as_string(np.asarray(dates, dtype="datetime64[D]")).tolist(),
+        "value": [_number(v) for v in value],
+        "pnl": [_number(v) for v in pnl],
+        "daily_pnl": [_number(v) for v in daily_pnl],
+    }
+
+
+def _summary(market_value, total_cost, unrealized):
+    return {
+        "market_value": round(market_value, 2),
+        "cost": round(total_cost, 2),
+        "unrealized_pnl": round(unrealized, 2),
+        "unrealized_pnl_pct": round(unrealized / total_cost * 100, 2) if total_cost else None,
+    }
+
+
+def _number(value, digits=2):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, digits)
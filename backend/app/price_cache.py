@@ -0,0 +1,273 @@
+"""
+行程內價格快取 - 以 NumPy 連續陣列保存每支股票的 OHLCV 序列
+
+快取項目以 latest_quotes 的 (trade_date, refreshed_at) 作為版本，匯入腳本在其他行程
+刷新投影後，下次讀取時版本不符即重新載入；同行程的寫入者則透過
+sync_price_projections 直接失效。整體以 LRU 方式限制記憶體用量。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from flask import current_app
+
+from .database_adapter import chunked
+from .extensions import db
+from .models import LatestQuote, Stock, StockPrice
+
+DEFAULT_MAX_MB = 256
+
+
+class PriceSeries:
+    """單支股票依交易日遞增排列的欄式價格序列"""
+
+    FLOAT_FIELDS = ("open_price", "high_price", "low_price", "close_price", "change_amount")
+    INT_FIELDS = ("volume", "turnover", "transaction_count")
+
+    def __init__(self, stock_id, version, ids, dates, columns):
+        self.stock_id = stock_id
+        self.version = version
+        self.ids = ids
+        self.dates = dates  # datetime64[D]
+        self.columns = columns  # 欄位名稱 -> float64 陣列，NULL 以 NaN 表示
+        self.nbytes = ids.nbytes + dates.nbytes + sum(col.nbytes for col in columns.values())
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    @classmethod
+    def load(cls, stock_id, version=None):
+        """以單一欄位查詢載入整段歷史，不建立 ORM 物件"""
+        fields = cls.FLOAT_FIELDS + cls.INT_FIELDS
+        rows = (
+            db.session.query(
+                StockPrice.id, StockPrice.trade_date, *[getattr(StockPrice, f) for f in fields]
+            )
+            .filter(StockPrice.stock_id == stock_id)
+            .order_by(StockPrice.trade_date)
+            .all()
+        )
+        return cls.from_rows(stock_id, version, rows)
+
+    @classmethod
+    def from_rows(cls, stock_id, version, rows):
+        """由依交易日排序的 (id, trade_date, FLOAT_FIELDS..., INT_FIELDS...) 列建立序列"""
+        fields = cls.FLOAT_FIELDS + cls.INT_FIELDS
+        count = len(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        dates = np.array([row[1] for row in rows], dtype="datetime64[D]")
+        columns = {}
+        for offset, field in enumerate(fields, start=2):
+            columns[field] = np.fromiter(
+                (np.nan if row[offset] is None else float(row[offset]) for row in rows),
+                dtype=np.float64,
+                count=count,
+            )
+        return cls(stock_id, version, ids, dates, columns)
+
+    def merged_with(self, other):
+        """合併另一段序列（如冷資料庫的封存資料），同一交易日以本序列為準"""
+        keep = ~np.isin(other.dates, self.dates)
+        dates = np.concatenate([other.dates[keep], self.dates])
+        order = np.argsort(dates, kind="stable")
+        ids = np.concatenate([other.ids[keep], self.ids])[order]
+        columns = {
+            field: np.concatenate([other.columns[field][keep], values])[order]
+            for field, values in self.columns.items()
+        }
+        return PriceSeries(self.stock_id, self.version, ids, dates[order], columns)
+
+    def date_range(self, start=None, end=None):
+        """回傳 [start, end] 交易日區間對應的 (lo, hi) 索引"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D")))
+        hi = (
+            len(self.dates)
+            if end is None
+            else int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right"))
+        )
+        return lo, max(lo, hi)
+
+    def to_records(self, lo=0, hi=None, index=None):
+        """輸出與 StockPrice.to_dict 相同格式的記錄；index 可指定抽樣後的位置"""
+        selector = slice(lo, hi) if index is None else index
+        trade_dates = np.datetime_as_string(self.dates[selector]).tolist()
+        ids = self.ids[selector].tolist()
+        values = {
+            field: [None if np.isnan(v) else v for v in self.columns[field][selector].tolist()]
+            for field in self.FLOAT_FIELDS
+        }
+        for field in self.INT_FIELDS:
+            values[field] = [
+                None if np.isnan(v) else int(v) for v in self.columns[field][selector].tolist()
+            ]
+
+        records = []
+        for i, trade_date in enumerate(trade_dates):
+            record = {"id": ids[i], "stock_id": self.stock_id, "trade_date": trade_date}
+            for field, column in values.items():
+                record[field] = column[i]
+            records.append(record)
+        return records
+
+    def to_columns(self, lo=0, hi=None, index=None):
+        """與 to_records 相同的選取範圍，以 欄位 -> 陣列 輸出（供欄式回應使用）"""
+        selector = slice(lo, hi) if index is None else index
+        columns = {"trade_date": self.dates[selector]}
+        for field in self.FLOAT_FIELDS + self.INT_FIELDS:
+            columns[field] = self.columns[field][selector]
+        return columns
+
+
+class PricePanel:
+    """多支股票在共同交易日軸上的價格矩陣，每個欄位為 (股票數, 交易日數) 的陣列"""
+
+    def __init__(self, stocks, dates, columns):
+        self.stocks = stocks  # 與矩陣列順序相同的股票資訊 (Stock.to_dict 格式)
+        self.stock_ids = np.array([stock["id"] for stock in stocks], dtype=np.int64)
+        self.dates = dates
+        self.columns = columns
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def date_index(self, as_of=None):
+        """as_of 當日或之前最後一個交易日的欄索引，沒有時回傳 None"""
+        if as_of is None:
+            return len(self.dates) - 1 if len(self.dates) else None
+        index = int(np.searchsorted(self.dates, np.datetime64(as_of, "D"), side="right")) - 1
+        return index if index >= 0 else None
+
+
+def load_price_panel(start, end, stock_ids=None, fields=None):
+    """以欄位查詢載入 [start, end] 區間的價格並轉為 股票 × 交易日 矩陣
+
+    stock_ids 為 None 時載入全部股票；無交易的格子為 NaN。
+    """
+    fields = tuple(fields or PriceSeries.FLOAT_FIELDS + PriceSeries.INT_FIELDS)
+
+    stock_query = db.session.query(
+        Stock.id, Stock.symbol, Stock.name, Stock.exchange, Stock.market_type
+    )
+    price_query = db.session.query(
+        StockPrice.stock_id, StockPrice.trade_date, *[getattr(StockPrice, f) for f in fields]
+    ).filter(StockPrice.trade_date >= start, StockPrice.trade_date <= end)
+
+    if stock_ids is None:
+        stock_rows = stock_query.all()
+        price_rows = price_query.all()
+    else:
+        stock_rows, price_rows = [], []
+        for chunk in chunked(sorted(set(stock_ids))):
+            stock_rows.extend(stock_query.filter(Stock.id.in_(chunk)).all())
+            price_rows.extend(price_query.filter(StockPrice.stock_id.in_(chunk)).all())
+
+    stock_rows.sort(key=lambda row: row[0])
+    stocks = [
+        {"id": row[0], "symbol": row[1], "name": row[2], "exchange": row[3], "market_type": row[4]}
+        for row in stock_rows
+    ]
+    known_ids = np.array([stock["id"] for stock in stocks], dtype=np.int64)
+
+    count = len(price_rows)
+    row_ids = np.fromiter((row[0] for row in price_rows), dtype=np.int64, count=count)
+    trade_dates = np.array([row[1] for row in price_rows], dtype="datetime64[D]")
+    dates = np.unique(trade_dates)
+
+    rows = np.searchsorted(known_ids, row_ids)
+    keep = np.zeros(count, dtype=bool)
+    if len(known_ids):
+        matched = known_ids[np.minimum(rows, len(known_ids) - 1)] == row_ids
+        keep = (rows < len(known_ids)) & matched
+    rows, cols = rows[keep], np.searchsorted(dates, trade_dates[keep])
+
+    columns = {}
+    for offset, field in enumerate(fields, start=2):
+        values = np.fromiter(
+            (np.nan if row[offset] is None else float(row[offset]) for row in price_rows),
+            dtype=np.float64,
+            count=count,
+        )
+        matrix = np.full((len(stocks), len(dates)), np.nan)
+        matrix[rows, cols] = values[keep]
+        columns[field] = matrix
+    return PricePanel(stocks, dates, columns)
+
+
+class PriceCache:
+    """以股票為單位、限制總記憶體的 LRU 價格快取"""
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return current_app.config.get("PRICE_CACHE_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024
+
+    @staticmethod
+    def version_of(quote):
+        """由 LatestQuote 推導快取版本；尚無報價時為 None"""
+        if quote is None:
+            return None
+        return (quote.trade_date, quote.refreshed_at)
+
+    def get(self, stock_id, version=None, quote=None):
+        """取得股票價格序列；版本不符或不在快取中時重新載入"""
+        if quote is not None:
+            version = self.version_of(quote)
+
+        with self._lock:
+            series = self._entries.get(stock_id)
+            if series is not None and series.version == version:
+                self._entries.move_to_end(stock_id)
+                return series
+
+        series = PriceSeries.load(stock_id, version)
+        self._store(series)
+        return series
+
+    def get_current(self, stock_id):
+        """先讀取 latest_quotes 取得版本，再取得價格序列"""
+        quote = LatestQuote.query.get(stock_id)
+        return self.get(stock_id, quote=quote)
+
+    def _store(self, series):
+        max_bytes = self.max_bytes
+        with self._lock:
+            previous = self._entries.pop(series.stock_id, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+            if series.nbytes > max_bytes:
+                return
+
+            self._entries[series.stock_id] = series
+            self._total_bytes += series.nbytes
+            while self._total_bytes > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+
+    def invalidate(self, stock_ids=None):
+        """使指定股票（None 表示全部）的快取失效"""
+        with self._lock:
+            if stock_ids is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+            for stock_id in stock_ids:
+                series = self._entries.pop(stock_id, None)
+                if series is not None:
+                    self._total_bytes -= series.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes}
+
+
+price_cache = PriceCache()
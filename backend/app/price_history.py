@@ -0,0 +1,133 @@
+"""
+冷熱分流的價格歷史讀取 - 依封存界線切開查詢區間，兩個資料庫同時查詢後合併
+
+封存作業會把 ARCHIVAL_CUTOFF_DAYS 天以前的 stock_prices 搬到冷資料庫的
+stock_prices_history。起日在界線之後的查詢（絕大多數的短區間圖表）只讀熱資料庫的
+行程內快取，完全不碰冷資料庫；起日早於界線時，界線以前的部分送到執行緒池查詢
+冷資料庫，同時在請求執行緒讀取熱資料，兩邊依交易日合併（同日以熱資料為準）。
+冷資料庫逾時（COLD_DB_QUERY_TIMEOUT 秒）或失敗時只回傳熱資料並標示為不完整。
+股票詳情的統計摘要由 StockStatistics 維護（含已封存的價格）；熱資料庫沒有該股票的
+統計時，才以 series_statistics 由合併後的序列計算。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import text
+
+from .extensions import db
+from .market_trends import cold_database_enabled
+from .models_cold import StockPriceHistory
+from .price_cache import PriceSeries, price_cache
+
+COLD_READ_WORKERS = 4
+DEFAULT_COLD_TIMEOUT = 300
+WINDOW_52W = np.timedelta64(365, "D")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def archival_cutoff():
+    """熱資料庫保留的最早交易日；未設定冷資料庫時回傳 None"""
+    if not cold_database_enabled():
+        return None
+    return date.today() - timedelta(days=current_app.config.get("ARCHIVAL_CUTOFF_DAYS", 30))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=COLD_READ_WORKERS, thread_name_prefix="cold-db"
+            )
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def load_archived_series(stock_id, start, end, timeout=None):
+    """以單一欄位查詢讀取冷資料庫中 [start, end] 的價格，回傳 PriceSeries"""
+    fields = PriceSeries.FLOAT_FIELDS + PriceSeries.INT_FIELDS
+    query = db.session.query(
+        StockPriceHistory.original_id,
+        StockPriceHistory.trade_date,
+        *[getattr(StockPriceHistory, f) for f in fields],
+    ).filter(StockPriceHistory.stock_id == stock_id, StockPriceHistory.trade_date <= end)
+    if start is not None:
+        query = query.filter(StockPriceHistory.trade_date >= start)
+
+    engine = db.get_engine(current_app, bind="cold")
+    if timeout and engine.dialect.name == "postgresql":
+        # 讓資料庫端一併中止查詢，逾時後不會繼續佔用冷資料庫連線
+        db.session.execute(
+            text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"),
+            bind_arguments={"bind": engine},
+        )
+    return PriceSeries.from_rows(stock_id, None, query.order_by(StockPriceHistory.trade_date).all())
+
+
+def _load_in_worker(app, stock_id, start, end, timeout):
+    with app.app_context():
+        try:
+            return load_archived_series(stock_id, start, end, timeout)
+        finally:
+            db.session.remove()
+
+
+def load_history(stock_id, start=None, end=None, quote=None):
+    """取得涵蓋 [start, end] 的價格序列，回傳 (PriceSeries, 是否完整)"""
+    cutoff = archival_cutoff()
+    if cutoff is None or (start is not None and start >= cutoff):
+        return price_cache.get(stock_id, quote=quote), True
+
+    archive_end = cutoff - timedelta(days=1)
+    if end is not None:
+        archive_end = min(archive_end, end)
+    timeout = current_app.config.get("COLD_DB_QUERY_TIMEOUT", DEFAULT_COLD_TIMEOUT)
+    future = _get_executor().submit(
+        _load_in_worker, current_app._get_current_object(), stock_id, start, archive_end, timeout
+    )
+
+    # 冷資料庫查詢進行時，在請求執行緒讀取熱資料
+    series = price_cache.get(stock_id, quote=quote)
+    try:
+        archived = future.result(timeout=timeout)
+    except Exception as e:
+        future.cancel()
+        current_app.logger.warning(f"冷資料庫價格查詢失敗，僅回傳熱資料: {e!r}")
+        return series, False
+    return series.merged_with(archived), True
+
+
+def series_statistics(series):
+    """由價格序列計算與 StockStatistics.to_dict 相同格式的統計；空序列回傳 None"""
+    if not len(series):
+        return None
+    dates = series.dates
+    recent = dates > dates[-1] - WINDOW_52W
+
+    def aggregate(func, values):
+        values = values[~np.isnan(values)]
+        return round(float(func(values)), 2) if len(values) else None
+
+    high, low = series["high_price"], series["low_price"]
+    return {
+        "total_records": len(series),
+        "first_date": str(dates[0]),
+        "last_date": str(dates[-1]),
+        "average_price": aggregate(np.mean, series["close_price"]),
+        "highest_price": aggregate(np.max, high),
+        "lowest_price": aggregate(np.min, low),
+        "high_52w": aggregate(np.max, high[recent]),
+        "low_52w": aggregate(np.min, low[recent]),
+    }
@@ -0,0 +1,157 @@
+"""
+價格批次寫入 - 以多列 UPSERT 將整批價格寫入 stock_prices
+
+以 uq_stock_date (stock_id, trade_date) 判斷是否已存在：已存在的列保持不變，只新增
+不存在的列。統計摘要、排行等投影以「匯入只會新增價格」為前提增量維護，因此 UPSERT
+不覆寫既有價格；已匯入過且內容變更的檔案（如證交所更正）先以 correct_price_columns
+比對並修正既有列，再由呼叫者以 sync_price_projections(corrected=...) 重算投影。
+每批一個語句（MSSQL 為 MERGE、PostgreSQL / SQLite 為 ON CONFLICT），
+取代逐列查詢是否存在再新增。匯入腳本以 upsert_price_columns 直接寫入欄式解析的
+結果，綁定參數由整個檔案的值矩陣一次展開，不建立逐列 dict。
+"""
+import functools
+import itertools
+
+import numpy as np
+from sqlalchemy import text
+
+from .database_adapter import DatabaseAdapter
+from .extensions import db
+from .models import StockPrice
+from .twse_csv import FIELDS, INT_FIELDS, to_value_rows
+
+PRICE_COLUMNS = (
+    "stock_id",
+    "trade_date",
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "change_amount",
+    "volume",
+    "turnover",
+    "transaction_count",
+)
+CONFLICT_COLUMNS = ["stock_id", "trade_date"]
+
+
+def upsert_prices(rows):
+    """寫入價格列（PRICE_COLUMNS 為鍵的 dict），回傳新增的列數與有新增資料的股票 id
+
+    同一批中重複的 (stock_id, trade_date) 以最後一筆為準。由呼叫者負責 commit。
+    """
+    unique = {(row["stock_id"], row["trade_date"]): row for row in rows}
+    return _upsert([[row.get(column) for column in PRICE_COLUMNS] for row in unique.values()])
+
+
+def upsert_price_columns(columns, stock_id):
+    """寫入 twse_csv.parse_daily_trades 解析出的單一股票欄位，不建立逐列 dict
+
+    同一交易日重複時以最後一筆為準。回傳值與 upsert_prices 相同，由呼叫者負責 commit。
+    """
+    return _upsert(to_value_rows(_last_per_date(columns), stock_id))
+
+
+def correct_price_columns(columns, stock_id):
+    """以檔案內容修正該股票已存在、但數值不同的價格列，回傳 [(交易日, {欄位: (舊值, 新值)})]
+
+    只處理資料庫中已有的交易日（新的交易日由 upsert_price_columns 新增）。修正不會改變
+    價格 id，統計水位無法察覺，由呼叫者負責重算投影並 commit。
+    """
+    rows = to_value_rows(_last_per_date(columns), stock_id)
+    if not rows:
+        return []
+    by_date = {row[1]: row[2:] for row in rows}
+    table = StockPrice.__table__
+    existing = db.session.execute(
+        db.select(table.c.trade_date, *[table.c[field] for field in FIELDS]).where(
+            table.c.stock_id == stock_id,
+            table.c.trade_date >= min(by_date),
+            table.c.trade_date <= max(by_date),
+        )
+    )
+
+    corrections, parameters = [], []
+    for trade_date, *old_values in existing:
+        new_values = by_date.get(trade_date)
+        if new_values is None:
+            continue
+        changes = {
+            field: (old, new)
+            for field, old, new in zip(FIELDS, old_values, new_values)
+            if not _same_value(field, old, new)
+        }
+        if changes:
+            corrections.append((trade_date, changes))
+            parameters.append(
+                {
+                    "key_stock_id": stock_id,
+                    "key_trade_date": trade_date,
+                    **dict(zip(FIELDS, new_values)),
+                }
+            )
+
+    if parameters:
+        statement = (
+            table.update()
+            .where(
+                table.c.stock_id == db.bindparam("key_stock_id"),
+                table.c.trade_date == db.bindparam("key_trade_date"),
+            )
+            .values({field: db.bindparam(field) for field in FIELDS})
+        )
+        db.session.execute(statement, parameters)
+    return sorted(corrections, key=lambda item: item[0])
+
+
+def _same_value(field, old, new):
+    """資料庫值（Decimal / int）與檔案值（float / int）是否相同；價格欄位比到小數兩位"""
+    if old is None or new is None:
+        return old is None and new is None
+    if field in INT_FIELDS:
+        return int(old) == int(new)
+    return abs(float(old) - new) < 0.005
+
+
+def _last_per_date(columns):
+    """同一交易日重複時只保留最後一筆"""
+    dates = columns["trade_date"]
+    # 反轉後 np.unique 取到的是每個交易日最後出現的位置
+    _, last = np.unique(dates[::-1], return_index=True)
+    keep = len(dates) - 1 - last
+    if len(keep) < len(dates):
+        columns = {field: values[keep] for field, values in columns.items()}
+    return columns
+
+
+def _upsert(value_rows):
+    """依 PRICE_COLUMNS 順序排列的值列表分批寫入"""
+    if not value_rows:
+        return 0, set()
+
+    adapter = DatabaseAdapter(db.engine.dialect.name)
+    batch_size = adapter.get_max_upsert_rows(len(PRICE_COLUMNS))
+    inserted, stock_ids = 0, set()
+    for start in range(0, len(value_rows), batch_size):
+        batch = value_rows[start : start + batch_size]
+        query = adapter.get_upsert_query(
+            "stock_prices", dict.fromkeys(PRICE_COLUMNS), CONFLICT_COLUMNS, len(batch), False
+        )
+        result = db.session.execute(text(query), price_parameters(batch))
+        if result.rowcount:
+            inserted += max(result.rowcount, 0)
+            # rowcount 不區分股票，批次中的股票都視為可能有新資料
+            stock_ids.update(row[0] for row in batch)
+    return inserted, stock_ids
+
+
+def price_parameters(value_rows):
+    """值列表 -> get_upsert_query 的綁定參數（與 DatabaseAdapter.get_upsert_params 相同）"""
+    names = _parameter_names(len(value_rows))
+    return dict(zip(names, itertools.chain.from_iterable(value_rows)))
+
+
+@functools.lru_cache(maxsize=8)
+def _parameter_names(rows):
+    """與 DatabaseAdapter.get_upsert_params 相同的綁定參數名稱，依列優先排列"""
+    return tuple(f"{column}_{i}" for i in range(rows) for column in PRICE_COLUMNS)
@@ -0,0 +1,51 @@
+"""
+價格寫入後的同步處理 - 維護由 stock_prices 衍生的投影資料
+
+匯入腳本或任何寫入 StockPrice 的程式，在寫入後都應呼叫 sync_price_projections，
+讓列表、搜尋、關注清單等端點讀到一致的資料。
+"""
+from .market_statistics import market_statistics_cache
+from .market_trends import cold_database_enabled
+from .models import LatestQuote, StockPriceRollup, StockRanking, StockStatistics
+from .portfolio import portfolio_cache
+from .price_cache import price_cache
+from .quote_push import queue_quote_push
+from .search_index import stock_search_index
+
+
+def sync_price_projections(stock_ids=None, corrected=None):
+    """刷新受影響股票的衍生資料（stock_ids 為 None 時全部重建），由呼叫者負責 commit
+
+    corrected 為 股票 id -> 最早被修正的既有交易日：這些股票的統計整段重算，K 線與排行
+    自該日起重算。回傳 股票 id -> 需重算的最早交易日（供市場趨勢彙總使用）。
+    """
+    corrected = corrected or {}
+    if stock_ids is not None:
+        stock_ids = set(stock_ids) | set(corrected)
+        if not stock_ids:
+            return {}
+
+    LatestQuote.refresh(stock_ids)
+    # 訂閱者在 commit 後收到新報價（全部重建時不推播）
+    if stock_ids is not None:
+        queue_quote_push(stock_ids)
+    # 統計摘要只併入 last_price_id 之後的新價格；全部重建時整段重算
+    # 設定冷資料庫時，已封存的價格仍計入歷史與 52 週統計
+    archive = cold_database_enabled()
+    new_since = StockStatistics.refresh(stock_ids, full=stock_ids is None, archive=archive)
+    if corrected and stock_ids is not None:
+        # 修正既有價格不會產生新的 id，統計水位無法察覺，整段重算
+        StockStatistics.refresh(corrected, full=True, archive=archive)
+        for stock_id, day in corrected.items():
+            new_since[stock_id] = min(filter(None, (new_since.get(stock_id), day)))
+    # 週 / 月 K 線只重算含新交易日的期間
+    StockPriceRollup.refresh(new_since)
+    # 每日排行在匯入時排序一次，只重算含新資料的交易日
+    StockRanking.refresh(new_since)
+    # 同行程的快取立即失效；其他行程的快取由 latest_quotes 版本判斷
+    price_cache.invalidate(stock_ids)
+    market_statistics_cache.invalidate()
+    portfolio_cache.invalidate()
+    # 匯入可能新增股票，搜尋索引下次查詢時重建
+    stock_search_index.invalidate()
+    return new_since
@@ -0,0 +1,149 @@
+"""
+報價推播 - 匯入新價格後推送到 Socket.IO 的 quote:<symbol> 房間
+
+同一股票在 QUOTE_PUSH_COALESCE_MS 內的多次更新只推送最後一筆，避免大量匯入時
+淹沒連線。推播在交易 commit 之後才送出，rollback 時丟棄；匯入腳本等短命行程
+結束前應呼叫 quote_publisher.flush()，並設定 SOCKETIO_MESSAGE_QUEUE 讓事件經由
+訊息佇列送到 Web 行程。
+"""
+import threading
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .database_adapter import chunked
+from .extensions import db, socketio
+from .models import LatestQuote, Stock
+
+DEFAULT_COALESCE_MS = 500
+ROOM_PREFIX = "quote:"
+PRICES_UPDATED_EVENT = "prices_updated"
+_SESSION_KEY = "pending_quote_push"
+
+
+def room_for(symbol):
+    return f"{ROOM_PREFIX}{symbol}"
+
+
+def quote_payload(stock, latest_quote):
+    """即時報價的輸出格式（/realtime、/quotes 與推播共用）"""
+    return {
+        "symbol": stock.symbol,
+        "name": stock.name,
+        "exchange": stock.exchange,
+        "market_type": stock.market_type,
+        "price": float(latest_quote.close_price) if latest_quote.close_price else 0,
+        "change": float(latest_quote.change_amount) if latest_quote.change_amount else 0,
+        "change_percent": latest_quote.change_percentage,
+        "volume": latest_quote.volume,
+        "high": float(latest_quote.high_price) if latest_quote.high_price else 0,
+        "low": float(latest_quote.low_price) if latest_quote.low_price else 0,
+        "open": float(latest_quote.open_price) if latest_quote.open_price else 0,
+        "timestamp": latest_quote.trade_date.isoformat(),
+        "last_updated": latest_quote.created_at.isoformat() if latest_quote.created_at else None,
+    }
+
+
+def load_quote_payloads(stock_ids=None, symbols=None):
+    """以單一 JOIN 查詢取得股票的最新報價推播內容（分批避免 MSSQL 參數上限）"""
+    column, keys = (Stock.id, stock_ids) if stock_ids is not None else (Stock.symbol, symbols)
+    payloads = []
+    for chunk in chunked(sorted(set(keys))):
+        rows = (
+            db.session.query(Stock, LatestQuote)
+            .join(LatestQuote, LatestQuote.stock_id == Stock.id)
+            .filter(column.in_(chunk))
+            .all()
+        )
+        payloads.extend(quote_payload(stock, quote) for stock, quote in rows)
+    return payloads
+
+
+class QuotePublisher:
+    """以股票為單位合併更新，於時間窗結束時一次推送"""
+
+    def __init__(self):
+        self._pending = {}
+        self._scheduled = False
+        self._generation = 0  # 每次送出後遞增，排程中的送出若已被手動 flush 取代則略過
+        self._lock = threading.Lock()
+
+    def publish(self, payloads, coalesce_ms=None):
+        if coalesce_ms is None:
+            coalesce_ms = current_app.config.get("QUOTE_PUSH_COALESCE_MS", DEFAULT_COALESCE_MS)
+
+        with self._lock:
+            for payload in payloads:
+                self._pending[payload["symbol"]] = payload
+            schedule = bool(self._pending) and not self._scheduled
+            self._scheduled = self._scheduled or schedule
+            generation = self._generation
+
+        if schedule:
+            socketio.start_background_task(self._flush_later, coalesce_ms / 1000.0, generation)
+
+    def _flush_later(self, seconds, generation):
+        socketio.sleep(seconds)
+        self.flush(generation)
+
+    def flush(self, generation=None):
+        """立即送出所有待推播的報價，回傳送出的筆數"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return 0
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            self._generation += 1
+
+        for symbol, payload in pending.items():
+            socketio.emit("quote", payload, to=room_for(symbol))
+        return len(pending)
+
+
+quote_publisher = QuotePublisher()
+
+
+def broadcast_prices_updated(stock_ids):
+    """匯入完成後廣播 prices_updated，讓列表、排行等頁面重新載入（不限訂閱房間）
+
+    各行程的快取以 latest_quotes 版本判斷，不需另外通知失效；此事件只提醒前端。
+    """
+    if not stock_ids:
+        return None
+    rows = []
+    for chunk in chunked(sorted(set(stock_ids))):
+        rows.extend(
+            db.session.query(Stock.symbol, LatestQuote.trade_date)
+            .join(LatestQuote, LatestQuote.stock_id == Stock.id)
+            .filter(Stock.id.in_(chunk))
+            .all()
+        )
+    trade_date = max((day for _, day in rows), default=None)
+    payload = {
+        "symbols": sorted(symbol for symbol, _ in rows),
+        "trade_date": trade_date.isoformat() if trade_date else None,
+    }
+    socketio.emit(PRICES_UPDATED_EVENT, payload)
+    return payload
+
+
+def queue_quote_push(stock_ids):
+    """在目前交易中登記要推播的股票，commit 後才實際推送"""
+    if not stock_ids:
+        return
+    payloads = db.session.info.setdefault(_SESSION_KEY, {})
+    for payload in load_quote_payloads(stock_ids=stock_ids):
+        payloads[payload["symbol"]] = payload
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    payloads = session.info.pop(_SESSION_KEY, None)
+    if payloads:
+        quote_publisher.publish(list(payloads.values()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
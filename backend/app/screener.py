@@ -0,0 +1,230 @@
+"""
+全市場選股器 - 在股票 × 交易日價格矩陣上一次向量化評估篩選條件
+
+條件語法（以 and 串接）：
+    close > sma50
+    volume > 3 * volume_sma20      （亦可寫成 3x volume_sma20）
+    change_percentage < -5
+    sma20 crosses above sma50      （當日成立且前一交易日不成立，亦有 crosses below）
+可用欄位：open、high、low、close、change、change_percentage（change_pct）、
+volume、turnover、transactions；指標：smaN、emaN、rsiN（以收盤價計算），
+以及 <欄位>_smaN、<欄位>_emaN。
+"""
+import operator
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+
+from .cache import LRUCache
+from .indicators import MAX_PERIOD, ema, forward_fill, rsi, sma
+from .models import LatestQuote
+from .price_cache import load_price_panel
+
+FIELDS = {
+    "open": "open_price",
+    "high": "high_price",
+    "low": "low_price",
+    "close": "close_price",
+    "change": "change_amount",
+    "volume": "volume",
+    "turnover": "turnover",
+    "transactions": "transaction_count",
+}
+DERIVED_FIELDS = {"change_percentage": "change_percentage", "change_pct": "change_percentage"}
+INDICATORS = {"sma": sma, "ema": ema, "rsi": rsi}
+COMPARISONS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+# 穿越運算子 -> (當日成立的比較, 前一交易日成立的比較)
+CROSSES = {
+    "crosses above": (operator.gt, operator.le),
+    "crosses below": (operator.lt, operator.ge),
+}
+
+# 面板載入天數以此為單位進位，讓不同條件共用同一份快取
+PANEL_BUCKET_DAYS = 90
+
+_CONDITION = re.compile(r"^(.+?)\s*(>=|<=|>|<|\bcrosses\s+(?:above|below)\b)\s*(.+)$", re.I)
+_NUMBER = re.compile(r"^[+-]?\d+(?:\.\d+)?$")
+_SCALED = re.compile(r"^(\d+(?:\.\d+)?)\s*(?:\*|x)\s*([a-z_]+\d*)$")
+_INDICATOR = re.compile(r"^(?:([a-z]+)_)?(sma|ema|rsi)(\d+)$")
+
+# (資料版本, 截止日, 載入天數) -> PricePanel
+panel_cache = LRUCache(maxsize=4)
+
+
+class Term(namedtuple("Term", "label field indicator period scale constant")):
+    """條件中的一個運算元：常數、欄位，或欄位上的指標"""
+
+    @property
+    def lookback(self):
+        """計算所需的交易日數（遞迴型指標預留暖機期）"""
+        if self.indicator is None:
+            return 1
+        if self.indicator == "sma":
+            return self.period
+        return self.period * 3 + 1
+
+
+Condition = namedtuple("Condition", "text left op right")
+
+
+def parse_filter(expression):
+    """解析篩選條件字串，回傳 Condition 列表"""
+    parts = [part.strip() for part in re.split(r"\s+and\s+", expression.strip(), flags=re.I)]
+    if not parts or not parts[0]:
+        raise ValueError("篩選條件不可為空")
+
+    conditions = []
+    for part in parts:
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"無法解析條件: {part}")
+        left, op, right = match.groups()
+        op = " ".join(op.lower().split())
+        conditions.append(Condition(part, _parse_term(left), op, _parse_term(right)))
+    return conditions
+
+
+def _parse_term(text):
+    text = text.strip().lower()
+    if _NUMBER.match(text):
+        return Term(text, None, None, None, 1.0, float(text))
+
+    scale = 1.0
+    match = _SCALED.match(text)
+    if match:
+        scale, text = float(match.group(1)), match.group(2)
+
+    if text in FIELDS or text in DERIVED_FIELDS:
+        field = FIELDS.get(text) or DERIVED_FIELDS[text]
+        return Term(_scaled_label(scale, text), field, None, None, scale, None)
+
+    match = _INDICATOR.match(text)
+    if match:
+        base, indicator, period = match.group(1) or "close", match.group(2), int(match.group(3))
+        if base not in FIELDS:
+            raise ValueError(f"不支援的欄位: {base}")
+        if not 1 <= period <= MAX_PERIOD:
+            raise ValueError(f"{text} 的週期必須介於 1-{MAX_PERIOD}")
+        return Term(_scaled_label(scale, text), FIELDS[base], indicator, period, scale, None)
+
+    raise ValueError(f"不支援的欄位或指標: {text}")
+
+
+def _scaled_label(scale, name):
+    return name if scale == 1.0 else f"{scale:g}*{name}"
+
+
+def get_panel(as_of, lookback):
+    """取得截止於 as_of、涵蓋 lookback 個交易日的全市場價格矩陣（依資料版本快取）"""
+    version = LatestQuote.market_version()
+    calendar_days = int(lookback * 7 / 5) + 14
+    calendar_days = -(-calendar_days // PANEL_BUCKET_DAYS) * PANEL_BUCKET_DAYS
+
+    return panel_cache.get_or_set(
+        (version, as_of, calendar_days),
+        lambda: load_price_panel(as_of - timedelta(days=calendar_days), as_of),
+    )
+
+
+def evaluate(panel, conditions, column):
+    """在指定交易日欄位評估所有條件，回傳 (符合的布林陣列, 各運算元數值)"""
+    # 穿越條件需要前一交易日的數值，統一取兩欄的視窗
+    first = max(column - 1, 0)
+    windows = {}
+    for condition in conditions:
+        for term in (condition.left, condition.right):
+            if term.label not in windows:
+                windows[term.label] = term_matrix(panel, term, column + 1)[:, first:]
+
+    mask = np.ones(len(panel.stock_ids), dtype=bool)
+    for condition in conditions:
+        left, right = windows[condition.left.label], windows[condition.right.label]
+        mask &= compare(condition.op, left, right)[:, -1]
+    return mask, {label: window[:, -1] for label, window in windows.items()}
+
+
+def compare(op, left, right):
+    """沿時間軸比較兩個 (..., T) 陣列；穿越條件在第一個交易日恆為 False"""
+    with np.errstate(invalid="ignore"):
+        if op in COMPARISONS:
+            return COMPARISONS[op](left, right)
+
+        now, before = CROSSES[op]
+        result = now(left, right)
+        result[..., 0] = False
+        result[..., 1:] &= before(left[..., :-1], right[..., :-1])
+        return result
+
+
+def term_matrix(panel, term, stop=None):
+    """運算元在前 stop 個交易日的 (股票數, 交易日數) 數值矩陣"""
+    stop = len(panel.dates) if stop is None else stop
+    if term.constant is not None:
+        return np.full((len(panel.stock_ids), stop), term.constant)
+
+    if term.field == "change_percentage":
+        close = panel["close_price"][:, :stop]
+        change = panel["change_amount"][:, :stop]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.round(change / (close - change) * 100, 2)
+        return result * term.scale
+
+    if term.indicator is None:
+        return panel[term.field][:, :stop] * term.scale
+
+    # 指標以截至該日的序列計算，缺漏交易日沿用前值
+    history = forward_fill(panel[term.field][:, :stop])
+    return INDICATORS[term.indicator](history, term.period) * term.scale
+
+
+def screen(expression, as_of=None, exchange=None, market_type=None, sort=None, descending=True):
+    """評估篩選條件，回傳 (實際交易日, 符合的股票列表)"""
+    conditions = parse_filter(expression)
+    sort_term = _parse_term(sort) if sort else None
+
+    if as_of is None:
+        as_of = LatestQuote.market_version()[0]
+        if as_of is None:
+            return None, []
+
+    terms = [term for c in conditions for term in (c.left, c.right)]
+    if sort_term is not None:
+        terms.append(sort_term)
+    lookback = max(term.lookback for term in terms)
+    if any(condition.op in CROSSES for condition in conditions):
+        lookback += 1  # 穿越條件需要前一交易日
+    panel = get_panel(as_of, lookback)
+
+    column = panel.date_index(as_of)
+    if column is None:
+        return None, []
+
+    mask, values = evaluate(panel, conditions, column)
+    if sort_term is not None and sort_term.label not in values:
+        values[sort_term.label] = term_matrix(panel, sort_term, column + 1)[:, column]
+
+    for name, wanted in (("exchange", exchange), ("market_type", market_type)):
+        if wanted:
+            mask &= np.array([stock[name] == wanted for stock in panel.stocks], dtype=bool)
+
+    indices = np.flatnonzero(mask)
+    if sort_term is not None:
+        keys = values[sort_term.label][indices]
+        order = np.argsort(-keys if descending else keys, kind="stable")
+        indices = indices[order]
+    else:
+        indices = sorted(indices, key=lambda i: panel.stocks[i]["symbol"])
+
+    labels = [label for label in values if not _NUMBER.match(label)]
+    matches = []
+    for i in indices:
+        match = dict(panel.stocks[i])
+        match["values"] = {
+            label: None if np.isnan(values[label][i]) else round(float(values[label][i]), 4)
+            for label in labels
+        }
+        matches.append(match)
+
+    return str(panel.dates[column]), matches
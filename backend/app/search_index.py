@@ -0,0 +1,178 @@
+"""
+股票搜尋索引 - 以記憶體內的 n-gram 倒排索引取代 LIKE '%q%' 全表掃描
+
+代號與中文名稱（如 台泥、台積電）以單字及雙字 n-gram 建立倒排表，開頭相符則以
+排序後的二分搜尋取得。排序為：代號完全相符 > 代號開頭相符 > 名稱開頭相符 >
+名稱包含 > 代號包含。
+
+索引在匯入時由 sync_price_projections 清除；其他行程每隔
+SEARCH_INDEX_CHECK_SECONDS 秒比對 stocks 表的版本，變更時重建。
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from flask import current_app
+
+from .extensions import db
+from .models import Stock
+
+DEFAULT_CHECK_SECONDS = 30
+
+RANK_EXACT_SYMBOL = 0
+RANK_SYMBOL_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_NAME_CONTAINS = 3
+RANK_SYMBOL_CONTAINS = 4
+
+
+def normalize(text):
+    """全形轉半形並忽略大小寫，讓 ２３３０、tsmc 等輸入也能比對"""
+    return unicodedata.normalize("NFKC", text or "").casefold().strip()
+
+
+class _Snapshot:
+    """某一版本 stocks 表的唯讀索引，股票位置即代號排序"""
+
+    def __init__(self, version, stocks):
+        self.version = version
+        self.stocks = sorted(stocks, key=lambda stock: stock["symbol"])
+        self.symbols = [normalize(stock["symbol"]) for stock in self.stocks]
+        self.names = [normalize(stock["name"]) for stock in self.stocks]
+        self.by_symbol = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # 名稱排序後的位置，供名稱開頭相符以二分搜尋取得區間
+        name_order = sorted(range(len(self.names)), key=lambda i: self.names[i])
+        self.sorted_names = [self.names[i] for i in name_order]
+        self.name_order = name_order
+
+        # 單字及雙字 n-gram -> 股票位置集合
+        self.symbol_grams = self._build_grams(self.symbols)
+        self.name_grams = self._build_grams(self.names)
+
+    @staticmethod
+    def _build_grams(texts):
+        grams = {}
+        for i, text in enumerate(texts):
+            for gram in set(text) | {text[j : j + 2] for j in range(len(text) - 1)}:
+                grams.setdefault(gram, set()).add(i)
+        return grams
+
+    @staticmethod
+    def _containing(grams, texts, query):
+        """包含 query 的位置；長度 2 以內 n-gram 即為答案，較長時取交集再確認"""
+        if len(query) <= 2:
+            return grams.get(query, set())
+        postings = [grams.get(query[j : j + 2]) for j in range(len(query) - 1)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        return {i for i in set.intersection(*postings) if query in texts[i]}
+
+    def ranked(self, query):
+        """依排序等級逐段產生位置，同一等級內依代號排序"""
+        exact = self.by_symbol.get(query)
+        if exact is not None:
+            yield exact
+
+        # 代號開頭相符：代號已排序，直接取區間
+        lo = bisect_left(self.symbols, query)
+        hi = bisect_left(self.symbols, query + "\U0010ffff", lo)
+        yield from range(lo, hi)
+
+        lo = bisect_left(self.sorted_names, query)
+        hi = bisect_left(self.sorted_names, query + "\U0010ffff", lo)
+        yield from sorted(self.name_order[lo:hi])
+
+        yield from sorted(self._containing(self.name_grams, self.names, query))
+        yield from sorted(self._containing(self.symbol_grams, self.symbols, query))
+
+
+class StockSearchIndex:
+    """執行緒安全、可依 stocks 表版本自動重建的搜尋索引"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current_version():
+        """(股票數, 最大 id, 最後更新時間)，新增、刪除或修改股票都會改變"""
+        return tuple(
+            db.session.query(
+                db.func.count(Stock.id), db.func.max(Stock.id), db.func.max(Stock.updated_at)
+            ).one()
+        )
+
+    def snapshot(self):
+        interval = current_app.config.get("SEARCH_INDEX_CHECK_SECONDS", DEFAULT_CHECK_SECONDS)
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < interval:
+            return snapshot
+
+        with self._lock:
+            version = self.current_version()
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                rows = db.session.query(
+                    Stock.id, Stock.symbol, Stock.name, Stock.exchange, Stock.market_type
+                ).all()
+                snapshot = _Snapshot(
+                    version,
+                    [
+                        {
+                            "id": row[0],
+                            "symbol": row[1],
+                            "name": row[2],
+                            "exchange": row[3],
+                            "market_type": row[4],
+                        }
+                        for row in rows
+                    ],
+                )
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def search(self, query, exchange=None, market_type=None, limit=None):
+        """依相關度排序回傳符合的股票（Stock.to_dict 格式），同一等級內依代號排序
+
+        指定 limit 時取滿即停止，自動完成只需處理最前面幾個等級。
+        """
+        query = normalize(query)
+        if not query or (limit is not None and limit <= 0):
+            return []
+
+        snapshot = self.snapshot()
+        results, seen = [], set()
+        for i in snapshot.ranked(query):
+            if i in seen:
+                continue
+            seen.add(i)
+            stock = snapshot.stocks[i]
+            if exchange and stock["exchange"] != exchange:
+                continue
+            if market_type and stock["market_type"] != market_type:
+                continue
+            results.append(stock)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def count(self, exchange=None, market_type=None):
+        """符合篩選條件的股票數（以記憶體索引計算，最多落後一個檢查間隔）"""
+        return sum(
+            1
+            for stock in self.snapshot().stocks
+            if (not exchange or stock["exchange"] == exchange)
+            and (not market_type or stock["market_type"] == market_type)
+        )
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+stock_search_index = StockSearchIndex()
@@ -0,0 +1,125 @@
+"""
+證交所個股日成交資訊 CSV 的欄式解析 - 整個月份檔案一次轉為型別化的 NumPy 欄位
+
+csv 模組（C 實作）負責引號與欄位切割，轉置後所有數值欄位串接為一段文字，
+千分位逗號與正號一次移除，再由 NumPy 一次轉為 float64。
+"--"、空白與除權息標記 X 開頭的漲跌價差（非實際價差）為 NaN，與逐列解析相同；
+日期欄不是 8 位數字（如「小計」列）或日期不存在的列會被略過。
+與 PriceSeries 相同，整數欄位也以 float64 保存以表示 NULL。
+"""
+import csv
+import re
+
+import numpy as np
+
+# CSV 標題 -> stock_prices 欄位
+PRICE_HEADERS = {
+    "開盤價": "open_price",
+    "最高價": "high_price",
+    "最低價": "low_price",
+    "收盤價": "close_price",
+    "漲跌價差": "change_amount",
+}
+INT_HEADERS = {
+    "成交股數": "volume",
+    "成交金額": "turnover",
+    "成交筆數": "transaction_count",
+}
+HEADER_FIELDS = {**PRICE_HEADERS, **INT_HEADERS}
+DATE_HEADER = "日期"
+FIELDS = tuple(HEADER_FIELDS.values())
+INT_FIELDS = tuple(INT_HEADERS.values())
+# 整行為空白、"--" 或以除權息標記 X 開頭的欄位值
+MISSING_VALUE = re.compile(r"^[ \t]*(?:--|X[^\n]*)?[ \t]*$", re.MULTILINE)
+
+
+def parse_daily_trades(content):
+    """解析單一月份檔案（bytes 或 str），回傳 欄位 -> 陣列（含 trade_date）"""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    elif content.startswith("\ufeff"):
+        content = content[1:]
+
+    reader = csv.reader(content.splitlines())
+    header = [name.strip() for name in next(reader, [])]
+    index = {name: i for i, name in enumerate(header)}
+    if DATE_HEADER not in index:
+        raise ValueError("CSV 缺少日期欄位")
+    records = [row for row in reader if len(row) >= len(header)]
+    columns = list(zip(*records)) if records else [() for _ in header]
+
+    trade_dates, valid = _date_column(columns[index[DATE_HEADER]])
+    names = [name for name in (*PRICE_HEADERS, *INT_HEADERS) if name in index]
+    values = _numeric_columns([columns[index[name]] for name in names], len(records))
+
+    result = {"trade_date": trade_dates[valid]}
+    for field in FIELDS:
+        result[field] = np.full(int(valid.sum()), np.nan)
+    for name, column in zip(names, values):
+        result[HEADER_FIELDS[name]] = column[valid]
+    return result
+
+
+def to_value_rows(columns, stock_id=None):
+    """轉為依 (stock_id, trade_date, *FIELDS) 排列的值列表（NaN 為 None，整數欄位為 int）
+
+    整個檔案以一次陣列轉換完成，不逐欄位判斷。
+    """
+    prices = np.vstack([columns[field] for field in PRICE_HEADERS.values()])
+    counts = np.vstack([columns[field] for field in INT_FIELDS])
+    values = np.empty((len(FIELDS) + 2, len(columns["trade_date"])), dtype=object)
+    values[0] = stock_id
+    values[1] = columns["trade_date"].astype(object)
+    values[2 : 2 + len(prices)] = prices.astype(object)
+    values[2 + len(prices) :] = np.nan_to_num(counts).astype(np.int64).astype(object)
+    values[2:][np.isnan(np.vstack([prices, counts]))] = None
+    return values.T.tolist()
+
+
+def to_price_rows(columns, stock_id=None):
+    """轉為 upsert_prices 使用的 dict 列表"""
+    keys = ("stock_id", "trade_date") + FIELDS
+    return [dict(zip(keys, row)) for row in to_value_rows(columns, stock_id)]
+
+
+def _date_column(values):
+    """YYYYMMDD 字串欄位 -> (datetime64[D] 陣列, 有效列遮罩)"""
+    text = [value.strip() for value in values]
+    valid = np.array([len(value) == 8 and value.isdigit() for value in text], dtype=bool)
+    number = np.array([int(value) if ok else 19700101 for value, ok in zip(text, valid)])
+
+    year, month, day = number // 10000, number // 100 % 100, number % 100
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    months = np.clip(month - 1, 0, 11).astype("timedelta64[M]")
+    month_start = (year - 1970).astype("datetime64[Y]") + months
+    days = (np.maximum(day, 1) - 1).astype("timedelta64[D]")
+    dates = month_start.astype("datetime64[D]") + days
+    # 日期超出當月天數（如 20250231）時會進位到下個月
+    valid &= dates.astype("datetime64[M]") == month_start
+    return dates, valid
+
+
+def _numeric_columns(columns, count):
+    """多個數值字串欄位 -> (欄位數, 列數) 的 float64（'--'、空白與 X 開頭為 NaN）
+
+    欄位內不會有換行，所有欄位串接成一段文字後一次移除千分位與正號、一次以正規
+    表示式替換缺值，再由 NumPy 一次轉為 float64。
+    """
+    if not columns or not count:
+        return np.empty((len(columns), count))
+    joined = "\n".join("\n".join(column) for column in columns)
+    joined = MISSING_VALUE.sub("nan", joined.replace(",", "").replace("+", ""))
+    parts = joined.split("\n")
+    try:
+        values = np.array(parts, dtype=np.float64)
+    except ValueError:
+        # 少見的格式錯誤才逐一轉換
+        values = np.array([_to_float(part) for part in parts], dtype=np.float64)
+    return values.reshape(len(columns), count)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
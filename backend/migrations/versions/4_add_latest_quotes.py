@@ -0,0 +1,60 @@
+"""Add latest_quotes projection table
+
+Revision ID: 004_latest_quotes
+Revises: 003_stock_prices_fix
+Create Date: 2025-07-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004_latest_quotes'
+down_revision = '003_stock_prices_fix'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 最新報價投影：每支股票一列，避免列表端點逐列查詢 stock_prices
+    op.create_table('latest_quotes',
+        sa.Column('stock_id', sa.Integer(), nullable=False),
+        sa.Column('price_id', sa.Integer(), nullable=False),
+        sa.Column('trade_date', sa.Date(), nullable=False),
+        # 價格資訊
+        sa.Column('open_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('high_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('low_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('close_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('change_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        # 交易資訊
+        sa.Column('volume', sa.BigInteger(), nullable=True),
+        sa.Column('turnover', sa.BigInteger(), nullable=True),
+        sa.Column('transaction_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True, server_default=sa.text('GETDATE()')),
+        sa.ForeignKeyConstraint(['stock_id'], ['stocks.id'], ),
+        sa.PrimaryKeyConstraint('stock_id')
+    )
+
+    # 以現有價格資料回填
+    op.execute("""
+        INSERT INTO latest_quotes (
+            stock_id, price_id, trade_date, open_price, high_price, low_price, close_price,
+            change_amount, volume, turnover, transaction_count, created_at, refreshed_at
+        )
+        SELECT sp.stock_id, sp.id, sp.trade_date, sp.open_price, sp.high_price, sp.low_price,
+               sp.close_price, sp.change_amount, sp.volume, sp.turnover, sp.transaction_count,
+               sp.created_at, GETDATE()
+        FROM stock_prices sp
+        JOIN (
+            SELECT stock_id, MAX(trade_date) AS trade_date
+            FROM stock_prices
+            GROUP BY stock_id
+        ) latest ON latest.stock_id = sp.stock_id AND latest.trade_date = sp.trade_date
+    """)
+
+
+def downgrade():
+    op.drop_table('latest_quotes')
@@ -0,0 +1,66 @@
+"""Add stock_statistics summary table
+
+Revision ID: 005_stock_statistics
+Revises: 004_latest_quotes
+Create Date: 2025-07-08 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_stock_statistics'
+down_revision = '004_latest_quotes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 每支股票的價格統計摘要，匯入時增量更新，取代詳情頁的全歷史彙總
+    op.create_table('stock_statistics',
+        sa.Column('stock_id', sa.Integer(), nullable=False),
+        sa.Column('total_records', sa.Integer(), nullable=False),
+        sa.Column('first_date', sa.Date(), nullable=True),
+        sa.Column('last_date', sa.Date(), nullable=True),
+        # 平均價以總和 / 筆數計算，才能增量更新
+        sa.Column('close_sum', sa.Numeric(precision=20, scale=2), nullable=True),
+        sa.Column('close_count', sa.Integer(), nullable=False),
+        sa.Column('max_high', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('min_low', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('high_52w', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('low_52w', sa.Numeric(precision=10, scale=2), nullable=True),
+        # 已納入統計的最大 stock_prices.id（增量水位）
+        sa.Column('last_price_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, server_default=sa.text('GETDATE()')),
+        sa.ForeignKeyConstraint(['stock_id'], ['stocks.id'], ),
+        sa.PrimaryKeyConstraint('stock_id')
+    )
+
+    # 以現有價格資料回填
+    op.execute("""
+        INSERT INTO stock_statistics (
+            stock_id, total_records, first_date, last_date, close_sum, close_count,
+            max_high, min_low, last_price_id, updated_at
+        )
+        SELECT stock_id, COUNT(id), MIN(trade_date), MAX(trade_date), SUM(close_price),
+               COUNT(close_price), MAX(high_price), MIN(low_price), MAX(id), GETDATE()
+        FROM stock_prices
+        GROUP BY stock_id
+    """)
+    op.execute("""
+        UPDATE s
+        SET high_52w = w.high_52w, low_52w = w.low_52w
+        FROM stock_statistics s
+        JOIN (
+            SELECT sp.stock_id, MAX(sp.high_price) AS high_52w, MIN(sp.low_price) AS low_52w
+            FROM stock_prices sp
+            JOIN stock_statistics st ON st.stock_id = sp.stock_id
+            WHERE sp.trade_date > DATEADD(day, -365, st.last_date)
+            GROUP BY sp.stock_id
+        ) w ON w.stock_id = s.stock_id
+    """)
+
+
+def downgrade():
+    op.drop_table('stock_statistics')
@@ -0,0 +1,48 @@
+"""Add stock_price_rollups weekly/monthly bars
+
+Revision ID: 006_stock_price_rollups
+Revises: 005_stock_statistics
+Create Date: 2025-07-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_stock_price_rollups'
+down_revision = '005_stock_statistics'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 週 / 月 K 線彙總，匯入時由 sync_price_projections 增量重算
+    op.create_table('stock_price_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stock_id', sa.Integer(), nullable=False),
+        sa.Column('resolution', sa.String(length=10), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('last_trade_date', sa.Date(), nullable=False),
+        sa.Column('trade_days', sa.Integer(), nullable=False),
+        # 價格資訊
+        sa.Column('open_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('high_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('low_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('close_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('change_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        # 交易資訊
+        sa.Column('volume', sa.BigInteger(), nullable=True),
+        sa.Column('turnover', sa.BigInteger(), nullable=True),
+        sa.Column('transaction_count', sa.BigInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['stock_id'], ['stocks.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stock_id', 'resolution', 'period_start', name='uq_rollup_period')
+    )
+
+    # 既有資料的彙總需要逐期取第一筆開盤與最後一筆收盤，由應用程式回填：
+    #     python scripts/db_manager.py rebuild-projections
+
+
+def downgrade():
+    op.drop_table('stock_price_rollups')
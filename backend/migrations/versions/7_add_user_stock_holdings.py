@@ -0,0 +1,27 @@
+"""Add holding quantity and cost basis to user_stocks
+
+Revision ID: 007_user_stock_holdings
+Revises: 006_stock_price_rollups
+Create Date: 2025-07-22 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_user_stock_holdings'
+down_revision = '006_stock_price_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 持股資訊為選填：未填股數的關注股票不列入投資組合估值
+    op.add_column('user_stocks', sa.Column('quantity', sa.Numeric(precision=18, scale=4), nullable=True))
+    op.add_column('user_stocks', sa.Column('cost_basis', sa.Numeric(precision=12, scale=4), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_stocks', 'cost_basis')
+    op.drop_column('user_stocks', 'quantity')
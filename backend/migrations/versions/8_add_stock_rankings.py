@@ -0,0 +1,37 @@
+"""Add stock_rankings daily leaderboards
+
+Revision ID: 008_stock_rankings
+Revises: 007_user_stock_holdings
+Create Date: 2025-07-29 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_stock_rankings'
+down_revision = '007_user_stock_holdings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 每日漲跌幅 / 成交量 / 成交金額排行，匯入時由 sync_price_projections 預先排序
+    op.create_table('stock_rankings',
+        sa.Column('trade_date', sa.Date(), nullable=False),
+        sa.Column('metric', sa.String(length=20), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('stock_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Numeric(precision=20, scale=4), nullable=True),
+        sa.Column('ranked_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['stock_id'], ['stocks.id'], ),
+        sa.PrimaryKeyConstraint('trade_date', 'metric', 'rank')
+    )
+
+    # 既有資料的排行由應用程式回填：
+    #     python scripts/db_manager.py rebuild-projections
+
+
+def downgrade():
+    op.drop_table('stock_rankings')
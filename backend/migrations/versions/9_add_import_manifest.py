@@ -0,0 +1,36 @@
+"""Add import_manifest for incremental CSV imports
+
+Revision ID: 009_import_manifest
+Revises: 008_stock_rankings
+Create Date: 2025-07-30 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_import_manifest'
+down_revision = '008_stock_rankings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 已匯入的個股日成交資訊 CSV，重跑 import_stock_data_v2.py 時略過未變更的檔案
+    op.create_table('import_manifest',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mtime_ns', sa.BigInteger(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('rows_imported', sa.Integer(), nullable=False),
+        sa.Column('last_trade_date', sa.Date(), nullable=True),
+        sa.Column('imported_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('path')
+    )
+
+
+def downgrade():
+    op.drop_table('import_manifest')
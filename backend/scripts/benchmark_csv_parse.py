@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+CSV 解析效能比較 - 逐列（csv.DictReader + clean_*_value）與欄式解析
+
+用法:
+    python scripts/benchmark_csv_parse.py [資料目錄] [--repeat N]
+
+檔案先全部讀入記憶體，不計磁碟讀取與資料庫寫入。除了解析本身，也比較解析到
+產生 UPSERT 綁定參數為止的時間（匯入時實際在 CPU 上花費的部分）。
+兩種路徑解析出的資料須完全相同，否則以非零狀態結束。
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.price_import import PRICE_COLUMNS, price_parameters
+from app.twse_csv import parse_daily_trades, to_price_rows, to_value_rows
+from scripts.import_stock_data_v2 import parse_price_rows
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "個股日成交資訊 2"
+
+
+def row_wise(contents):
+    return [parse_price_rows(content.decode("utf-8").splitlines()) for content in contents]
+
+
+def columnar(contents):
+    return [parse_daily_trades(content) for content in contents]
+
+
+def row_wise_parameters(contents):
+    """逐列解析後轉為綁定參數（upsert_prices 的路徑）"""
+    return [
+        price_parameters([[row.get(column) for column in PRICE_COLUMNS] for row in rows])
+        for rows in row_wise(contents)
+    ]
+
+
+def columnar_parameters(contents):
+    """欄式解析後直接展開為綁定參數（upsert_price_columns 的路徑）"""
+    return [price_parameters(to_value_rows(columns)) for columns in columnar(contents)]
+
+
+def best_time(func, contents, repeat):
+    """多次執行取最短時間，降低其他行程的干擾"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(contents)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 CSV 逐列與欄式解析的效能")
+    parser.add_argument("data_directory", nargs="?", default=str(DEFAULT_DIRECTORY))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = sorted(Path(args.data_directory).glob("*/*.csv"))
+    if not files:
+        print(f"❌ 找不到 CSV 檔案: {args.data_directory}")
+        return False
+    contents = [path.read_bytes() for path in files]
+
+    expected = row_wise(contents)
+    if [to_price_rows(columns) for columns in columnar(contents)] != expected:
+        print("❌ 欄式解析結果與逐列解析不同")
+        return False
+    rows = sum(len(file_rows) for file_rows in expected)
+    megabytes = sum(len(content) for content in contents) / 1024 / 1024
+    print(f"📁 {len(files)} 個檔案，{rows} 列，{megabytes:.1f} MB（重複 {args.repeat} 次取最佳）")
+
+    for title, baseline_func, columnar_func in (
+        ("解析", row_wise, columnar),
+        ("解析 + 綁定參數", row_wise_parameters, columnar_parameters),
+    ):
+        baseline = best_time(baseline_func, contents, args.repeat)
+        elapsed = best_time(columnar_func, contents, args.repeat)
+        print(f"{title}")
+        print(f"  逐列 {baseline * 1000:8.1f} ms  {rows / baseline:10,.0f} 列/秒")
+        print(
+            f"  欄式 {elapsed * 1000:8.1f} ms  {rows / elapsed:10,.0f} 列/秒"
+            f"  ({baseline / elapsed:.2f}x)"
+        )
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+股票搜尋索引效能量測 - 以記憶體 SQLite 建立合成股票，量測 n-gram 索引的查詢延遲
+
+用法:
+    python scripts/benchmark_search_index.py [--stocks N] [--repeat N]
+
+索引先建立完成，只計查詢本身（自動完成情境，limit=10）。目標為每次查詢 1ms
+以內；CI 環境不穩定，因此不放在單元測試中。
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.models import Stock
+from app.search_index import stock_search_index
+
+QUERIES = ("9", "91", "9123", "股份", "份12", "測試股份1", "不存在")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測股票搜尋索引的查詢延遲")
+    parser.add_argument("--stocks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            Stock(symbol=f"{9000 + i}", name=f"測試股份{i}號", exchange="TWSE")
+            for i in range(args.stocks)
+        )
+        db.session.commit()
+        stock_search_index.search("測試")
+
+        print(f"📁 {args.stocks} 支股票，每個查詢重複 {args.repeat} 次")
+        slowest = 0.0
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                stock_search_index.search(query, limit=10)
+                timings.append(time.perf_counter() - started)
+            median = statistics.median(timings)
+            slowest = max(slowest, median)
+            print(f"  {query:8} 中位數 {median * 1e6:8.1f} µs  最大 {max(timings) * 1e6:8.1f} µs")
+    print(f"{'✅' if slowest < 0.001 else '⚠️'} 最慢查詢中位數 {slowest * 1000:.3f} ms（目標 < 1 ms）")
+    return slowest < 0.001
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -13,13 +13,15 @@ Usage:
     python db_manager.py check        # Health check
     python db_manager.py backup       # Backup database
     python db_manager.py seed         # Seed development data
+    python db_manager.py rebuild-projections  # Rebuild derived price tables
+    python db_manager.py market-trends [START [END]]  # Roll up daily market trends (cold DB)
 """
 
 import os
 import subprocess
 import sys
 import time
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
 # Add the parent directory to sys.path to import app modules
@@ -27,7 +29,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from app import create_app
 from app.extensions import db
+from app.market_trends import cold_database_enabled, rollup_market_trends
 from app.models import Comment, Post, User
+from app.price_sync import sync_price_projections
 from flask import Flask
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
@@ -144,6 +148,43 @@ class DatabaseManager:
                 print(f"❌ Health check failed: {e}")
                 return False
 
+    def rebuild_projections(self):
+        """重建由 stock_prices 衍生的資料（最新報價、統計摘要、週 / 月 K 線、每日排行）
+
+        設定冷資料庫時，統計摘要一併納入已封存的價格；週 / 月 K 線與排行仍只由熱資料
+        重算，熱資料第一個交易日所在期間之前的結果保留不變。
+        """
+        print("🔄 Rebuilding price projections...")
+
+        with self.app.app_context():
+            if cold_database_enabled():
+                print("🧊 Including archived prices from the cold database in statistics")
+            try:
+                sync_price_projections()
+                db.session.commit()
+                print("✅ Price projections rebuilt")
+                return True
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Rebuild failed: {e}")
+                return False
+
+    def market_trends(self, start=None, end=None):
+        """將每日各市場類型的統計寫入冷資料庫（未指定起日時從上次彙總之後開始）"""
+        print("📈 Rolling up market trends...")
+
+        with self.app.app_context():
+            if not cold_database_enabled():
+                print("❌ Cold database is not configured (use FLASK_CONFIG=dual_database)")
+                return False
+            try:
+                written = rollup_market_trends(start, end)
+                print(f"✅ Market trends written: {written} rows")
+                return True
+            except Exception as e:
+                print(f"❌ Market trend rollup failed: {e}")
+                return False
+
 
 def main():
     """Main CLI interface"""
@@ -153,6 +194,8 @@ def main():
         print("  python db_manager.py migrate      # Run migrations")
         print("  python db_manager.py check        # Health check")
         print("  python db_manager.py auto         # Full automated setup")
+        print("  python db_manager.py rebuild-projections  # Rebuild derived price tables")
+        print("  python db_manager.py market-trends [START [END]]  # Roll up market trends")
         return
 
     command = sys.argv[1].lower()
@@ -162,6 +205,13 @@ def main():
         success = db_manager.run_migrations()
     elif command == "check":
         success = db_manager.health_check()
+    elif command == "rebuild-projections":
+        success = db_manager.rebuild_projections()
+    elif command == "market-trends":
+        dates = [date.fromisoformat(arg) for arg in sys.argv[2:4]]
+        start = dates[0] if dates else None
+        end = dates[1] if len(dates) > 1 else None
+        success = db_manager.market_trends(start, end)
     elif command == "auto":
         print("🚀 Running automated database setup...")
         success = (
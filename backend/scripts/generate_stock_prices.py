@@ -17,6 +17,8 @@ sys.path.insert(0, str(project_root))
 from app import create_app
 from app.extensions import db
 from app.models import Stock, StockPrice
+from app.price_sync import sync_price_projections
+from app.quote_push import quote_publisher
 
 def generate_price_data_for_stock(stock, days=30):
     """為單支股票生成指定天數的價格數據"""
@@ -97,6 +99,7 @@ def generate_all_stock_prices(days=30):
         stocks = Stock.query.all()
         total_stocks = len(stocks)
         total_prices_added = 0
+        touched_stock_ids = set()
         
         print(f"📊 股票總數: {total_stocks}")
         
@@ -104,6 +107,8 @@ def generate_all_stock_prices(days=30):
             print(f"[{i:3d}/{total_stocks}] 處理股票: {stock.symbol} - {stock.name}")
             
             prices_added = generate_price_data_for_stock(stock, days)
+            if prices_added:
+                touched_stock_ids.add(stock.id)
             total_prices_added += prices_added
             
             print(f"  ✅ 添加 {prices_added} 筆價格記錄")
@@ -118,9 +123,13 @@ def generate_all_stock_prices(days=30):
                     print(f"  ❌ 提交失敗: {e}")
                     return False
         
-        # 最終提交
+        # 最終提交（同時刷新最新報價等衍生資料）
         try:
+            db.session.flush()
+            sync_price_projections(touched_stock_ids)
             db.session.commit()
+            # 行程即將結束，不等待合併時間窗，立即推送報價給訂閱者
+            quote_publisher.flush()
             print(f"\n🎉 價格數據生成完成!")
             print(f"✅ 處理股票: {total_stocks} 支")
             print(f"✅ 添加價格記錄: {total_prices_added} 筆")
@@ -19,6 +19,8 @@ sys.path.insert(0, str(project_root))
 from app import create_app
 from app.extensions import db
 from app.models import Stock, StockPrice
+from app.price_sync import sync_price_projections
+from app.quote_push import quote_publisher
 
 print(f"🔧 Stock Insight Platform - 股票資料導入工具")
 
@@ -149,6 +151,7 @@ def import_stock_data(data_directory):
         total_stocks = 0
         total_prices = 0
         total_skipped = 0
+        touched_stock_ids = set()
 
         # 掃描所有股票目錄
         for stock_dir in os.listdir(data_directory):
@@ -191,14 +194,20 @@ def import_stock_data(data_directory):
                 print(f"📈 導入文件: {csv_file}")
 
                 imported, skipped = import_stock_from_csv(csv_path, stock)
+                if imported:
+                    touched_stock_ids.add(stock.id)
                 total_prices += imported
                 total_skipped += skipped
 
                 print(f"  ✅ 導入: {imported} 筆, 跳過: {skipped} 筆")
 
-        # 提交所有變更
+        # 提交所有變更（同時刷新最新報價等衍生資料）
         try:
+            db.session.flush()
+            sync_price_projections(touched_stock_ids)
             db.session.commit()
+            # 行程即將結束，不等待合併時間窗，立即推送報價給訂閱者
+            quote_publisher.flush()
             print(f"\n🎉 導入完成!")
             print(f"📊 統計:")
             print(f"  - 處理股票: {total_stocks} 支")
@@ -4,10 +4,16 @@ Stock Insight Platform - 股票資料導入腳本 V2
 專門處理個股日成交資訊格式的CSV檔案
 """
 
+import argparse
 import os
 import sys
 import csv
+import hashlib
 import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
@@ -16,8 +22,15 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
+from app.database_adapter import chunked
 from app.extensions import db
-from app.models import Stock, StockPrice
+from app.market_trends import rollup_new_trade_days
+from app.models import ImportManifest, Stock, StockStatistics
+from app.price_import import correct_price_columns, upsert_price_columns
+from app.price_sync import sync_price_projections
+from app.quote_push import broadcast_prices_updated, quote_publisher
+from app.twse_csv import parse_daily_trades
+from sqlalchemy.exc import IntegrityError
 
 
 def setup_logging():
@@ -86,131 +99,359 @@ def parse_date(date_str):
         return None
 
 
-def import_stock_data(data_directory, app, logger):
-    """導入股票資料"""
-    data_path = Path(data_directory)
+def read_price_rows(csv_file, stock_id=None):
+    """讀取單一月份 CSV，回傳可直接寫入 stock_prices 的 dict 列表"""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return parse_price_rows(f, stock_id)
+
+
+def parse_price_rows(lines, stock_id=None):
+    """逐列解析 CSV 內容（可迭代的文字行）為價格 dict 列表
+
+    匯入改用 app.twse_csv 的欄式解析；此函式保留作為正確性與效能比較的基準
+    （scripts/benchmark_csv_parse.py）。
+    """
+    rows = []
+    for row in csv.DictReader(lines):
+        trade_date = parse_date(row.get('日期', ''))
+        if not trade_date:
+            continue
+        rows.append({
+            'stock_id': stock_id,
+            'trade_date': trade_date,
+            'open_price': clean_price_value(row.get('開盤價')),
+            'high_price': clean_price_value(row.get('最高價')),
+            'low_price': clean_price_value(row.get('最低價')),
+            'close_price': clean_price_value(row.get('收盤價')),
+            'change_amount': clean_price_value(row.get('漲跌價差')),
+            'volume': clean_volume_value(row.get('成交股數')),
+            'turnover': clean_volume_value(row.get('成交金額')),
+            'transaction_count': clean_volume_value(row.get('成交筆數')),
+        })
+    return rows
+
+
+def get_or_create_stock(stock_code, stock_name, market_type):
+    """取得或建立股票記錄，回傳 (stock, 是否新建)
+
+    多個寫入執行緒同時建立同一支股票時，由 symbol 唯一約束保證只建立一次。
+    """
+    stock = Stock.query.filter_by(symbol=stock_code).first()
+    if stock:
+        return stock, False
     
-    if not data_path.exists():
-        logger.error(f"資料目錄不存在: {data_directory}")
-        return False
+    try:
+        stock = Stock(
+            symbol=stock_code,
+            name=stock_name,
+            exchange="TWSE" if market_type == "上市" else "TPEx",
+            market_type=market_type
+        )
+        db.session.add(stock)
+        # 先提交，之後檔案寫入失敗回滾時不會一併撤銷股票記錄
+        db.session.commit()
+        return stock, True
+    except IntegrityError:
+        db.session.rollback()
+        return Stock.query.filter_by(symbol=stock_code).one(), False
+
+
+def parse_stock_directory(stock_dir, known=None, force=False):
+    """解析一個股票目錄的 CSV（不存取資料庫，可在工作行程執行）
+
+    known 為匯入紀錄中此目錄檔案的 path -> (size, mtime_ns, content_hash)：大小與
+    修改時間皆相同的檔案不讀取；內容雜湊相同的檔案不解析，只更新紀錄（force=True 時
+    一律讀取並解析）。回傳 (目錄名稱, (代碼, 名稱, 市場別),
+    [(檔名, 價格欄位或 None, 檔案資訊, 是否曾匯入), ...], [錯誤訊息, ...], 略過的檔案數)；
+    曾匯入的檔案寫入時會比對並修正既有價格。價格以 twse_csv 的欄式解析一次轉為 NumPy 欄位，
+    跨行程傳遞時也比逐列 dict 精簡。
+    """
+    stock_dir = Path(stock_dir)
+    known = known or {}
+    info = parse_stock_code_and_name(stock_dir.name)
+    files, errors, skipped = [], [], 0
+    if info[0] and info[1]:
+        for csv_file in sorted(stock_dir.glob('*.csv')):
+            try:
+                path = f"{stock_dir.name}/{csv_file.name}"
+                stat = csv_file.stat()
+                previous = known.get(path)
+                if not force and previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+                    skipped += 1
+                    continue
+                
+                content = csv_file.read_bytes()
+                file_info = {
+                    'path': path,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'content_hash': hashlib.sha256(content).hexdigest(),
+                }
+                if not force and previous and previous[2] == file_info['content_hash']:
+                    files.append((csv_file.name, None, file_info, True))
+                    continue
+                columns = parse_daily_trades(content)
+                files.append((csv_file.name, columns, file_info, previous is not None))
+            except Exception as e:
+                errors.append(f"處理檔案 {csv_file} 時發生錯誤: {e}")
+    return stock_dir.name, info, files, errors, skipped
+
+
+def write_stock_directory(parsed, logger):
+    """寫入一個已解析的股票目錄，每個檔案（價格與匯入紀錄）一個交易
+
+    回傳 (新增股票數, 新增價格記錄數, 錯誤數, 略過的檔案數, 有新資料的股票 id)
+    """
+    directory_name, (stock_code, stock_name, market_type), files, errors, skipped = parsed
+    for error in errors:
+        logger.error(error)
+    if not stock_code or not stock_name:
+        logger.warning(f"無法解析目錄名稱: {directory_name}")
+        return 0, 0, len(errors), skipped, set()
+    if not files:
+        return 0, 0, len(errors), skipped, set()
     
-    with app.app_context():
-        stock_count = 0
-        price_count = 0
-        error_count = 0
-        
-        # 遍歷所有股票目錄
-        for stock_dir in data_path.iterdir():
-            if not stock_dir.is_dir() or stock_dir.name.startswith('.'):
-                continue
-            
-            stock_code, stock_name, market_type = parse_stock_code_and_name(stock_dir.name)
-            if not stock_code or not stock_name:
-                logger.warning(f"無法解析目錄名稱: {stock_dir.name}")
+    logger.info(f"處理股票: {stock_code} - {stock_name} ({market_type})")
+    stock, created = get_or_create_stock(stock_code, stock_name, market_type)
+    if created:
+        logger.info(f"新增股票: {stock_code} - {stock_name}")
+    
+    price_count, error_count, touched_stock_ids = 0, len(errors), set()
+    for file_name, columns, file_info, revised in files:
+        try:
+            if columns is None:
+                # 內容未變，只更新修改時間
+                ImportManifest.record(**file_info)
+                db.session.commit()
+                skipped += 1
                 continue
             
-            logger.info(f"處理股票: {stock_code} - {stock_name} ({market_type})")
-            
-            # 檢查或創建股票記錄
-            stock = Stock.query.filter_by(symbol=stock_code).first()
-            if not stock:
-                stock = Stock(
-                    symbol=stock_code,
-                    name=stock_name,
-                    exchange="TWSE" if market_type == "上市" else "TPEx",
-                    market_type=market_type
-                )
-                db.session.add(stock)
-                db.session.flush()  # 確保獲得ID
-                stock_count += 1
-                logger.info(f"新增股票: {stock_code} - {stock_name}")
-            
-            # 處理該股票目錄下的所有CSV檔案
-            for csv_file in stock_dir.glob('*.csv'):
-                logger.info(f"  處理檔案: {csv_file.name}")
-                
+            trade_dates = columns['trade_date']
+            # 曾匯入的檔案內容變更（如證交所更正）：先修正既有價格，再新增缺少的交易日
+            corrections = correct_price_columns(columns, stock.id) if revised else []
+            inserted, stock_ids = upsert_price_columns(columns, stock.id)
+            if corrections:
+                for trade_date, changes in corrections:
+                    changed = '、'.join(
+                        f"{field} {old} -> {new}" for field, (old, new) in changes.items()
+                    )
+                    logger.warning(f"  {file_name}: 修正 {trade_date} {changed}")
+                # 修正不會產生新的價格 id，與價格在同一個交易內重算該股票的投影
+                sync_price_projections([stock.id], corrected={stock.id: corrections[0][0]})
+                stock_ids = stock_ids | {stock.id}
+            last_trade_date = trade_dates.max().astype(object) if len(trade_dates) else None
+            ImportManifest.record(**file_info, rows_imported=inserted,
+                                  last_trade_date=last_trade_date)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"寫入檔案 {directory_name}/{file_name} 時發生錯誤: {e}")
+            error_count += 1
+            continue
+        
+        touched_stock_ids.update(stock_ids)
+        price_count += inserted
+        corrected = f"，修正 {len(corrections)} 筆" if corrections else ""
+        logger.info(f"  {file_name}: 新增 {inserted} / {len(trade_dates)} 筆價格記錄{corrected}")
+    return int(created), price_count, error_count, skipped, touched_stock_ids
+
+
+def known_files(manifest, stock_dir):
+    """匯入紀錄中屬於該股票目錄的項目（snapshot 已依目錄分組）"""
+    return manifest.get(Path(stock_dir).name, {})
+
+
+def add_outcome(totals, outcome):
+    """累加 write_stock_directory 的結果"""
+    for i in range(4):
+        totals[i] += outcome[i]
+    totals[4].update(outcome[4])
+
+
+def import_parallel(stock_dirs, manifest, app, logger, workers, writers, force=False):
+    """以行程池解析股票目錄，再由 writers 個寫入執行緒（各自一條資料庫連線）寫入
+
+    解析（CSV 讀取與數值清理）佔用 CPU，寫入則多在等待資料庫。兩者之間以有界佇列
+    銜接，同時送出的解析工作也有上限，寫入跟不上時解析端會暫停，記憶體用量固定。
+    """
+    parsed_queue = queue.Queue(maxsize=writers * 2)
+    totals = [0, 0, 0, 0, set()]
+    lock = threading.Lock()
+    
+    def add_totals(outcome):
+        with lock:
+            add_outcome(totals, outcome)
+    
+    def writer():
+        with app.app_context():
+            while True:
+                parsed = parsed_queue.get()
+                if parsed is None:
+                    return
                 try:
-                    with open(csv_file, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        
-                        for row in reader:
-                            # 解析日期
-                            trade_date = parse_date(row.get('日期', ''))
-                            if not trade_date:
-                                continue
-                            
-                            # 檢查是否已存在該日期的價格記錄
-                            existing_price = StockPrice.query.filter_by(
-                                stock_id=stock.id,
-                                trade_date=trade_date
-                            ).first()
-                            
-                            if existing_price:
-                                continue  # 跳過已存在的記錄
-                            
-                            # 解析價格資料
-                            open_price = clean_price_value(row.get('開盤價'))
-                            high_price = clean_price_value(row.get('最高價'))
-                            low_price = clean_price_value(row.get('最低價'))
-                            close_price = clean_price_value(row.get('收盤價'))
-                            change_amount = clean_price_value(row.get('漲跌價差'))
-                            
-                            # 解析成交量資料
-                            volume = clean_volume_value(row.get('成交股數'))
-                            turnover = clean_volume_value(row.get('成交金額'))
-                            transaction_count = clean_volume_value(row.get('成交筆數'))
-                            
-                            # 創建股票價格記錄
-                            stock_price = StockPrice(
-                                stock_id=stock.id,
-                                trade_date=trade_date,
-                                open_price=open_price,
-                                high_price=high_price,
-                                low_price=low_price,
-                                close_price=close_price,
-                                change_amount=change_amount,
-                                volume=volume,
-                                turnover=turnover,
-                                transaction_count=transaction_count
-                            )
-                            
-                            db.session.add(stock_price)
-                            price_count += 1
-                            
-                            # 每1000筆記錄提交一次
-                            if price_count % 1000 == 0:
-                                db.session.commit()
-                                logger.info(f"已處理 {price_count} 筆價格記錄")
-                
+                    add_totals(write_stock_directory(parsed, logger))
                 except Exception as e:
-                    logger.error(f"處理檔案 {csv_file} 時發生錯誤: {e}")
-                    error_count += 1
-                    continue
+                    db.session.rollback()
+                    logger.error(f"寫入股票目錄 {parsed[0]} 時發生錯誤: {e}")
+                    add_totals((0, 0, 1, 0, set()))
+    
+    threads = [
+        threading.Thread(target=writer, name=f"import-writer-{i}", daemon=True)
+        for i in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    
+    def forward(futures):
+        for future in futures:
+            try:
+                parsed_queue.put(future.result())
+            except Exception as e:
+                logger.error(f"解析股票目錄時發生錯誤: {e}")
+                add_totals((0, 0, 1, 0, set()))
+    
+    try:
+        # spawn 避免在已建立資料庫連線的行程中 fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = set()
+            for stock_dir in stock_dirs:
+                known = known_files(manifest, stock_dir)
+                pending.add(pool.submit(parse_stock_directory, stock_dir, known, force))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    forward(done)
+            forward(as_completed(pending))
+    finally:
+        for _ in threads:
+            parsed_queue.put(None)
+        for thread in threads:
+            thread.join()
+    return tuple(totals)
+
+
+def stock_ids_of(stock_dirs):
+    """股票目錄對應的已存在股票 id"""
+    symbols = sorted({parse_stock_code_and_name(Path(d).name)[0] for d in stock_dirs} - {None})
+    stock_ids = []
+    for chunk in chunked(symbols):
+        stock_ids.extend(
+            row[0] for row in db.session.query(Stock.id).filter(Stock.symbol.in_(chunk))
+        )
+    return stock_ids
+
+
+def list_stock_directories(data_directory):
+    """資料目錄下的股票目錄（<代碼>_<名稱>_<市場別>），依名稱排序"""
+    return sorted(
+        path for path in Path(data_directory).iterdir()
+        if path.is_dir() and not path.name.startswith('.')
+    )
+
+
+def import_stock_dirs(stock_dirs, app, logger, workers=0, writers=2, force=False):
+    """匯入指定的股票目錄並刷新衍生資料，供完整匯入與監看服務共用
+
+    依匯入紀錄略過未變更的檔案，force=True 時重新讀取所有檔案。回傳
+    (新增股票數, 新增價格記錄數, 錯誤數, 略過的檔案數, 有新資料的股票 id)，
+    最終提交失敗時回滾並拋出例外；已提交的價格會在下次匯入同一目錄時補刷新投影。
+    """
+    with app.app_context():
+        manifest = ImportManifest.snapshot()
+    
+    if workers > 0:
+        logger.info(f"以 {workers} 個解析行程、{writers} 條寫入連線導入")
+        totals = import_parallel(
+            stock_dirs, manifest, app, logger, workers, max(writers, 1), force
+        )
+    
+    with app.app_context():
+        if workers <= 0:
+            totals = [0, 0, 0, 0, set()]
+            for stock_dir in stock_dirs:
+                known = known_files(manifest, stock_dir)
+                parsed = parse_stock_directory(stock_dir, known, force)
+                add_outcome(totals, write_stock_directory(parsed, logger))
         
-        # 最終提交
+        # 價格與匯入紀錄已逐檔提交；先前中斷而未刷新投影的股票以統計水位補上
+        # （只檢查本次匯入的目錄中沒有新價格的股票）
+        unchanged = set(stock_ids_of(stock_dirs)) - totals[4]
+        totals[4].update(StockStatistics.unsynced(unchanged))
+        
+        # 最終提交（同時刷新最新報價等衍生資料）
         try:
+            new_since = sync_price_projections(totals[4])
             db.session.commit()
-            logger.info(f"🎉 導入完成!")
-            logger.info(f"  📊 新增股票: {stock_count}")
-            logger.info(f"  💰 新增價格記錄: {price_count}")
-            logger.info(f"  ❌ 錯誤數: {error_count}")
-            return True
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            logger.error(f"提交資料時發生錯誤: {e}")
-            return False
+            raise
+        # 不等待合併時間窗，立即推送報價給訂閱者，並通知前端重新載入列表
+        quote_publisher.flush()
+        broadcast_prices_updated(totals[4])
+        
+        # 市場趨勢寫入冷資料庫；失敗不影響已提交的價格，下次匯入時會補上
+        try:
+            written = rollup_new_trade_days(new_since)
+            if written:
+                logger.info(f"📈 市場趨勢彙總: {written} 筆")
+        except Exception as e:
+            logger.error(f"市場趨勢彙總時發生錯誤: {e}")
+    return tuple(totals)
+
+
+def import_stock_data(data_directory, app, logger, workers=0, writers=2, force=False):
+    """導入股票資料；workers > 0 時以多行程解析、多條連線寫入"""
+    if not Path(data_directory).exists():
+        logger.error(f"資料目錄不存在: {data_directory}")
+        return False
+    
+    try:
+        stock_count, price_count, error_count, skipped_count, _ = import_stock_dirs(
+            list_stock_directories(data_directory), app, logger, workers, writers, force
+        )
+    except Exception as e:
+        logger.error(f"提交資料時發生錯誤: {e}")
+        return False
+    
+    logger.info(f"🎉 導入完成!")
+    logger.info(f"  📊 新增股票: {stock_count}")
+    logger.info(f"  💰 新增價格記錄: {price_count}")
+    logger.info(f"  ⏭️ 未變更而略過的檔案: {skipped_count}")
+    logger.info(f"  ❌ 錯誤數: {error_count}")
+    return True
+
+
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="導入個股日成交資訊 CSV")
+    parser.add_argument('data_directory', nargs='?', help="資料目錄（預設自動尋找）")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="解析 CSV 的行程數，0 表示在單一行程內依序處理")
+    parser.add_argument('--writers', type=int, default=2,
+                        help="並行模式下的資料庫寫入連線數")
+    parser.add_argument('--force', action='store_true',
+                        help="忽略匯入紀錄，重新讀取所有檔案")
+    return parser.parse_args(argv)
+
+
+def resolve_data_directory(argument=None):
+    """命令列指定的資料目錄，未指定時依序尋找預設位置；找不到時回傳 None"""
+    if argument:
+        return argument
+    for candidate in ('/app/個股日成交資訊 2', './個股日成交資訊 2'):
+        if os.path.exists(candidate):
+            return candidate
+    return None
 
 
 def main():
     """主函數"""
     logger = setup_logging()
+    args = parse_args()
     
     # 確定資料目錄路徑
-    if os.path.exists('/app/個股日成交資訊 2'):
-        data_directory = '/app/個股日成交資訊 2'
-    elif os.path.exists('./個股日成交資訊 2'):
-        data_directory = './個股日成交資訊 2'
-    else:
+    data_directory = resolve_data_directory(args.data_directory)
+    if not data_directory:
         logger.error("找不到股票資料目錄")
         return False
     
@@ -221,7 +462,9 @@ def main():
     app = create_app()
     
     # 導入資料
-    success = import_stock_data(data_directory, app, logger)
+    success = import_stock_data(
+        data_directory, app, logger, args.workers, args.writers, args.force
+    )
     
     if success:
         logger.info("✅ 股票資料導入成功!")
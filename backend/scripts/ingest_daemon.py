@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+個股日成交資訊監看匯入服務 - 資料目錄有新增或修改的 CSV 時自動匯入
+
+用法:
+    python scripts/ingest_daemon.py [資料目錄] [--poll] [--debounce 秒]
+
+監看 <代碼>_<名稱>_<市場別> 目錄下的 *.csv。Linux 上以 inotify 接收寫入完成
+（IN_CLOSE_WRITE）與移入（IN_MOVED_TO）事件，無法使用時（其他平台、掛載的網路
+磁碟或 watch 數量上限）改為定期比對檔案大小與修改時間。同一目錄在 debounce 秒內
+沒有新的變更才匯入，避免檔案寫到一半或整批複製時重複匯入。
+匯入沿用 import_stock_data_v2 的匯入紀錄與批次寫入，完成後刷新衍生資料並推送
+報價與 prices_updated 事件；設定 SOCKETIO_MESSAGE_QUEUE 時事件經由訊息佇列送到
+Web 行程。各行程的快取以 latest_quotes 版本判斷，匯入後自然失效。
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from scripts.import_stock_data_v2 import (
+    import_stock_dirs,
+    list_stock_directories,
+    parse_stock_code_and_name,
+    resolve_data_directory,
+    setup_logging,
+)
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def is_stock_directory(path):
+    """是否為 <代碼>_<名稱>_<市場別> 格式的股票目錄"""
+    code, name, _ = parse_stock_code_and_name(path.name)
+    return not path.name.startswith(".") and bool(code and name)
+
+
+class PollingWatcher:
+    """定期掃描 */*.csv 的大小與修改時間，回傳有新增或修改檔案的股票目錄"""
+
+    def __init__(self, root, interval=10.0):
+        self.root = Path(root)
+        self.interval = interval
+        self.snapshot = self._scan()
+        self.next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for csv_file in self.root.glob("*/*.csv"):
+            try:
+                stat = csv_file.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[csv_file] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒；未到掃描時間時回傳空集合"""
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        snapshot = self._scan()
+        self.next_scan = time.monotonic() + self.interval
+        # 刪除的檔案不影響已匯入的價格，只比對新增與修改
+        changed = {
+            path.parent
+            for path, state in snapshot.items()
+            if self.snapshot.get(path) != state and is_stock_directory(path.parent)
+        }
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """以 inotify 監看資料目錄與其下所有股票目錄（直接呼叫 libc，不需額外套件）
+
+    無法建立時拋出 OSError，由 create_watcher 改用 PollingWatcher。
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "此平台不支援 inotify")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        self.directories = {}  # wd -> 目錄
+        try:
+            self.root_wd = self._add_watch(self.root, IN_CREATE | IN_MOVED_TO | IN_ONLYDIR)
+            for stock_dir in self.root.iterdir():
+                if stock_dir.is_dir() and is_stock_directory(stock_dir):
+                    self._watch_stock_directory(stock_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"inotify_add_watch 失敗: {os.strerror(code)}", str(path))
+        self.directories[wd] = Path(path)
+        return wd
+
+    def _watch_stock_directory(self, stock_dir):
+        self._add_watch(stock_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR)
+
+    def poll(self, timeout):
+        """等待最多 timeout 秒，回傳有 CSV 寫入完成或移入的股票目錄"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length]
+            name = os.fsdecode(name.rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件遺失，所有股票目錄都交給匯入紀錄判斷
+                changed.update(d for w, d in self.directories.items() if w != self.root_wd)
+            elif mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+            elif wd == self.root_wd:
+                path = self.root / name
+                if mask & IN_ISDIR and is_stock_directory(path):
+                    # 整個目錄搬入或建立後才寫入的檔案，都以重新掃描目錄處理
+                    try:
+                        self._watch_stock_directory(path)
+                    except OSError:
+                        continue
+                    changed.add(path)
+            elif name.endswith(".csv") and wd in self.directories:
+                changed.add(self.directories[wd])
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(root, poll=False, interval=10.0):
+    """優先使用 inotify，無法使用時改為定期掃描"""
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root, interval)
+
+
+class IngestDaemon:
+    """收集監看到的變更，同一目錄靜止 debounce 秒後以批次匯入"""
+
+    def __init__(self, app, data_directory, logger, watcher, debounce=5.0, workers=0, writers=2):
+        self.app = app
+        self.data_directory = Path(data_directory)
+        self.logger = logger
+        self.watcher = watcher
+        self.debounce = debounce
+        self.workers = workers
+        self.writers = writers
+        self.pending = {}  # 股票目錄 -> 最後一次變更的時間
+        self.stopping = threading.Event()
+
+    def catch_up(self):
+        """啟動時匯入停機期間的變更（未變更的檔案由匯入紀錄略過）；回傳匯入結果或 None"""
+        stock_dirs = list_stock_directories(self.data_directory)
+        try:
+            return self._import(stock_dirs)
+        except Exception as e:
+            # 啟動時資料庫尚未就緒也繼續監看，所有目錄在 debounce 後重試
+            self._retry_later(stock_dirs, e)
+            return None
+
+    def run_once(self, timeout=1.0):
+        """等待一次監看事件，並匯入已靜止的目錄；回傳匯入結果或 None"""
+        for stock_dir in self.watcher.poll(timeout):
+            self.pending[stock_dir] = time.monotonic()
+
+        now = time.monotonic()
+        ready = sorted(d for d, at in self.pending.items() if now - at >= self.debounce)
+        if not ready:
+            return None
+        for stock_dir in ready:
+            del self.pending[stock_dir]
+        try:
+            return self._import(ready)
+        except Exception as e:
+            self._retry_later(ready, e)
+            return None
+
+    def _retry_later(self, stock_dirs, error):
+        """匯入失敗（資料庫暫時無法連線等）的目錄等待下一個 debounce 後重試
+
+        已提交的檔案由匯入紀錄略過，未刷新的投影由 import_stock_dirs 依統計水位補上。
+        """
+        self.logger.error(f"匯入 {len(stock_dirs)} 個目錄時發生錯誤: {error}")
+        self.pending.update(dict.fromkeys(stock_dirs, time.monotonic()))
+
+    def _import(self, stock_dirs):
+        totals = import_stock_dirs(stock_dirs, self.app, self.logger, self.workers, self.writers)
+        stock_count, price_count, error_count, _, _ = totals
+        if stock_count or price_count or error_count:
+            self.logger.info(
+                f"📥 匯入 {len(stock_dirs)} 個目錄: 新增股票 {stock_count}、"
+                f"價格記錄 {price_count}、錯誤 {error_count}"
+            )
+        return totals
+
+    def run(self):
+        """持續監看直到 stop()"""
+        self.catch_up()
+        self.logger.info(f"👀 開始監看: {self.data_directory}（{type(self.watcher).__name__}）")
+        while not self.stopping.is_set():
+            self.run_once(min(self.debounce, 1.0))
+        self.watcher.close()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="監看資料目錄並自動匯入新的 CSV")
+    parser.add_argument("data_directory", nargs="?", help="資料目錄（預設自動尋找）")
+    parser.add_argument("--poll", action="store_true", help="不使用 inotify，定期掃描檔案")
+    parser.add_argument("--interval", type=float, default=10.0, help="定期掃描的間隔秒數")
+    parser.add_argument("--debounce", type=float, default=5.0, help="目錄靜止多少秒後才匯入")
+    parser.add_argument("--workers", type=int, default=0, help="解析 CSV 的行程數")
+    parser.add_argument("--writers", type=int, default=2, help="並行模式下的資料庫寫入連線數")
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函數"""
+    logger = setup_logging()
+    args = parse_args()
+    data_directory = resolve_data_directory(args.data_directory)
+    if not data_directory:
+        logger.error("找不到股票資料目錄")
+        return False
+
+    app = create_app()
+    # 先開始監看再補匯入，補匯入期間的變更不會遺漏
+    watcher = create_watcher(data_directory, args.poll, args.interval)
+    daemon = IngestDaemon(
+        app, data_directory, logger, watcher, args.debounce, args.workers, args.writers
+    )
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    logger.info("🛑 監看服務已停止")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
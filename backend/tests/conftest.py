@@ -0,0 +1,147 @@
+"""
+後端測試共用 fixtures - 使用 testing 配置（SQLite 記憶體資料庫）
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, price_history
+from app.backtest import backtest_jobs
+from app.correlation import correlation_cache
+from app.extensions import db
+from app.indicators import indicator_cache
+from app.market_statistics import market_statistics_cache
+from app.models import Stock, StockPrice, User
+from app.portfolio import portfolio_cache
+from app.price_cache import price_cache
+from app.quote_push import quote_publisher
+from app.screener import panel_cache
+from app.search_index import stock_search_index
+from app.utils import TokenManager
+
+# 冷資料庫模型的 server_default 為 PostgreSQL 的 NOW()、JSONB 等，SQLite 以精簡的建表語句代替
+COLD_TABLE_DDL = (
+    """
+    CREATE TABLE stock_prices_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        original_id INTEGER NOT NULL,
+        stock_id INTEGER NOT NULL,
+        trade_date DATE NOT NULL,
+        open_price NUMERIC(10, 2),
+        high_price NUMERIC(10, 2),
+        low_price NUMERIC(10, 2),
+        close_price NUMERIC(10, 2),
+        change_amount NUMERIC(10, 2),
+        volume BIGINT,
+        turnover BIGINT,
+        transaction_count INTEGER,
+        created_at DATETIME NOT NULL,
+        archived_at DATETIME NOT NULL,
+        UNIQUE (stock_id, trade_date)
+    )
+    """,
+    """
+    CREATE TABLE market_trend_analysis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        analysis_date DATE NOT NULL,
+        market_type VARCHAR(20),
+        total_volume BIGINT,
+        total_turnover BIGINT,
+        avg_price_change NUMERIC(10, 4),
+        volatility_index NUMERIC(10, 4),
+        trend_data TEXT,
+        technical_indicators TEXT,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+)
+
+
+@pytest.fixture
+def app():
+    """建立測試用應用並初始化資料表"""
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    # 行程內快取以資料版本為鍵，測試之間需清空避免沿用前一個資料庫的結果
+    market_statistics_cache.invalidate()
+    correlation_cache.invalidate()
+    panel_cache.invalidate()
+    indicator_cache.invalidate()
+    price_cache.invalidate()
+    portfolio_cache.invalidate()
+    stock_search_index.invalidate()
+    quote_publisher.flush()
+    backtest_jobs.shutdown()
+    price_history.shutdown()
+
+
+@pytest.fixture
+def cold_app(app, tmp_path):
+    """以檔案型 SQLite 作為冷資料庫；熱資料庫保留 2025-06-10 起的資料"""
+    app.config["SQLALCHEMY_BINDS"] = {"cold": f"sqlite:///{tmp_path / 'cold.db'}"}
+    app.config["DUAL_DATABASE_ENABLED"] = True
+    app.config["COLD_DB_QUERY_TIMEOUT"] = 5
+    app.config["ARCHIVAL_CUTOFF_DAYS"] = (date.today() - date(2025, 6, 10)).days
+    engine = db.get_engine(app, bind="cold")
+    with engine.begin() as connection:
+        for ddl in COLD_TABLE_DDL:
+            connection.execute(text(ddl))
+    yield app
+    db.session.remove()
+    engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    """建立測試用戶並回傳帶有 access token 的標頭"""
+    user = User(username="tester", email="tester@example.com")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.commit()
+    token = TokenManager.generate_access_token(user.id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_stock_with_prices(symbol, name, closes, start=date(2025, 6, 2), **stock_fields):
+    """新增一支股票及連續交易日的收盤價，回傳 Stock"""
+    stock = Stock(symbol=symbol, name=name, exchange="TWSE", market_type="上市", **stock_fields)
+    db.session.add(stock)
+    db.session.flush()
+
+    previous = None
+    for offset, close in enumerate(closes):
+        close = Decimal(str(close))
+        change = close - previous if previous is not None else Decimal("0")
+        db.session.add(
+            StockPrice(
+                stock_id=stock.id,
+                trade_date=start + timedelta(days=offset),
+                open_price=close,
+                high_price=close + 1,
+                low_price=close - 1,
+                close_price=close,
+                change_amount=change,
+                volume=1000 * (offset + 1),
+                turnover=int(close * 1000),
+                transaction_count=10,
+            )
+        )
+        previous = close
+    db.session.flush()
+    return stock
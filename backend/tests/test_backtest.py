@@ -0,0 +1,153 @@
+"""
+回測測試 - 以逐日迴圈的參考實作驗證向量化模擬
+"""
+
+import time
+
+import numpy as np
+import pytest
+from conftest import add_stock_with_prices
+
+from app.backtest import parse_strategy, positions
+from app.extensions import db
+from app.price_sync import sync_price_projections
+from app.screener import compare, parse_filter
+
+# 盤整、上漲、下跌、再上漲
+CLOSES = (
+    [20] * 8
+    + [20 + i for i in range(1, 13)]
+    + [32 - i for i in range(1, 11)]
+    + [22 + i * 0.5 for i in range(1, 11)]
+)
+
+
+@pytest.fixture
+def universe(app):
+    ids = [
+        add_stock_with_prices("1101", "台泥", CLOSES).id,
+        add_stock_with_prices("2317", "鴻海", [50] * len(CLOSES)).id,
+    ]
+    sync_price_projections(ids)
+    db.session.commit()
+    return ids
+
+
+def reference_equity(closes, period, capital):
+    """逐日迴圈：收盤價高於 SMA 進場、低於 SMA 出場，全額投入且無交易成本"""
+    held, equity, curve = False, capital, []
+    for t, close in enumerate(closes):
+        if t > 0 and held:
+            equity *= close / closes[t - 1]
+        if t >= period - 1:
+            average = sum(closes[t - period + 1 : t + 1]) / period
+            if close < average:
+                held = False
+            elif close > average:
+                held = True
+        curve.append(equity)
+    return curve
+
+
+def test_parse_strategy_validates():
+    strategy = parse_strategy({"entry": "sma5 crosses above sma10", "exit": "rsi14 > 70"})
+    assert strategy.entry[0].op == "crosses above"
+    assert strategy.lookback == 14 * 3 + 2
+
+    for bad in ({}, {"entry": "close >"}, {"entry": "close > 1", "position_size": 2}):
+        with pytest.raises(ValueError):
+            parse_strategy(bad)
+
+
+def test_positions_hold_between_entry_and_exit():
+    entry = np.array([[False, True, False, False, True, True]])
+    exit_signal = np.array([[False, False, False, True, False, True]])
+    assert positions(entry, exit_signal).tolist() == [[False, True, True, False, True, False]]
+
+
+def test_crossover_conditions():
+    fast = np.array([1.0, 2.0, 3.0, 2.0, 1.0])
+    slow = np.full(5, 2.0)
+    assert compare("crosses above", fast, slow).tolist() == [False, False, True, False, False]
+    assert compare("crosses below", fast, slow).tolist() == [False, False, False, False, True]
+    assert parse_filter("SMA5 Crosses  Below sma20")[0].op == "crosses below"
+
+
+def test_backtest_matches_reference(client, auth_headers, universe):
+    response = client.post(
+        "/api/stocks/backtest",
+        headers=auth_headers,
+        json={
+            "symbols": ["1101"],
+            "entry": "close > sma5",
+            "exit": "close < sma5",
+            "start_date": "2025-06-02",
+            "end_date": "2025-12-31",
+            "initial_capital": 100000,
+            "commission": 0,
+            "tax": 0,
+        },
+    )
+    assert response.status_code == 202
+    job = client.get(f"/api/stocks/backtest/{response.get_json()['id']}", headers=auth_headers)
+    result = job.get_json()
+    assert result["status"] == "completed"
+
+    expected = reference_equity(CLOSES, 5, 100000)
+    np.testing.assert_allclose(result["result"]["equity"]["values"], expected, atol=0.01)
+
+    trades = result["result"]["trades"]
+    assert trades[0]["entry_date"] == "2025-06-10" and trades[0]["exit_date"] == "2025-06-23"
+    assert trades[-1]["open"] is True
+    stats = result["result"]["stats"]
+    assert stats["trades"] == len(trades)
+    assert stats["total_return"] == pytest.approx(expected[-1] / 100000 - 1, abs=1e-4)
+    assert stats["max_drawdown"] < 0
+
+
+def test_costs_and_position_size(client, auth_headers, universe):
+    spec = {
+        "symbols": "1101,2317",
+        "entry": "close > 0",
+        "start_date": "2025-06-02",
+        "end_date": "2025-12-31",
+        "position_size": 0.25,
+        "commission": 0.001,
+        "tax": 0,
+    }
+    response = client.post("/api/stocks/backtest", headers=auth_headers, json=spec)
+    result = response.get_json()["result"]
+    # 兩支各 25%，第一天買進成本 0.05%，其後一路持有
+    assert result["stats"]["exposure"] == 0.5
+    assert result["equity"]["values"][0] == pytest.approx(1_000_000 * (1 - 0.0005))
+    assert len(result["trades"]) == 2
+
+
+def test_backtest_errors(client, auth_headers, universe):
+    response = client.post("/api/stocks/backtest", headers=auth_headers, json={"entry": "x > 1"})
+    assert response.status_code == 400
+    response = client.post("/api/stocks/backtest", headers=auth_headers, json={"entry": "close>1"})
+    assert response.status_code == 400  # 未指定股票池
+
+    response = client.get("/api/stocks/backtest/unknown", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_backtest_runs_in_process_pool(app, client, auth_headers, universe):
+    app.config["BACKTEST_WORKERS"] = 1
+    response = client.post(
+        "/api/stocks/backtest",
+        headers=auth_headers,
+        json={"exchange": "TWSE", "entry": "sma5 crosses above sma10", "start_date": "2025-06-02"},
+    )
+    assert response.status_code == 202
+    url = f"/api/stocks/backtest/{response.get_json()['id']}"
+
+    deadline = time.time() + 60
+    while True:
+        data = client.get(url, headers=auth_headers).get_json()
+        if data["status"] not in ("queued", "running") or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert data["status"] == "completed"
+    assert [stock["symbol"] for stock in data["result"]["stocks"]] == ["1101", "2317"]
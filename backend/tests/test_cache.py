@@ -0,0 +1,46 @@
+"""
+快取工具測試 - 驗證 LRU 淘汰與 single-flight 行為
+"""
+
+import threading
+import time
+
+from app.cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_get_or_set_computes_once_for_concurrent_misses():
+    cache = LRUCache(maxsize=4)
+    calls = []
+    barrier = threading.Barrier(8)
+    results = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_set("key", factory))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+    assert cache._inflight == {}
@@ -0,0 +1,104 @@
+"""
+欄式二進位回應測試 - msgpack 解碼後須與 JSON 回應內容一致
+"""
+
+import numpy as np
+import pytest
+from conftest import add_stock_with_prices
+
+from app import columnar
+from app.extensions import db
+from app.price_sync import sync_price_projections
+
+MSGPACK_HEADERS = {"Accept": columnar.MSGPACK}
+
+
+@pytest.fixture
+def priced_stock(app):
+    stock = add_stock_with_prices("2330", "台積電", [500 + i for i in range(30)])
+    sync_price_projections([stock.id])
+    db.session.commit()
+    return stock
+
+
+def test_msgpack_round_trip_keeps_types():
+    columns = {
+        "trade_date": np.array(["2025-06-02", "2025-06-03"], dtype="datetime64[D]"),
+        "close_price": np.array([1.5, np.nan]),
+        "trade_days": np.array([3, 4], dtype=np.int64),
+        "symbol": ["1101", None],
+    }
+    decoded, metadata = columnar.decode_msgpack(columnar.encode_msgpack(columns, {"a": 1}))
+
+    assert metadata == {"a": 1}
+    np.testing.assert_array_equal(decoded["trade_date"], columns["trade_date"])
+    np.testing.assert_array_equal(decoded["close_price"], columns["close_price"])
+    np.testing.assert_array_equal(decoded["trade_days"], [3, 4])
+    assert decoded["symbol"] == ["1101", None]
+
+
+def test_history_msgpack_matches_json(client, auth_headers, priced_stock):
+    url = "/api/stocks/2330/history?start_date=2025-06-01&end_date=2025-12-31"
+    expected = client.get(url, headers=auth_headers).get_json()
+
+    response = client.get(url, headers={**auth_headers, **MSGPACK_HEADERS})
+    assert response.status_code == 200
+    assert response.mimetype == columnar.MSGPACK
+    assert "Accept" in response.vary
+
+    columns, metadata = columnar.decode_msgpack(response.data)
+    assert metadata["count"] == expected["count"] == 30
+    assert np.datetime_as_string(columns["trade_date"]).tolist() == [
+        row["trade_date"] for row in expected["history"]
+    ]
+    assert columns["close_price"].tolist() == [row["close_price"] for row in expected["history"]]
+    assert columns["volume"].tolist() == [row["volume"] for row in expected["history"]]
+
+
+def test_history_etag_depends_on_format(client, auth_headers, priced_stock):
+    url = "/api/stocks/2330/history?start_date=2025-06-01&end_date=2025-12-31"
+    as_json = client.get(url, headers=auth_headers)
+    as_msgpack = client.get(url, headers={**auth_headers, **MSGPACK_HEADERS})
+    assert as_json.headers["ETag"] != as_msgpack.headers["ETag"]
+
+    revalidated = client.get(
+        url,
+        headers={**auth_headers, **MSGPACK_HEADERS, "If-None-Match": as_msgpack.headers["ETag"]},
+    )
+    assert revalidated.status_code == 304
+    mismatched = client.get(
+        url, headers={**auth_headers, "If-None-Match": as_msgpack.headers["ETag"]}
+    )
+    assert mismatched.status_code == 200
+
+
+def test_weekly_history_msgpack(client, auth_headers, priced_stock):
+    response = client.get(
+        "/api/stocks/2330/history?start_date=2025-06-01&end_date=2025-12-31&resolution=week",
+        headers={**auth_headers, **MSGPACK_HEADERS},
+    )
+    columns, metadata = columnar.decode_msgpack(response.data)
+    assert metadata["resolution"] == "week"
+    assert columns["trade_days"].tolist() == [7, 7, 7, 7, 2]
+    assert np.datetime_as_string(columns["trade_date"][0]) == "2025-06-02"
+
+
+def test_quotes_msgpack(client, auth_headers, priced_stock):
+    response = client.get(
+        "/api/stocks/quotes?symbols=2330,9999", headers={**auth_headers, **MSGPACK_HEADERS}
+    )
+    columns, metadata = columnar.decode_msgpack(response.data)
+    assert metadata == {"missing": ["9999"]}
+    assert columns["symbol"] == ["2330"]
+    assert columns["price"].tolist() == [529.0]
+
+
+def test_arrow_without_pyarrow_is_not_acceptable(client, auth_headers, priced_stock, monkeypatch):
+    monkeypatch.setattr(columnar, "pa", None)
+    url = "/api/stocks/2330/history"
+    arrow_only = client.get(url, headers={**auth_headers, "Accept": columnar.ARROW})
+    assert arrow_only.status_code == 406
+
+    fallback = client.get(url, headers={**auth_headers, "Accept": f"{columnar.ARROW}, */*;q=0.1"})
+    assert fallback.status_code == 200
+    assert fallback.mimetype == columnar.JSON
@@ -0,0 +1,77 @@
+"""
+報酬相關係數測試 - 以逐對計算的參考結果驗證向量化矩陣
+"""
+
+import numpy as np
+import pytest
+from conftest import add_stock_with_prices
+
+from app.correlation import daily_returns, pairwise_correlation
+from app.extensions import db
+from app.price_sync import sync_price_projections
+
+
+def test_matches_corrcoef_without_gaps():
+    rng = np.random.default_rng(7)
+    returns = rng.normal(size=(5, 250))
+    returns[1] = returns[0] * 0.5 + rng.normal(size=250) * 0.1
+
+    corr, count = pairwise_correlation(returns)
+    np.testing.assert_allclose(corr, np.corrcoef(returns), atol=1e-10)
+    assert (count == 250).all()
+
+
+def test_pairwise_uses_overlapping_days_only():
+    rng = np.random.default_rng(11)
+    returns = rng.normal(size=(3, 120))
+    returns[0, :30] = np.nan
+    returns[1, 90:] = np.nan
+    returns[2, ::2] = np.nan
+
+    corr, count = pairwise_correlation(returns, min_periods=10)
+    for i in range(3):
+        for j in range(3):
+            both = ~np.isnan(returns[i]) & ~np.isnan(returns[j])
+            assert count[i, j] == both.sum()
+            expected = np.corrcoef(returns[i, both], returns[j, both])[0, 1]
+            assert corr[i, j] == pytest.approx(expected, abs=1e-10)
+
+    corr, _ = pairwise_correlation(returns, min_periods=61)
+    assert np.isnan(corr[0, 1]) and np.isnan(corr[1, 2])
+
+
+def test_daily_returns_use_previous_close():
+    close = np.array([[10.0, 11.0, np.nan, 12.1]])
+    change = np.array([[0.0, 1.0, np.nan, 1.1]])
+    np.testing.assert_allclose(daily_returns(close, change), [[0.0, 0.1, np.nan, 0.1]])
+
+
+def test_correlation_endpoint(app, client, auth_headers):
+    closes = [100 + (i % 5) * 2 for i in range(40)]
+    ids = [
+        add_stock_with_prices("1101", "台泥", closes).id,
+        add_stock_with_prices("1102", "亞泥", [c * 2 for c in closes]).id,
+        add_stock_with_prices("2330", "台積電", [300 - c for c in closes]).id,
+    ]
+    sync_price_projections(ids)
+    db.session.commit()
+
+    data = client.get(
+        "/api/stocks/correlation?symbols=2330,1101,1102"
+        "&start_date=2025-06-01&end_date=2025-07-31&min_periods=5",
+        headers=auth_headers,
+    ).get_json()
+    assert data["symbols"] == ["1101", "1102", "2330"]
+    assert data["trading_days"] == 40
+    assert data["matrix"][0][1] == pytest.approx(1.0, abs=1e-3)
+    assert data["matrix"][0][2] < -0.9
+    assert data["observations"][0][1] == 40
+
+    data = client.get(
+        "/api/stocks/correlation?exchange=TWSE&start_date=2025-06-01&end_date=2025-07-31",
+        headers=auth_headers,
+    ).get_json()
+    assert len(data["matrix"]) == 3
+
+    response = client.get("/api/stocks/correlation?symbols=1101", headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,93 @@
+"""
+數據庫適配器測試 - 驗證各引擎產生的 SQL 語法
+"""
+
+from app.database_adapter import DatabaseAdapter, chunked
+
+
+def test_latest_rows_query_uses_distinct_on_for_postgresql():
+    sql = DatabaseAdapter("postgresql").get_latest_rows_query(
+        "stock_prices", ["stock_id", "close_price"], "stock_id", "trade_date"
+    )
+    assert sql.startswith("SELECT DISTINCT ON (stock_id)")
+    assert "ORDER BY stock_id, trade_date DESC" in sql
+
+
+def test_latest_rows_query_uses_row_number_elsewhere():
+    for engine in ("mssql+pyodbc", "sqlite", "postgresql"):
+        sql = DatabaseAdapter(engine).get_latest_rows_query(
+            "stock_prices", ["stock_id", "close_price"], "stock_id", "trade_date", max_rank=2
+        )
+        assert "ROW_NUMBER() OVER (PARTITION BY stock_id ORDER BY trade_date DESC)" in sql
+        assert sql.endswith("WHERE row_rank <= 2")
+
+
+def test_latest_rows_query_rejects_unsafe_identifiers():
+    adapter = DatabaseAdapter("mssql")
+    try:
+        adapter.get_latest_rows_query("stock_prices; DROP", ["id"], "stock_id", "trade_date")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("應拒絕不合法的表名")
+
+
+PRICE_COLUMNS = dict.fromkeys(["stock_id", "trade_date", "close_price"])
+
+
+def test_upsert_query_uses_merge_on_mssql():
+    sql = DatabaseAdapter("mssql+pyodbc").get_upsert_query(
+        "stock_prices", PRICE_COLUMNS, ["stock_id", "trade_date"], rows=2
+    )
+    assert sql.startswith("MERGE INTO stock_prices WITH (HOLDLOCK) AS target")
+    assert "VALUES (:stock_id_0, :trade_date_0, :close_price_0), (:stock_id_1," in sql
+    assert "ON target.stock_id = source.stock_id AND target.trade_date = source.trade_date" in sql
+    assert "WHEN MATCHED THEN UPDATE SET close_price = source.close_price" in sql
+    assert sql.endswith("VALUES (source.stock_id, source.trade_date, source.close_price);")
+
+    insert_only = DatabaseAdapter("mssql").get_upsert_query(
+        "stock_prices", PRICE_COLUMNS, ["stock_id", "trade_date"], update=False
+    )
+    assert "WHEN MATCHED" not in insert_only
+
+
+def test_upsert_query_uses_on_conflict_elsewhere():
+    for engine in ("postgresql", "sqlite"):
+        adapter = DatabaseAdapter(engine)
+        sql = adapter.get_upsert_query("stock_prices", PRICE_COLUMNS, ["stock_id", "trade_date"])
+        assert sql.startswith("INSERT INTO stock_prices (stock_id, trade_date, close_price)")
+        assert sql.endswith(
+            "ON CONFLICT (stock_id, trade_date) DO UPDATE SET close_price = EXCLUDED.close_price"
+        )
+        insert_only = adapter.get_upsert_query(
+            "stock_prices", PRICE_COLUMNS, ["stock_id", "trade_date"], update=False
+        )
+        assert insert_only.endswith("DO NOTHING")
+
+
+def test_upsert_batch_respects_parameter_limits():
+    assert DatabaseAdapter("mssql").get_max_upsert_rows(10) == 209
+    assert DatabaseAdapter("postgresql").get_max_upsert_rows(10) == 1000
+    assert DatabaseAdapter("sqlite").get_max_upsert_rows(10) == 99
+    for bad in ({"rows": 210}, {"conflict_columns": ["id"]}):
+        try:
+            DatabaseAdapter("mssql").get_upsert_query(
+                "stock_prices",
+                dict.fromkeys(f"c{i}" for i in range(10)),
+                bad.get("conflict_columns", ["c0"]),
+                rows=bad.get("rows", 1),
+            )
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"應拒絕 {bad}")
+
+
+def test_chunked_splits_within_parameter_limit():
+    assert list(chunked(range(2500))) == [
+        list(range(0, 1000)),
+        list(range(1000, 2000)),
+        list(range(2000, 2500)),
+    ]
+    assert list(chunked(iter("abcde"), 2)) == [["a", "b"], ["c", "d"], ["e"]]
+    assert list(chunked([])) == []
@@ -0,0 +1,35 @@
+"""
+降採樣測試 - 驗證 LTTB 保留頭尾與極值、略過 NaN
+"""
+
+import numpy as np
+import pytest
+
+from app.downsampling import lttb
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[300] = 5.0
+    y[700] = -5.0
+
+    index = lttb(x, y, 50)
+    assert len(index) == 50
+    assert index[0] == 0 and index[-1] == 999
+    assert np.all(np.diff(index) > 0)
+    assert 300 in index and 700 in index
+
+
+def test_lttb_skips_nan_and_returns_short_series_unchanged():
+    y = np.array([1.0, np.nan, 3.0, 4.0])
+    assert lttb(np.arange(4), y, 10).tolist() == [0, 2, 3]
+
+    y = np.full(100, np.nan)
+    y[::2] = np.arange(50)
+    index = lttb(np.arange(100), y, 10)
+    assert len(index) == 10
+    assert not np.isnan(y[index]).any()
+
+    with pytest.raises(ValueError):
+        lttb(np.arange(4), y[:4], 2)
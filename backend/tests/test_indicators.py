@@ -0,0 +1,87 @@
+"""
+技術指標測試 - 以逐筆計算的參考實作驗證向量化結果
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from app.indicators import (
+    bbands,
+    compute_indicators,
+    ema,
+    macd,
+    parse_indicator_set,
+    rsi,
+    sma,
+)
+
+PRICES = np.array([20 + 5 * math.sin(i / 7) + i * 0.05 for i in range(600)])
+
+
+def reference_smooth(values, alpha, window):
+    result = [math.nan] * len(values)
+    state = sum(values[:window]) / window
+    result[window - 1] = state
+    for i in range(window, len(values)):
+        state = alpha * values[i] + (1 - alpha) * state
+        result[i] = state
+    return np.array(result)
+
+
+def test_sma_matches_reference():
+    result = sma(PRICES, 20)
+    assert np.isnan(result[:19]).all()
+    assert result[19] == pytest.approx(PRICES[:20].mean())
+    assert result[-1] == pytest.approx(PRICES[-20:].mean())
+
+
+def test_ema_matches_recursive_reference():
+    np.testing.assert_allclose(ema(PRICES, 12), reference_smooth(PRICES, 2 / 13, 12), rtol=1e-10)
+
+
+def test_rsi_matches_wilder_reference():
+    delta = np.diff(PRICES)
+    gains = reference_smooth(np.maximum(delta, 0), 1 / 14, 14)
+    losses = reference_smooth(np.maximum(-delta, 0), 1 / 14, 14)
+    expected = 100 - 100 / (1 + gains / losses)
+
+    result = rsi(PRICES, 14)
+    assert np.isnan(result[:14]).all()
+    np.testing.assert_allclose(result[1:][13:], expected[13:], rtol=1e-9)
+
+
+def test_macd_and_bbands_shapes():
+    line = macd(PRICES)
+    assert np.isnan(line["signal"][:33]).all()
+    assert not np.isnan(line["signal"][33])
+    np.testing.assert_allclose(line["histogram"], line["macd"] - line["signal"])
+
+    bands = bbands(PRICES, 20)
+    assert bands["upper"][-1] - bands["middle"][-1] == pytest.approx(2 * PRICES[-20:].std())
+
+
+def test_two_dimensional_input_is_row_wise():
+    panel = np.vstack([PRICES, PRICES * 2])
+    np.testing.assert_allclose(ema(panel, 12)[1], ema(PRICES * 2, 12))
+    np.testing.assert_allclose(sma(panel, 5)[0], sma(PRICES, 5))
+
+
+def test_missing_closes_are_skipped():
+    close = PRICES[:60].copy()
+    close[30] = np.nan
+    results = compute_indicators(close, parse_indicator_set("ema12"))
+
+    assert np.isnan(results["ema12"][30])
+    expected = ema(np.delete(close, 30), 12)
+    assert results["ema12"][-1] == pytest.approx(expected[-1])
+
+
+def test_parse_indicator_set():
+    parsed = parse_indicator_set("sma20, EMA12,rsi,macd,bbands,sma20")
+    assert [name for name, _, _ in parsed] == ["sma20", "ema12", "rsi14", "macd", "bbands20"]
+
+    for spec in ("foo", "sma0", "macd12", ""):
+        with pytest.raises(ValueError):
+            parse_indicator_set(spec)
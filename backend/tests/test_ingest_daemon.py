@@ -0,0 +1,143 @@
+"""
+監看匯入服務測試 - 驗證 inotify / 定期掃描偵測新檔案、debounce 與匯入後的推播事件
+"""
+
+import logging
+import time
+
+import pytest
+
+from app import quote_push
+from app.models import Stock, StockPrice
+from scripts.ingest_daemon import (
+    IngestDaemon,
+    InotifyWatcher,
+    PollingWatcher,
+    create_watcher,
+)
+
+CSV_HEADER = "日期,成交股數,成交金額,開盤價,最高價,最低價,收盤價,漲跌價差,成交筆數\n"
+
+
+def write_month(stock_dir, month, closes):
+    stock_dir.mkdir(exist_ok=True)
+    lines = [
+        f"2025{month:02d}{day:02d},1000,50000,{close},{close},{close},{close},0.00,5\n"
+        for day, close in zip(range(2, 2 + len(closes)), closes)
+    ]
+    (stock_dir / f"2025{month:02d}.csv").write_text(CSV_HEADER + "".join(lines), "utf-8")
+
+
+def make_watcher(kind, root):
+    if kind == "polling":
+        return PollingWatcher(root, interval=0.01)
+    try:
+        return InotifyWatcher(root)
+    except OSError as e:
+        pytest.skip(f"inotify 無法使用: {e}")
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    events = []
+    monkeypatch.setattr(
+        quote_push.socketio, "emit", lambda event, data, **kwargs: events.append((event, data))
+    )
+    return events
+
+
+def run_until_imported(daemon, deadline=5.0):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        totals = daemon.run_once(0.05)
+        if totals:
+            return totals
+    raise AssertionError("監看服務未匯入變更")
+
+
+@pytest.mark.parametrize("kind", ["polling", "inotify"])
+def test_new_files_are_imported(app, tmp_path, emitted, kind):
+    write_month(tmp_path / "1101_台泥_上市", 5, [40, 41, 42])
+    watcher = make_watcher(kind, tmp_path)
+    daemon = IngestDaemon(app, tmp_path, logging.getLogger("test"), watcher, debounce=0.1)
+    try:
+        assert daemon.catch_up()[1] == 3
+        assert emitted[-1] == ("prices_updated", {"symbols": ["1101"], "trade_date": "2025-05-04"})
+
+        write_month(tmp_path / "1101_台泥_上市", 6, [43, 44])
+        write_month(tmp_path / "2330_台積電_上市", 6, [500])
+        (tmp_path / "2330_台積電_上市" / "notes.txt").write_text("略過", "utf-8")
+        totals = run_until_imported(daemon)
+    finally:
+        watcher.close()
+
+    assert totals[:3] == (1, 3, 0)
+    assert StockPrice.query.count() == 6
+    assert Stock.query.filter_by(symbol="2330").one().name == "台積電"
+    assert emitted[-1] == (
+        "prices_updated",
+        {"symbols": ["1101", "2330"], "trade_date": "2025-06-03"},
+    )
+
+
+def test_changes_wait_for_debounce(app, tmp_path, emitted):
+    stock_dir = tmp_path / "1101_台泥_上市"
+    stock_dir.mkdir()
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+    daemon = IngestDaemon(app, tmp_path, logging.getLogger("test"), watcher, debounce=0.5)
+
+    write_month(stock_dir, 6, [40])
+    assert daemon.run_once(0.05) is None
+    assert list(daemon.pending) == [stock_dir]
+
+    # 靜止期間再次修改，重新計時
+    time.sleep(0.3)
+    write_month(stock_dir, 6, [40, 41])
+    assert daemon.run_once(0.05) is None
+    time.sleep(0.25)
+    assert daemon.run_once(0.05) is None
+    assert StockPrice.query.count() == 0
+
+    assert run_until_imported(daemon)[1] == 2
+    assert daemon.pending == {}
+    assert [event for event, _ in emitted] == ["quote", "prices_updated"]
+
+
+def test_failed_catch_up_is_retried(app, tmp_path, emitted, monkeypatch):
+    stock_dir = tmp_path / "1101_台泥_上市"
+    write_month(stock_dir, 6, [40, 41])
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+    daemon = IngestDaemon(app, tmp_path, logging.getLogger("test"), watcher, debounce=0.1)
+
+    def unavailable(*args):
+        raise RuntimeError("資料庫無法連線")
+
+    # 啟動時資料庫無法連線：不中止，所有目錄排入重試
+    monkeypatch.setattr("scripts.ingest_daemon.import_stock_dirs", unavailable)
+    assert daemon.catch_up() is None
+    assert list(daemon.pending) == [stock_dir]
+
+    monkeypatch.undo()
+    assert run_until_imported(daemon)[1] == 2
+    assert daemon.pending == {}
+
+
+def test_unchanged_directories_are_ignored(tmp_path):
+    (tmp_path / "README").mkdir()
+    write_month(tmp_path / "README", 6, [1])
+    write_month(tmp_path / "1101_台泥_上市", 6, [40])
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+
+    # 起始狀態不視為變更；不符合 <代碼>_<名稱>_<市場別> 的目錄不監看
+    assert watcher.poll(0.05) == set()
+    write_month(tmp_path / "README", 6, [1, 2])
+    assert watcher.poll(0.05) == set()
+
+
+def test_create_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    def unavailable(root):
+        raise OSError("inotify 無法使用")
+
+    monkeypatch.setattr("scripts.ingest_daemon.InotifyWatcher", unavailable)
+    assert isinstance(create_watcher(tmp_path), PollingWatcher)
+    assert isinstance(create_watcher(tmp_path, poll=True), PollingWatcher)
@@ -0,0 +1,109 @@
+"""
+市場趨勢彙總測試 - 驗證分組統計、併入已封存的交易日、匯入後彙總與未設定冷資料庫時的端點
+"""
+
+import logging
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.market_trends import compute_market_trends, load_day_prices, rollup_market_trends
+from app.models_cold import MarketTrendAnalysis, StockPriceHistory
+from scripts.import_stock_data_v2 import import_stock_data
+
+
+def test_groups_by_day_and_market_type():
+    dates = np.array(["2025-06-02"] * 3 + ["2025-06-03"] * 2, dtype="datetime64[D]")
+    market_types = ["上市", "上市", "上櫃", "上市", "上市"]
+    close = [110.0, 90.0, 50.0, 121.0, 45.0]
+    change = [10.0, -10.0, 0.0, 11.0, -45.0]  # 最後一筆前收為 90
+    volume = [100, 200, 300, 400, np.nan]
+    turnover = [1000, 3000, 500, 2000, 2000]
+
+    trends = compute_market_trends(dates, market_types, close, change, volume, turnover)
+    keys = [(t["analysis_date"], t["market_type"]) for t in trends]
+    assert keys == [
+        (date(2025, 6, 2), "上市"),
+        (date(2025, 6, 2), "上櫃"),
+        (date(2025, 6, 3), "上市"),
+    ]
+
+    listed = trends[0]
+    pct = np.array([10.0, -10.0])
+    assert listed["total_volume"] == 300 and listed["total_turnover"] == 4000
+    assert listed["avg_price_change"] == pytest.approx(pct.mean())
+    assert listed["volatility_index"] == pytest.approx(pct.std(), abs=1e-4)
+    assert listed["trend_data"]["advancers"] == 1 and listed["trend_data"]["decliners"] == 1
+    assert listed["trend_data"]["limit_up"] == 1 and listed["trend_data"]["limit_down"] == 1
+    assert listed["trend_data"]["turnover_weighted_change"] == pytest.approx(-5.0)
+
+    assert trends[1]["trend_data"]["unchanged"] == 1
+    assert trends[1]["trend_data"]["advance_decline_ratio"] is None
+    assert trends[2]["total_volume"] == 400
+    assert trends[2]["avg_price_change"] == pytest.approx((10.0 - 50.0) / 2)
+
+
+def test_rollup_from_stored_prices(app):
+    add_stock_with_prices("1101", "台泥", [10, 11, 12])
+    add_stock_with_prices("6488", "環球晶", [100, 99, 98])
+    db.session.commit()
+
+    trends = compute_market_trends(*load_day_prices(date(2025, 6, 3), date(2025, 6, 4)))
+    assert len(trends) == 2
+    assert [t["trend_data"]["stocks"] for t in trends] == [2, 2]
+    assert trends[0]["trend_data"]["advancers"] == 1
+
+
+def test_market_overview_requires_cold_database(client, auth_headers):
+    response = client.get("/api/stocks/market-overview", headers=auth_headers)
+    assert response.status_code == 503
+
+
+def test_rollup_includes_archived_days(cold_app):
+    stock = add_stock_with_prices("1101", "台泥", [10, 11, 12], date(2025, 6, 10))
+    db.session.commit()
+    now = datetime(2025, 7, 1)
+    # 6/05、6/06 已封存；6/10 同時存在兩邊，應以熱資料為準
+    db.session.add_all(
+        StockPriceHistory(
+            original_id=day,
+            stock_id=stock.id,
+            trade_date=date(2025, 6, day),
+            close_price=9,
+            change_amount=1,
+            volume=500,
+            turnover=4500,
+            created_at=now,
+            archived_at=now,
+        )
+        for day in (5, 6, 10)
+    )
+    db.session.commit()
+
+    assert rollup_market_trends() == 5
+    trends = {t.analysis_date: t for t in MarketTrendAnalysis.query}
+    assert sorted(trends)[0] == date(2025, 6, 5)
+    assert trends[date(2025, 6, 5)].total_volume == 500
+    assert trends[date(2025, 6, 10)].total_volume == 1000
+    assert trends[date(2025, 6, 10)].market_type == "上市"
+
+
+def test_import_rolls_up_new_trade_days(cold_app, tmp_path):
+    stock_dir = tmp_path / "1101_台泥_上市"
+    stock_dir.mkdir()
+    header = "日期,成交股數,成交金額,開盤價,最高價,最低價,收盤價,漲跌價差,成交筆數\n"
+    rows = "".join(f"202506{day:02d},1000,50000,50,50,50,50,0.00,5\n" for day in (2, 3, 4))
+    (stock_dir / "202506.csv").write_text(header + rows, "utf-8")
+    logger = logging.getLogger("test_import")
+
+    assert import_stock_data(tmp_path, cold_app, logger)
+    days = [t.analysis_date for t in MarketTrendAnalysis.query.order_by("analysis_date")]
+    assert days == [date(2025, 6, 2), date(2025, 6, 3), date(2025, 6, 4)]
+
+    new_day = "20250605,1000,50000,51,51,51,51,1.00,5\n"
+    (stock_dir / "202506.csv").write_text(header + rows + new_day, "utf-8")
+    assert import_stock_data(tmp_path, cold_app, logger)
+    assert MarketTrendAnalysis.query.count() == 4
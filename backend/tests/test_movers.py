@@ -0,0 +1,84 @@
+"""
+每日排行測試 - 驗證匯入時預先排序的排行與 /movers 端點
+"""
+
+from datetime import date
+
+import pytest
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.models import StockPrice, StockRanking
+from app.price_sync import sync_price_projections
+
+# 最後一天（2025-06-03）的漲跌幅：+10%、+5%、0%、-2%、-8%
+MARKET = {
+    "1101": [100, 110],
+    "1102": [100, 105],
+    "2317": [100, 100],
+    "2330": [100, 98],
+    "2454": [100, 92],
+}
+
+
+@pytest.fixture
+def market(app):
+    ids = [add_stock_with_prices(symbol, symbol, closes).id for symbol, closes in MARKET.items()]
+    sync_price_projections(ids)
+    db.session.commit()
+    return ids
+
+
+def movers(client, auth_headers, query):
+    response = client.get(f"/api/stocks/movers?{query}", headers=auth_headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_change_pct_top_and_bottom(client, auth_headers, market):
+    data = movers(client, auth_headers, "by=change_pct&limit=2")
+    assert data["date"] == "2025-06-03" and data["ranked_count"] == 5
+    assert [(m["symbol"], m["value"]) for m in data["top"]] == [("1101", 10.0), ("1102", 5.0)]
+    assert [(m["symbol"], m["value"]) for m in data["bottom"]] == [("2454", -8.0), ("2330", -2.0)]
+    assert [m["rank"] for m in data["bottom"]] == [5, 4]
+
+
+def test_volume_ranking_and_date_fallback(client, auth_headers, market):
+    # 2025-06-07 沒有交易，取之前最近的 2025-06-03
+    data = movers(client, auth_headers, "by=volume&limit=1&date=2025-06-07")
+    assert data["date"] == "2025-06-03"
+    # 成交量相同時依股票 id 排序
+    assert data["top"][0]["symbol"] == "1101" and data["bottom"][0]["symbol"] == "2454"
+
+    data = movers(client, auth_headers, "by=change_pct&date=2025-06-02")
+    assert data["date"] == "2025-06-02"
+    assert {m["value"] for m in data["top"]} == {0.0}
+
+    response = client.get("/api/stocks/movers?by=price", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_only_both_ends_are_stored(market, monkeypatch):
+    monkeypatch.setattr(StockRanking, "DEPTH", 2)
+    StockRanking.rebuild(date(2025, 6, 3))
+    ranks = [
+        row.rank
+        for row in StockRanking.query.filter_by(trade_date=date(2025, 6, 3), metric="change_pct")
+    ]
+    assert sorted(ranks) == [1, 2, 4, 5]
+
+
+def test_import_only_reranks_new_days(market):
+    new_day = date(2025, 6, 4)
+    db.session.add(
+        StockPrice(stock_id=market[0], trade_date=new_day, close_price=99, change_amount=-11)
+    )
+    sync_price_projections([market[0]])
+    db.session.commit()
+
+    # 新交易日只有一筆且沒有成交量資料，只列入漲跌幅排行
+    rankings = StockRanking.query.filter_by(trade_date=new_day).all()
+    assert [(r.metric, r.ranked_count, float(r.value)) for r in rankings] == [
+        ("change_pct", 1, -10.0)
+    ]
+    assert StockRanking.query.filter_by(trade_date=date(2025, 6, 3)).count() == 15
@@ -0,0 +1,91 @@
+"""
+投資組合估值測試 - 驗證每日市值、損益與快取失效
+"""
+
+from datetime import date
+
+import pytest
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.portfolio import portfolio_cache
+from app.price_sync import sync_price_projections
+
+URL = "/api/stocks/portfolio?start_date=2025-06-03&end_date=2025-06-30"
+
+
+@pytest.fixture
+def holdings(app, client, auth_headers):
+    ids = [
+        add_stock_with_prices("1101", "台泥", [10, 11, 12, 13, 14]).id,
+        # 晚兩天才開始交易
+        add_stock_with_prices("2330", "台積電", [100, 90, 95], start=date(2025, 6, 4)).id,
+        add_stock_with_prices("2317", "鴻海", [50, 51, 52, 53, 54]).id,
+    ]
+    sync_price_projections(ids)
+    db.session.commit()
+
+    client.put(
+        "/api/stocks/1101/holding", headers=auth_headers, json={"quantity": 1000, "cost_basis": 11}
+    )
+    client.put("/api/stocks/2330/holding", headers=auth_headers, json={"quantity": 10})
+    client.post("/api/stocks/2317/follow", headers=auth_headers)  # 只關注，不列入估值
+    return ids
+
+
+def test_portfolio_series(client, auth_headers, holdings):
+    data = client.get(URL, headers=auth_headers).get_json()
+
+    series = data["series"]
+    assert series["dates"] == ["2025-06-03", "2025-06-04", "2025-06-05", "2025-06-06"]
+    assert series["value"] == [11000, 13000, 13900, 14950]
+    assert series["pnl"] == [0, 1000, 2000, 3000]
+    assert series["daily_pnl"] == [1000, 1000, 900, 1050]
+
+    by_symbol = {holding["symbol"]: holding for holding in data["holdings"]}
+    assert set(by_symbol) == {"1101", "2330"}
+    assert by_symbol["1101"]["unrealized_pnl"] == 3000
+    assert by_symbol["2330"]["unrealized_pnl"] is None
+    assert data["summary"] == {
+        "market_value": 14950,
+        "cost": 11000,
+        "unrealized_pnl": 3000,
+        "unrealized_pnl_pct": pytest.approx(27.27),
+    }
+
+
+def test_pnl_counts_cost_from_first_price(client, auth_headers, holdings):
+    # 2330 自 6/04 才有價格，之前的日期不扣除其成本
+    client.put(
+        "/api/stocks/2330/holding", headers=auth_headers, json={"quantity": 10, "cost_basis": 90}
+    )
+    data = client.get(URL, headers=auth_headers).get_json()
+
+    assert data["series"]["dates"][0] == "2025-06-03"
+    assert data["series"]["pnl"] == [0, 1100, 2000, 3050]
+    assert data["summary"]["cost"] == 11900
+    assert data["summary"]["unrealized_pnl"] == 3050
+
+
+def test_holding_changes_invalidate_cache(client, auth_headers, holdings):
+    client.get(URL, headers=auth_headers)
+    assert len(portfolio_cache) == 1
+
+    response = client.put("/api/stocks/1101/holding", headers=auth_headers, json={"quantity": 2000})
+    assert response.get_json()["cost_basis"] is None
+    assert len(portfolio_cache) == 0
+
+    data = client.get(URL, headers=auth_headers).get_json()
+    assert data["series"]["value"][-1] == 2000 * 14 + 10 * 95
+    assert data["summary"]["cost"] == 0
+
+
+def test_holding_validation(client, auth_headers, holdings):
+    for bad in ({"quantity": -1}, {"quantity": "abc"}, {"cost_basis": "NaN"}):
+        response = client.put("/api/stocks/1101/holding", headers=auth_headers, json=bad)
+        assert response.status_code == 400
+
+    response = client.get("/api/stocks/user", headers=auth_headers)
+    by_symbol = {stock["symbol"]: stock for stock in response.get_json()["user_stocks"]}
+    assert by_symbol["1101"]["quantity"] == 1000 and by_symbol["1101"]["cost_basis"] == 11
+    assert by_symbol["2317"]["quantity"] is None
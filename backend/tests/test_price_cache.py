@@ -0,0 +1,55 @@
+"""
+價格快取測試 - 驗證版本失效與 LRU 記憶體上限
+"""
+
+from datetime import date
+
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.models import LatestQuote, StockPrice
+from app.price_cache import PriceCache
+from app.price_sync import sync_price_projections
+
+
+def test_series_slices_match_stored_prices(app):
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32, 33])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    series = PriceCache().get_current(stock.id)
+    lo, hi = series.date_range(date(2025, 6, 3), date(2025, 6, 4))
+    records = series.to_records(lo, hi)
+
+    assert [r["trade_date"] for r in records] == ["2025-06-03", "2025-06-04"]
+    assert [r["close_price"] for r in records] == [31.0, 32.0]
+    assert records[0]["volume"] == 2000
+
+
+def test_new_quote_version_reloads_series(app):
+    cache = PriceCache()
+    stock = add_stock_with_prices("1101", "台泥", [30, 31])
+    sync_price_projections([stock.id])
+    db.session.commit()
+    assert len(cache.get_current(stock.id)) == 2
+
+    # 模擬其他行程匯入：不經過 invalidate，只有 latest_quotes 的版本改變
+    db.session.add(StockPrice(stock_id=stock.id, trade_date=date(2025, 6, 9), close_price=35))
+    LatestQuote.refresh([stock.id])
+    db.session.commit()
+    assert len(cache.get_current(stock.id)) == 3
+
+
+def test_lru_evicts_least_recently_used(app):
+    ids = [add_stock_with_prices(f"{1100 + i}", "股票", [10] * 50).id for i in range(3)]
+    db.session.commit()
+
+    one_series = PriceCache().get(ids[0]).nbytes
+    cache = PriceCache(max_bytes=one_series * 2)
+    cache.get(ids[0])
+    cache.get(ids[1])
+    cache.get(ids[0])
+    cache.get(ids[2])
+
+    assert cache.stats() == {"entries": 2, "bytes": one_series * 2}
+    assert set(cache._entries) == {ids[0], ids[2]}
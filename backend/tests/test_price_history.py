@@ -0,0 +1,164 @@
+"""
+冷熱分流歷史讀取測試 - 以檔案型 SQLite 作為冷資料庫，驗證區間切分、合併與逾時降級
+"""
+
+import time
+from datetime import date, datetime
+
+import pytest
+from conftest import add_stock_with_prices
+from sqlalchemy import event
+
+from app import price_history
+from app.extensions import db
+from app.models import Stock, StockPrice, StockStatistics
+from app.models_cold import StockPriceHistory
+from app.price_sync import sync_price_projections
+
+HISTORY_URL = "/api/stocks/2330/history?start_date={}&end_date=2025-12-31"
+
+
+@pytest.fixture
+def archived_stock(cold_app):
+    stock = add_stock_with_prices("2330", "台積電", [500 + i for i in range(10)], date(2025, 6, 10))
+    sync_price_projections([stock.id])
+    now = datetime(2025, 7, 1)
+    # 6/02 ~ 6/10 已封存；6/10 同時存在兩邊，應以熱資料為準
+    db.session.add_all(
+        StockPriceHistory(
+            original_id=900 + day,
+            stock_id=stock.id,
+            trade_date=date(2025, 6, day),
+            high_price=401 + day,
+            low_price=399 + day,
+            close_price=400 + day,
+            change_amount=1,
+            volume=100,
+            created_at=now,
+            archived_at=now,
+        )
+        for day in range(2, 11)
+    )
+    db.session.commit()
+    return stock
+
+
+def count_cold_queries(app):
+    counter = {"count": 0}
+
+    def before_cursor_execute(*args):
+        counter["count"] += 1
+
+    event.listen(db.get_engine(app, bind="cold"), "before_cursor_execute", before_cursor_execute)
+    return counter
+
+
+def test_long_range_merges_archive(client, auth_headers, archived_stock):
+    data = client.get(HISTORY_URL.format("2025-06-01"), headers=auth_headers).get_json()
+
+    assert data["complete"] is True
+    assert data["count"] == 18
+    dates = [row["trade_date"] for row in data["history"]]
+    assert dates == sorted(dates) and dates[0] == "2025-06-02"
+    by_date = {row["trade_date"]: row for row in data["history"]}
+    assert by_date["2025-06-09"]["close_price"] == 409 and by_date["2025-06-09"]["id"] == 909
+    assert by_date["2025-06-10"]["close_price"] == 500
+
+
+def test_short_range_skips_cold_database(app, client, auth_headers, archived_stock):
+    counter = count_cold_queries(app)
+    data = client.get(HISTORY_URL.format("2025-06-12"), headers=auth_headers).get_json()
+    assert data["count"] == 8
+    assert counter["count"] == 0
+
+    client.get(HISTORY_URL.format("2025-06-05"), headers=auth_headers)
+    assert counter["count"] == 1
+
+
+def test_cold_timeout_returns_hot_rows(app, client, auth_headers, archived_stock, monkeypatch):
+    original = price_history.load_archived_series
+
+    def slow(*args, **kwargs):
+        time.sleep(0.5)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(price_history, "load_archived_series", slow)
+    app.config["COLD_DB_QUERY_TIMEOUT"] = 0.05
+
+    response = client.get(HISTORY_URL.format("2025-06-01"), headers=auth_headers)
+    data = response.get_json()
+    assert data["complete"] is False
+    assert data["count"] == 10
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_without_cold_database_reads_hot_only(client, auth_headers):
+    add_stock_with_prices("2330", "台積電", [500, 501, 502])
+    db.session.commit()
+    data = client.get(HISTORY_URL.format("2025-01-01"), headers=auth_headers).get_json()
+    assert data["complete"] is True and data["count"] == 3
+
+
+def test_rebuild_statistics_include_archive(client, auth_headers, archived_stock):
+    # 全部重建（db_manager rebuild-projections）時納入早於熱資料的封存價格，6/10 不重複計算
+    sync_price_projections()
+    db.session.commit()
+
+    stats = StockStatistics.query.get(archived_stock.id)
+    assert stats.total_records == 18 and stats.first_date == date(2025, 6, 2)
+    assert stats.min_low == 401 and stats.max_high == 510
+    assert stats.low_52w == 401
+
+    data = client.get("/api/stocks/2330", headers=auth_headers).get_json()
+    assert data["statistics"]["total_records"] == 18
+    assert data["statistics"]["lowest_price"] == 401
+    assert data["complete"] is True
+
+
+def test_incremental_52w_includes_archive(archived_stock):
+    db.session.add(
+        StockPrice(stock_id=archived_stock.id, trade_date=date(2025, 6, 20), close_price=520)
+    )
+    db.session.flush()
+    sync_price_projections([archived_stock.id])
+
+    stats = StockStatistics.query.get(archived_stock.id)
+    assert stats.total_records == 11
+    assert stats.low_52w == 401 and stats.high_52w == 510
+
+
+def test_detail_of_fully_archived_stock(client, auth_headers, cold_app):
+    stock = Stock(symbol="9999", name="已下市", exchange="TWSE", market_type="上市")
+    db.session.add(stock)
+    db.session.commit()
+    now = datetime(2025, 7, 1)
+    db.session.add_all(
+        StockPriceHistory(
+            original_id=day,
+            stock_id=stock.id,
+            trade_date=date(2025, 5, day),
+            high_price=11 + day,
+            low_price=9 + day,
+            close_price=10 + day,
+            created_at=now,
+            archived_at=now,
+        )
+        for day in range(1, 6)
+    )
+    db.session.commit()
+
+    data = client.get("/api/stocks/9999", headers=auth_headers).get_json()
+    assert data["complete"] is True
+    assert data["latest_price"]["trade_date"] == "2025-05-05"
+    assert data["latest_price"]["close_price"] == 15
+    assert data["statistics"] == {
+        "total_records": 5,
+        "first_date": "2025-05-01",
+        "last_date": "2025-05-05",
+        "average_price": 13.0,
+        "highest_price": 16.0,
+        "lowest_price": 10.0,
+        "high_52w": 16.0,
+        "low_52w": 10.0,
+    }
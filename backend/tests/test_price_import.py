@@ -0,0 +1,241 @@
+"""
+價格批次匯入測試 - 驗證多列 UPSERT 只新增不存在的列，以及匯入腳本的端到端流程
+"""
+
+import logging
+import os
+from datetime import date
+from decimal import Decimal
+
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.models import (
+    ImportManifest,
+    LatestQuote,
+    Stock,
+    StockPrice,
+    StockPriceRollup,
+    StockStatistics,
+)
+from app.price_import import upsert_price_columns, upsert_prices
+from app.twse_csv import parse_daily_trades
+from scripts import import_stock_data_v2
+from scripts.import_stock_data_v2 import get_or_create_stock, import_stock_data
+
+CSV_HEADER = "日期,成交股數,成交金額,開盤價,最高價,最低價,收盤價,漲跌價差,成交筆數\n"
+
+
+def price_row(stock_id, day, close):
+    return {
+        "stock_id": stock_id,
+        "trade_date": date(2025, 6, day),
+        "open_price": close,
+        "high_price": close,
+        "low_price": close,
+        "close_price": close,
+        "change_amount": 0,
+        "volume": 1000,
+        "turnover": 1000 * close,
+        "transaction_count": 10,
+    }
+
+
+def test_upsert_inserts_only_missing_rows(app):
+    stock = add_stock_with_prices("1101", "台泥", [40, 41])  # 6/02、6/03
+    db.session.commit()
+
+    rows = [price_row(stock.id, day, 99) for day in range(2, 31)]
+    rows.append(price_row(stock.id, 20, 55))  # 同批重複鍵以最後一筆為準
+    inserted, stock_ids = upsert_prices(rows)
+    db.session.commit()
+
+    assert inserted == 27 and stock_ids == {stock.id}
+    prices = {p.trade_date: p.close_price for p in StockPrice.query.filter_by(stock_id=stock.id)}
+    assert len(prices) == 29
+    assert prices[date(2025, 6, 2)] == Decimal("40")  # 既有資料不覆寫
+    assert prices[date(2025, 6, 20)] == Decimal("55")
+
+    assert upsert_prices(rows)[0] == 0
+    assert upsert_prices([]) == (0, set())
+
+
+def test_upsert_price_columns(app):
+    stock = add_stock_with_prices("1101", "台泥", [40])  # 6/02
+    db.session.commit()
+    columns = parse_daily_trades(
+        CSV_HEADER
+        + "20250602,1000,50000,41,41,41,41,1.00,5\n"
+        + "20250603,1000,50000,42,42,42,42,1.00,5\n"
+        + "20250603,2000,90000,43,43,43,43,2.00,9\n"  # 重複交易日以最後一筆為準
+    )
+    assert upsert_price_columns(columns, stock.id) == (1, {stock.id})
+    db.session.commit()
+    prices = StockPrice.query.filter_by(stock_id=stock.id).order_by(StockPrice.trade_date).all()
+    assert [p.close_price for p in prices] == [Decimal("40"), Decimal("43")]
+    assert prices[1].volume == 2000
+
+
+def test_import_script_writes_files_in_batches(app, tmp_path):
+    stock_dir = tmp_path / "2330_台積電_上市"
+    stock_dir.mkdir()
+    (stock_dir / "202506.csv").write_text(
+        CSV_HEADER
+        + '20250602,"37,802","18,901,000",500.00,505.00,498.00,"1,002.00",+2.00,"1,234"\n'
+        + "20250603,1000,500000,--,--,--,--,0.00,0\n"
+        + "小計,,,,,,,,\n",
+        encoding="utf-8",
+    )
+    logger = logging.getLogger("test_import")
+
+    assert import_stock_data(tmp_path, app, logger)
+    stock = Stock.query.filter_by(symbol="2330").one()
+    assert stock.exchange == "TWSE" and stock.market_type == "上市"
+    prices = StockPrice.query.filter_by(stock_id=stock.id).order_by(StockPrice.trade_date).all()
+    assert [p.volume for p in prices] == [37802, 1000]
+    assert prices[0].close_price == Decimal("1002.00") and prices[0].change_amount == Decimal("2")
+    assert prices[1].close_price is None
+    assert LatestQuote.query.get(stock.id).trade_date == date(2025, 6, 3)
+
+    # 重跑不重複寫入（匯入結束時會移除 session，先取出 id）
+    stock_id = stock.id
+    assert import_stock_data(tmp_path, app, logger)
+    assert StockPrice.query.filter_by(stock_id=stock_id).count() == 2
+
+
+def write_monthly_files(root, directory, closes):
+    stock_dir = root / directory
+    stock_dir.mkdir()
+    for month, days in ((5, range(1, 16)), (6, range(2, 2 + len(closes)))):
+        lines = [
+            f"2025{month:02d}{day:02d},1000,50000,{close},{close},{close},{close},0.00,5\n"
+            for day, close in zip(days, closes)
+        ]
+        (stock_dir / f"2025{month:02d}.csv").write_text(CSV_HEADER + "".join(lines), "utf-8")
+
+
+def test_parallel_import_matches_serial(app, tmp_path):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    for root in (serial, parallel):
+        root.mkdir()
+        write_monthly_files(root, "1101_台泥_上市", [40 + i for i in range(10)])
+        write_monthly_files(root, "6488_環球晶_上櫃", [300 - i for i in range(12)])
+        write_monthly_files(root, "無效目錄", [1])
+    logger = logging.getLogger("test_import")
+
+    # SQLite 記憶體資料庫只有一條共用連線，測試中使用單一寫入執行緒
+    assert import_stock_data(parallel, app, logger, workers=2, writers=1)
+    parallel_rows = db.session.query(StockPrice.stock_id, StockPrice.trade_date).count()
+    tpex = Stock.query.filter_by(symbol="6488").one()
+    assert tpex.exchange == "TPEx"
+    assert LatestQuote.query.get(tpex.id).close_price == Decimal("289")
+
+    assert import_stock_data(serial, app, logger)
+    assert parallel_rows == 20 + 24
+    assert StockPrice.query.count() == parallel_rows  # 同一批資料，不重複寫入
+
+
+def test_get_or_create_stock_is_idempotent(app):
+    first, created = get_or_create_stock("2330", "台積電", "上市")
+    again, created_again = get_or_create_stock("2330", "台積電", "上市")
+    assert created and not created_again
+    assert first.id == again.id
+
+
+def test_manifest_skips_unchanged_files(app, tmp_path, monkeypatch):
+    write_monthly_files(tmp_path, "1101_台泥_上市", [40 + i for i in range(10)])
+    logger = logging.getLogger("test_import")
+    assert import_stock_data(tmp_path, app, logger)
+
+    entry = ImportManifest.query.filter_by(path="1101_台泥_上市/202506.csv").one()
+    assert entry.rows_imported == 10 and entry.last_trade_date == date(2025, 6, 11)
+    assert len(entry.content_hash) == 64
+    snapshot = ImportManifest.snapshot()
+    assert list(snapshot) == ["1101_台泥_上市"] and len(snapshot["1101_台泥_上市"]) == 2
+
+    parsed = []
+    original = import_stock_data_v2.parse_daily_trades
+    monkeypatch.setattr(
+        import_stock_data_v2,
+        "parse_daily_trades",
+        lambda content: parsed.append(1) or original(content),
+    )
+
+    # 未變更：不讀取也不解析
+    assert import_stock_data(tmp_path, app, logger)
+    assert parsed == []
+
+    # 只改修改時間：比對雜湊後不解析，更新紀錄
+    june = tmp_path / "1101_台泥_上市" / "202506.csv"
+    os.utime(june, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    assert import_stock_data(tmp_path, app, logger)
+    assert parsed == []
+    entry = ImportManifest.query.filter_by(path="1101_台泥_上市/202506.csv").one()
+    assert entry.mtime_ns == 1_700_000_000_000_000_000
+
+    # 當月新增一天：只重新解析該檔案
+    with open(june, "a", encoding="utf-8") as f:
+        f.write("20250612,1000,50000,60,60,60,60,0.00,5\n")
+    assert import_stock_data(tmp_path, app, logger)
+    assert len(parsed) == 1
+    entry = ImportManifest.query.filter_by(path="1101_台泥_上市/202506.csv").one()
+    assert entry.rows_imported == 11 and entry.last_trade_date == date(2025, 6, 12)
+
+    assert import_stock_data(tmp_path, app, logger, force=True)
+    assert len(parsed) == 3
+    assert StockPrice.query.count() == 21
+
+
+def test_failed_sync_is_recovered_on_next_run(app, tmp_path, monkeypatch):
+    write_monthly_files(tmp_path, "1101_台泥_上市", [40, 41, 42])
+    logger = logging.getLogger("test_import")
+
+    def fail(stock_ids):
+        raise RuntimeError("模擬刷新投影失敗")
+
+    # 價格與匯入紀錄已逐檔提交，投影未刷新
+    monkeypatch.setattr(import_stock_data_v2, "sync_price_projections", fail)
+    assert not import_stock_data(tmp_path, app, logger)
+    assert StockPrice.query.count() == 6
+    assert LatestQuote.query.count() == 0
+    stock_id = Stock.query.filter_by(symbol="1101").one().id
+    assert StockStatistics.unsynced([stock_id]) == {stock_id}
+
+    # 重跑時檔案皆由匯入紀錄略過，仍依統計水位補刷新
+    monkeypatch.undo()
+    assert import_stock_data(tmp_path, app, logger)
+    assert LatestQuote.query.one().close_price == 42
+    assert Stock.query.get(stock_id).statistics.total_records == 6
+    assert StockStatistics.unsynced([stock_id]) == set()
+
+
+def test_revised_file_corrects_existing_prices(app, tmp_path, caplog):
+    write_monthly_files(tmp_path, "1101_台泥_上市", [40, 41, 42])
+    logger = logging.getLogger("test_import")
+    assert import_stock_data(tmp_path, app, logger)
+    stock_id = Stock.query.filter_by(symbol="1101").one().id
+
+    # 證交所更正：6/03 收盤價由 41 改為 48，並新增 6/05
+    june = tmp_path / "1101_台泥_上市" / "202506.csv"
+    content = june.read_text("utf-8").replace(
+        "20250603,1000,50000,41,41,41,41", "20250603,1000,50000,41,48,41,48"
+    )
+    june.write_text(content + "20250605,1000,50000,43,43,43,43,0.00,5\n", "utf-8")
+    assert import_stock_data(tmp_path, app, logger)
+
+    corrected = StockPrice.query.filter_by(stock_id=stock_id, trade_date=date(2025, 6, 3)).one()
+    assert corrected.close_price == 48 and corrected.high_price == 48
+    assert corrected.open_price == 41
+    assert StockPrice.query.count() == 7
+    stats = Stock.query.get(stock_id).statistics
+    assert stats.total_records == 7 and stats.max_high == 48
+    week = StockPriceRollup.query.filter_by(
+        stock_id=stock_id, resolution="week", period_start=date(2025, 6, 2)
+    ).one()
+    assert week.high_price == 48 and week.trade_days == 4
+    assert "修正 2025-06-03" in caplog.text
+
+    # 內容相同的重新匯入不視為修正
+    caplog.clear()
+    assert import_stock_data(tmp_path, app, logger, force=True)
+    assert "修正" not in caplog.text
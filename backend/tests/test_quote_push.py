@@ -0,0 +1,74 @@
+"""
+報價推播測試 - 驗證訂閱房間、commit 後推送與同一股票的更新合併
+"""
+
+from datetime import date
+
+from conftest import add_stock_with_prices
+
+from app.extensions import db, socketio
+from app.models import StockPrice
+from app.price_sync import sync_price_projections
+from app.quote_push import quote_publisher
+
+
+def _events(client, name):
+    return [event["args"][0] for event in client.get_received() if event["name"] == name]
+
+
+def _add_price(stock, day, close):
+    db.session.add(StockPrice(stock_id=stock.id, trade_date=date(2025, 6, day), close_price=close))
+    db.session.flush()
+    sync_price_projections([stock.id])
+
+
+def test_subscribe_returns_current_quotes(app):
+    stock = add_stock_with_prices("1101", "台泥", [30, 31])
+    sync_price_projections([stock.id])
+    db.session.commit()
+    quote_publisher.flush()
+
+    client = socketio.test_client(app)
+    client.emit("subscribe_quotes", {"symbols": ["1101", "2330", "1101"]})
+    subscribed = _events(client, "subscribed_quotes")[0]
+    assert subscribed["symbols"] == ["1101", "2330"]
+    assert [quote["price"] for quote in subscribed["quotes"]] == [31.0]
+
+    client.emit("subscribe_quotes", {"symbols": []})
+    assert _events(client, "error")
+
+
+def test_updates_pushed_after_commit_and_coalesced(app):
+    app.config["QUOTE_PUSH_COALESCE_MS"] = 60000
+    tsmc = add_stock_with_prices("2330", "台積電", [1000])
+    cement = add_stock_with_prices("1101", "台泥", [30])
+    sync_price_projections([tsmc.id, cement.id])
+    db.session.commit()
+    quote_publisher.flush()
+
+    subscriber = socketio.test_client(app)
+    subscriber.emit("subscribe_quotes", {"symbols": "2330"})
+    subscriber.get_received()
+
+    # rollback 的更新不會推送
+    _add_price(tsmc, 3, 1010)
+    db.session.rollback()
+    assert quote_publisher.flush() == 0
+
+    # 同一時間窗內的多次更新只推送最後一筆，且只送到訂閱的房間
+    _add_price(tsmc, 3, 1010)
+    db.session.commit()
+    _add_price(tsmc, 4, 1020)
+    _add_price(cement, 3, 31)
+    db.session.commit()
+    assert subscriber.get_received() == []
+
+    assert quote_publisher.flush() == 2
+    quotes = _events(subscriber, "quote")
+    assert [(quote["symbol"], quote["price"]) for quote in quotes] == [("2330", 1020.0)]
+
+    subscriber.emit("unsubscribe_quotes", {"symbols": ["2330"]})
+    _add_price(tsmc, 5, 1030)
+    db.session.commit()
+    quote_publisher.flush()
+    assert _events(subscriber, "quote") == []
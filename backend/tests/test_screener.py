@@ -0,0 +1,78 @@
+"""
+選股器測試 - 驗證條件解析與全市場向量化評估
+"""
+
+from datetime import date
+
+import pytest
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.price_sync import sync_price_projections
+from app.screener import parse_filter, screen
+
+
+@pytest.fixture
+def market(app):
+    ids = [
+        # 緩步上漲，最後一天爆量
+        add_stock_with_prices("1101", "台泥", [10 + i * 0.1 for i in range(30)]).id,
+        # 持續下跌，最後一天跌停
+        add_stock_with_prices("2330", "台積電", [100 - i for i in range(29)] + [65]).id,
+        # 整理
+        add_stock_with_prices("2317", "鴻海", [50] * 30).id,
+    ]
+    db.session.execute(
+        db.text(
+            "UPDATE stock_prices SET volume = 100000 "
+            "WHERE trade_date = :day AND stock_id = :stock_id"
+        ),
+        {"day": date(2025, 7, 1), "stock_id": ids[0]},
+    )
+    sync_price_projections(ids)
+    db.session.commit()
+    return ids
+
+
+def test_parse_filter_terms():
+    conditions = parse_filter("close > sma50 AND volume > 3x volume_sma20 and change_pct < -5")
+    assert [c.op for c in conditions] == [">", ">", "<"]
+    assert conditions[1].right.scale == 3.0
+    assert conditions[1].right.field == "volume"
+    assert conditions[1].right.period == 20
+    assert conditions[2].right.constant == -5.0
+
+    for bad in ("", "close >", "close ~ 5", "foo > 1", "sma999 > 1", "magic_sma5 > 1"):
+        with pytest.raises(ValueError):
+            parse_filter(bad)
+
+
+def test_screen_trend_volume_and_change(market):
+    trade_date, matches = screen("close > sma20")
+    assert trade_date == "2025-07-01"
+    assert [m["symbol"] for m in matches] == ["1101"]
+
+    _, matches = screen("volume > 3 * volume_sma20")
+    assert [m["symbol"] for m in matches] == ["1101"]
+
+    _, matches = screen("change_percentage < -5")
+    assert [m["symbol"] for m in matches] == ["2330"]
+    assert matches[0]["values"]["change_percentage"] == pytest.approx(-9.72, abs=0.01)
+
+
+def test_screen_as_of_date_and_sort(market):
+    trade_date, matches = screen("close > 0", as_of=date(2025, 6, 10), sort="close")
+    assert trade_date == "2025-06-10"
+    assert [m["symbol"] for m in matches] == ["2330", "2317", "1101"]
+
+
+def test_screener_endpoint_paginates(market, client, auth_headers):
+    response = client.get(
+        "/api/stocks/screener?filter=close>0&per_page=2&page=2", headers=auth_headers
+    )
+    data = response.get_json()
+    assert data["pagination"]["total"] == 3
+    assert [s["symbol"] for s in data["stocks"]] == ["2330"]
+
+    response = client.get("/api/stocks/screener?filter=close>>1", headers=auth_headers)
+    assert response.status_code == 400
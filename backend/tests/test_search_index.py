@@ -0,0 +1,97 @@
+"""
+股票搜尋索引測試 - 驗證中文名稱 n-gram 比對、排序與匯入後重建
+"""
+
+from conftest import add_stock_with_prices
+
+from app.extensions import db
+from app.models import Stock
+from app.price_sync import sync_price_projections
+from app.search_index import stock_search_index
+
+
+def _symbols(stocks):
+    return [stock["symbol"] for stock in stocks]
+
+
+def _add_stocks():
+    for symbol, name, exchange in (
+        ("1101", "台泥", "TWSE"),
+        ("1102", "亞泥", "TWSE"),
+        ("2330", "台積電", "TWSE"),
+        ("23301", "台積電購01", "TWSE"),
+        ("3330", "台積測試", "TPEx"),
+        ("6233", "旺玖", "TPEx"),
+    ):
+        db.session.add(Stock(symbol=symbol, name=name, exchange=exchange, market_type="上市"))
+    db.session.commit()
+
+
+def test_ranks_exact_symbol_then_prefix_then_name(app):
+    _add_stocks()
+
+    assert _symbols(stock_search_index.search("2330")) == ["2330", "23301"]
+    assert _symbols(stock_search_index.search("233")) == ["2330", "23301", "6233"]
+    assert _symbols(stock_search_index.search("台積")) == ["2330", "23301", "3330"]
+    assert _symbols(stock_search_index.search("泥")) == ["1101", "1102"]
+    assert _symbols(stock_search_index.search("台積電", exchange="TPEx")) == []
+    assert _symbols(stock_search_index.search("２３３０")) == ["2330", "23301"]
+    assert stock_search_index.search("台灣") == []
+
+
+def test_index_rebuilt_after_import(app):
+    _add_stocks()
+    assert stock_search_index.search("鴻海") == []
+
+    stock = add_stock_with_prices("2317", "鴻海", [100, 101])
+    sync_price_projections([stock.id])
+    db.session.commit()
+    assert _symbols(stock_search_index.search("鴻海")) == ["2317"]
+
+
+def test_index_detects_changes_from_other_processes(app):
+    _add_stocks()
+    stock_search_index.search("台")
+
+    # 模擬其他行程新增股票：不經過 sync_price_projections，等待檢查間隔後重建
+    db.session.add(Stock(symbol="2317", name="鴻海", exchange="TWSE"))
+    db.session.commit()
+    assert stock_search_index.search("鴻海") == []
+
+    app.config["SEARCH_INDEX_CHECK_SECONDS"] = 0
+    assert _symbols(stock_search_index.search("鴻海")) == ["2317"]
+
+
+def test_search_endpoints_use_ranked_index(app, client, auth_headers):
+    _add_stocks()
+
+    data = client.get("/api/stocks/search?q=2330", headers=auth_headers).get_json()
+    assert _symbols(data["stocks"]) == ["2330", "23301"]
+
+    data = client.get("/api/stocks?search=台積&per_page=2&page=2", headers=auth_headers).get_json()
+    assert _symbols(data["stocks"]) == ["3330"]
+    assert data["pagination"]["total"] == 3
+    assert data["pagination"]["has_prev"] is True
+
+    # page、per_page 小於 1 時與 paginate(error_out=False) 一樣視為 1
+    data = client.get("/api/stocks?search=11&page=0&per_page=0", headers=auth_headers).get_json()
+    assert _symbols(data["stocks"]) == ["1101"]
+    assert data["pagination"]["page"] == 1
+    assert data["pagination"]["has_next"] is True
+
+    for limit in (0, -1):
+        data = client.get(f"/api/stocks/search?q=2330&limit={limit}", headers=auth_headers)
+        assert data.get_json()["stocks"] == []
+
+
+def test_limit_keeps_rank_order_on_large_universe(app):
+    db.session.add_all(
+        Stock(symbol=f"{9000 + i}", name=f"測試股份{i}號", exchange="TWSE") for i in range(2000)
+    )
+    db.session.add(Stock(symbol="8888", name="9123概念", exchange="TWSE"))
+    db.session.commit()
+
+    # 代號完全相符 > 代號開頭相符 > 名稱開頭相符，取滿 limit 即停止
+    assert _symbols(stock_search_index.search("912", limit=3)) == ["9120", "9121", "9122"]
+    assert _symbols(stock_search_index.search("9123", limit=3)) == ["9123", "8888"]
+    assert stock_search_index.search("912", limit=0) == []
@@ -0,0 +1,457 @@
+"""
+股票 API 測試 - 驗證列表類端點以固定查詢次數讀取最新報價及統計摘要
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from conftest import add_stock_with_prices
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import (
+    LatestQuote,
+    StockPrice,
+    StockPriceRollup,
+    StockStatistics,
+    User,
+    UserStock,
+)
+from app.price_sync import sync_price_projections
+
+
+class QueryCounter:
+    """計算區塊內送出的 SQL 數量"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, *args, **kwargs):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def test_latest_quote_refresh_tracks_newest_trade_date(app):
+    """刷新後 latest_quotes 每支股票只保留最新交易日"""
+    first = add_stock_with_prices("1101", "台泥", [30, 31, 32])
+    second = add_stock_with_prices("2330", "台積電", [1000, 990])
+    sync_price_projections([first.id, second.id])
+    db.session.commit()
+
+    quotes = {quote.stock_id: quote for quote in LatestQuote.query.all()}
+    assert len(quotes) == 2
+    assert float(quotes[first.id].close_price) == 32
+    assert float(quotes[second.id].close_price) == 990
+    assert quotes[second.id].change_percentage == -1.0
+
+    add_stock_with_prices("2317", "鴻海", [100])
+    sync_price_projections([first.id])
+    db.session.commit()
+    assert LatestQuote.query.count() == 2
+
+
+def test_stock_list_query_count_is_constant(app, client, auth_headers):
+    """列表端點的查詢數量不隨資料列數增加"""
+    ids = [
+        add_stock_with_prices(f"{1100 + i}", f"股票{i}", [10 + i, 11 + i]).id for i in range(15)
+    ]
+    sync_price_projections(ids)
+    db.session.commit()
+
+    with QueryCounter(db.engine) as small:
+        response = client.get("/api/stocks?per_page=5", headers=auth_headers)
+    assert response.status_code == 200
+
+    with QueryCounter(db.engine) as large:
+        response = client.get("/api/stocks?per_page=15", headers=auth_headers)
+    data = response.get_json()
+
+    assert len(data["stocks"]) == 15
+    assert data["stocks"][0]["latest_price"]["close_price"] == 11
+    assert small.count == large.count
+
+
+def test_realtime_reads_latest_quote(app, client, auth_headers):
+    stock = add_stock_with_prices("1101", "台泥", [30, 33])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    data = client.get("/api/stocks/1101/realtime", headers=auth_headers).get_json()
+    assert data["price"] == 33
+    assert data["change_percent"] == 10.0
+
+
+def test_batch_quotes_in_one_query(app, client, auth_headers):
+    """多支股票的報價以單一查詢取得，依請求順序回傳"""
+    ids = [
+        add_stock_with_prices(f"{1101 + i}", f"股票{i}", [10 + i, 11 + i]).id for i in range(20)
+    ]
+    add_stock_with_prices("9999", "無報價", [])
+    sync_price_projections(ids)
+    db.session.commit()
+
+    symbols = ",".join(f"{1120 - i}" for i in range(20))
+    with QueryCounter(db.engine) as counter:
+        response = client.get(
+            f"/api/stocks/quotes?symbols={symbols},9999,0000,1120", headers=auth_headers
+        )
+    assert counter.count == 2
+
+    data = response.get_json()
+    assert [quote["symbol"] for quote in data["quotes"]] == [f"{1120 - i}" for i in range(20)]
+    assert data["quotes"][0]["price"] == 30.0
+    assert data["missing"] == ["9999", "0000"]
+
+    response = client.get("/api/stocks/quotes?symbols=", headers=auth_headers)
+    assert response.status_code == 400
+    too_many = ",".join(str(i) for i in range(101))
+    response = client.get(f"/api/stocks/quotes?symbols={too_many}", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_watchlist_returns_previous_close_in_one_query(app, client, auth_headers):
+    """關注清單以單一查詢回傳最新價、前一交易日收盤價與當日區間"""
+    user = User.query.filter_by(username="tester").first()
+    for symbol, closes in (("1101", [30, 31, 29.5]), ("2330", [1000]), ("2317", [])):
+        stock = add_stock_with_prices(symbol, f"股票{symbol}", closes)
+        db.session.add(UserStock(user_id=user.id, stock_id=stock.id))
+    db.session.commit()
+
+    with QueryCounter(db.engine) as counter:
+        data = client.get("/api/stocks/user", headers=auth_headers).get_json()
+
+    stocks = {stock["symbol"]: stock for stock in data["user_stocks"]}
+    assert data["count"] == 3
+    assert stocks["1101"]["latest_price"]["close_price"] == 29.5
+    assert stocks["1101"]["previous_close"] == 31
+    assert stocks["1101"]["day_range"] == {"high": 30.5, "low": 28.5}
+    assert stocks["2330"]["previous_close"] == 1000
+    assert "latest_price" not in stocks["2317"]
+    # token 驗證查詢用戶一次，關注清單一次
+    assert counter.count == 2
+
+
+def test_history_returns_requested_range(app, client, auth_headers):
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32, 33, 34])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    data = client.get(
+        "/api/stocks/1101/history?start_date=2025-06-03&end_date=2025-06-05",
+        headers=auth_headers,
+    ).get_json()
+    assert data["count"] == 3
+    assert [row["close_price"] for row in data["history"]] == [31.0, 32.0, 33.0]
+
+
+def test_history_downsamples_instead_of_truncating(app, client, auth_headers):
+    """超過 max_points 時以 LTTB 降採樣，保留整段區間的頭尾"""
+    stock = add_stock_with_prices("1101", "台泥", [30 + (i % 7) for i in range(600)])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    data = client.get(
+        "/api/stocks/1101/history?start_date=2025-06-02&end_date=2027-12-31&max_points=100",
+        headers=auth_headers,
+    ).get_json()
+    assert data["count"] == 100
+    assert data["total_points"] == 600
+    assert data["downsampled"] is True
+    assert data["history"][0]["trade_date"] == "2025-06-02"
+    assert data["history"][-1]["trade_date"] == "2027-01-22"
+
+    response = client.get("/api/stocks/1101/history?resolution=year", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_rollups_refresh_incrementally(app, client, auth_headers):
+    """新交易日只重算所在的週與月，結果與整段重算一致"""
+    stock = add_stock_with_prices("1101", "台泥", [10, 11, 12, 13, 14, 15, 16, 17, 18, 19])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    # 2025-06-12 起再新增 40 個交易日，跨越月份
+    previous = Decimal(19)
+    for offset in range(40):
+        close = Decimal(20 + offset % 3)
+        db.session.add(
+            StockPrice(
+                stock_id=stock.id,
+                trade_date=date(2025, 6, 12) + timedelta(days=offset),
+                open_price=close,
+                high_price=close + 1,
+                low_price=close - 1,
+                close_price=close,
+                change_amount=close - previous,
+                volume=100,
+            )
+        )
+        previous = close
+    db.session.flush()
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    def snapshot():
+        return [
+            rollup.to_dict() | {"id": None}
+            for rollup in StockPriceRollup.query.order_by(
+                StockPriceRollup.resolution, StockPriceRollup.period_start
+            )
+        ]
+
+    incremental = snapshot()
+    StockPriceRollup.query.delete()
+    StockPriceRollup.refresh({stock.id: date(2025, 6, 2)})
+    db.session.commit()
+    assert snapshot() == incremental
+
+    # 2025-06-01 為週日，只會是月 K 線的起始日
+    june = next(row for row in incremental if row["trade_date"] == "2025-06-01")
+    assert june["open_price"] == 10.0
+    assert june["trade_days"] == 29
+    assert june["change_amount"] == june["close_price"] - 10.0
+
+    data = client.get(
+        "/api/stocks/1101/history?resolution=week&start_date=2025-06-04&end_date=2025-06-15",
+        headers=auth_headers,
+    ).get_json()
+    assert [row["trade_date"] for row in data["history"]] == ["2025-06-02", "2025-06-09"]
+    assert data["history"][0]["close_price"] == 16.0
+    assert data["history"][0]["volume"] == sum(1000 * (i + 1) for i in range(7))
+
+
+def test_indicators_endpoint(app, client, auth_headers):
+    stock = add_stock_with_prices("1101", "台泥", [30 + (i % 5) for i in range(40)])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    response = client.get(
+        "/api/stocks/1101/indicators?set=sma5,rsi14&days=3650", headers=auth_headers
+    )
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["count"] == 40
+    assert data["indicators"]["sma5"][:4] == [None] * 4
+    assert data["indicators"]["sma5"][4] == 32.0
+
+    response = client.get("/api/stocks/1101/indicators?set=wma5", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_statistics_merge_new_and_backfilled_prices(app):
+    """增量併入新交易日與補匯入的舊交易日，結果與整段重算一致"""
+    stock = add_stock_with_prices("2330", "台積電", [100, 104, 102], start=date(2024, 6, 3))
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    # 一年後的新交易日，以及補匯入的更早交易日
+    for trade_date, close in ((date(2025, 6, 10), 90), (date(2024, 5, 1), 120)):
+        db.session.add(
+            StockPrice(
+                stock_id=stock.id,
+                trade_date=trade_date,
+                close_price=Decimal(close),
+                high_price=Decimal(close + 1),
+                low_price=Decimal(close - 1),
+            )
+        )
+    db.session.flush()
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    incremental = StockStatistics.query.get(stock.id).to_dict()
+    assert incremental == {
+        "total_records": 5,
+        "first_date": "2024-05-01",
+        "last_date": "2025-06-10",
+        "average_price": 103.2,
+        "highest_price": 121.0,
+        "lowest_price": 89.0,
+        "high_52w": 91.0,
+        "low_52w": 89.0,
+    }
+
+    StockStatistics.refresh([stock.id], full=True)
+    db.session.commit()
+    assert StockStatistics.query.get(stock.id).to_dict() == incremental
+
+
+def test_detail_reads_statistics_row(app, client, auth_headers):
+    """詳情頁以主鍵讀取統計摘要，不再彙總整段歷史"""
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    with QueryCounter(db.engine) as counter:
+        response = client.get("/api/stocks/1101", headers=auth_headers)
+    statistics = response.get_json()["statistics"]
+    assert statistics["total_records"] == 3
+    assert statistics["average_price"] == 31.0
+    assert statistics["first_date"] == "2025-06-02"
+    assert not any("stock_prices" in sql for sql in counter.statements)
+
+
+def test_market_statistics_cached_until_prices_change(app, client, auth_headers):
+    """市場統計在資料版本不變時直接回傳快取，匯入後重新計算"""
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    data = client.get("/api/stocks/statistics", headers=auth_headers).get_json()
+    assert data["total_stocks"] == 1
+    assert data["total_price_records"] == 3
+    assert data["latest_update"] == "2025-06-04"
+
+    with QueryCounter(db.engine) as counter:
+        client.get("/api/stocks/statistics", headers=auth_headers)
+    assert not any("stock_prices" in sql or "GROUP BY" in sql for sql in counter.statements)
+
+    other = add_stock_with_prices("2330", "台積電", [1000, 990, 995, 1005])
+    sync_price_projections([other.id])
+    db.session.commit()
+
+    data = client.get("/api/stocks/statistics", headers=auth_headers).get_json()
+    assert data["total_stocks"] == 2
+    assert data["total_price_records"] == 7
+    assert data["latest_update"] == "2025-06-05"
+
+
+def test_stock_list_keyset_pagination(app, client, auth_headers):
+    """游標分頁依代號接續，不發出 COUNT 或 OFFSET"""
+    for i in range(5):
+        add_stock_with_prices(f"{1101 + i}", f"股票{i}", [10 + i])
+    sync_price_projections()
+    db.session.commit()
+
+    symbols, after = [], ""
+    while after is not None:
+        with QueryCounter(db.engine) as counter:
+            response = client.get(f"/api/stocks?after={after}&per_page=2", headers=auth_headers)
+        # 驗證用戶 + 一次 keyset 查詢，每頁成本固定
+        assert counter.count == 2
+        assert not any("count(" in sql.lower() for sql in counter.statements)
+        if after:
+            assert "stocks.symbol >" in counter.statements[-1]
+        data = response.get_json()
+        symbols.extend(stock["symbol"] for stock in data["stocks"])
+        assert data["pagination"]["total"] is None
+        after = data["pagination"]["next_cursor"]
+    assert symbols == ["1101", "1102", "1103", "1104", "1105"]
+
+    data = client.get("/api/stocks?after=&per_page=2&include_total=1", headers=auth_headers)
+    data = data.get_json()
+    assert data["pagination"]["total"] == 5
+    assert data["stocks"][0]["latest_price"]["close_price"] == 10.0
+
+    data = client.get("/api/stocks?after=&search=股票&per_page=4", headers=auth_headers)
+    data = data.get_json()
+    next_page = client.get(
+        f"/api/stocks?after={data['pagination']['next_cursor']}&search=股票&per_page=4",
+        headers=auth_headers,
+    ).get_json()
+    assert [stock["symbol"] for stock in next_page["stocks"]] == ["1105"]
+    assert next_page["pagination"]["has_next"] is False
+
+    response = client.get("/api/stocks?after=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+    # per_page 小於 1 時視為 1
+    for per_page in (0, -1):
+        data = client.get(f"/api/stocks?after=&per_page={per_page}", headers=auth_headers)
+        data = data.get_json()
+        assert [stock["symbol"] for stock in data["stocks"]] == ["1101"]
+        assert data["pagination"]["per_page"] == 1
+        assert data["pagination"]["has_next"] is True
+
+
+def test_conditional_get_returns_304_until_next_import(app, client, auth_headers):
+    """ETag 未變時回傳 304 且不執行查詢主體，匯入新交易日後重新產生"""
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32])
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    url = "/api/stocks/1101/history?start_date=2025-06-01&end_date=2025-06-30"
+    first = client.get(url, headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    with QueryCounter(db.engine) as counter:
+        cached = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+    # 驗證用戶 + 股票與最新報價
+    assert counter.count == 2
+
+    other = client.get(url + "&resolution=week", headers=auth_headers)
+    assert other.headers["ETag"] != etag
+
+    response = client.get(
+        url, headers={**auth_headers, "If-Modified-Since": first.headers["Last-Modified"]}
+    )
+    assert response.status_code == 304
+
+    for path in ("/api/stocks/1101", "/api/stocks/1101/realtime", "/api/stocks/statistics"):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200
+        revalidated = client.get(
+            path, headers={**auth_headers, "If-None-Match": response.headers["ETag"]}
+        )
+        assert revalidated.status_code == 304
+
+    db.session.add(StockPrice(stock_id=stock.id, trade_date=date(2025, 6, 5), close_price=33))
+    db.session.flush()
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    refreshed = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()["count"] == 4
+    assert refreshed.headers["ETag"] != etag
+
+
+def test_relative_window_revalidates_on_next_day(app, client, auth_headers, monkeypatch):
+    """以天數指定的區間隔天移動，即使沒有新的匯入也不回傳 304"""
+    today = date.today()
+    stock = add_stock_with_prices("1101", "台泥", [30, 31, 32, 33, 34], start=today - timedelta(5))
+    sync_price_projections([stock.id])
+    db.session.commit()
+
+    url = "/api/stocks/1101/indicators?days=3&set=sma20"
+    first = client.get(url, headers=auth_headers)
+    assert first.get_json()["count"] == 3
+
+    class Tomorrow(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=1)
+
+    monkeypatch.setattr("app.blueprints.stocks.datetime", Tomorrow)
+    monkeypatch.setattr("app.http_cache.datetime", Tomorrow)
+    for header in ("If-None-Match", "If-Modified-Since"):
+        key = "ETag" if header == "If-None-Match" else "Last-Modified"
+        response = client.get(url, headers={**auth_headers, header: first.headers[key]})
+        assert response.status_code == 200
+        assert response.get_json()["count"] == 2
+
+    # 股票名稱等資料修改後，If-Modified-Since 也需重新驗證
+    monkeypatch.undo()
+    realtime = client.get("/api/stocks/1101/realtime", headers=auth_headers)
+    stock.name = "台灣水泥"
+    stock.updated_at = datetime.utcnow() + timedelta(minutes=1)
+    db.session.commit()
+    response = client.get(
+        "/api/stocks/1101/realtime",
+        headers={**auth_headers, "If-Modified-Since": realtime.headers["Last-Modified"]},
+    )
+    assert response.status_code == 200
+    assert response.get_json()["name"] == "台灣水泥"
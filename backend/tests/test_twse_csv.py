@@ -0,0 +1,61 @@
+"""
+欄式 CSV 解析測試 - 驗證證交所日成交資訊的特殊格式，並與逐列解析的結果比對
+"""
+
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.twse_csv import parse_daily_trades, to_price_rows
+from scripts.import_stock_data_v2 import parse_price_rows, read_price_rows
+
+HEADER = "證券代號,證券名稱,日期,成交股數,成交金額,開盤價,最高價,最低價,收盤價,漲跌價差,成交筆數\n"
+SAMPLE_DIRECTORY = Path(__file__).resolve().parent.parent / "個股日成交資訊 2"
+
+
+def test_parses_twse_formats():
+    content = (
+        "\ufeff"
+        + HEADER
+        + '1101,台泥,20250602,93266178,2614023899,29.05,29.05,27.65,"1,027.70",-1.65,"37,802"\n'
+        + "1101,台泥,20250604,105846758,2839185698,27.00,27.45,26.55,27.00,+0.15,35133\n"
+        + "1101,台泥,20250605,429,20592,--,--,--,--, 0.00,4\n"
+        + "1101,台泥,20250618,16833,809666,48.00,48.25,48.00,48.25,X0.00,19\n"
+        + "1101,台泥,20250231,1,1,1,1,1,1,0,1\n"  # 不存在的日期
+        + "小計,,,,,,,,,,\n"
+    ).encode("utf-8")
+    columns = parse_daily_trades(content)
+
+    assert columns["trade_date"].tolist() == [
+        date(2025, 6, 2),
+        date(2025, 6, 4),
+        date(2025, 6, 5),
+        date(2025, 6, 18),
+    ]
+    np.testing.assert_array_equal(columns["close_price"], [1027.70, 27.00, np.nan, 48.25])
+    np.testing.assert_array_equal(columns["change_amount"], [-1.65, 0.15, 0.0, np.nan])
+    assert columns["transaction_count"].tolist() == [37802, 35133, 4, 19]
+
+    rows = to_price_rows(columns, stock_id=7)
+    assert rows[0]["volume"] == 93266178 and isinstance(rows[0]["volume"], int)
+    assert rows[2]["open_price"] is None and rows[2]["stock_id"] == 7
+    assert rows[3]["change_amount"] is None
+
+
+def test_requires_date_column():
+    with pytest.raises(ValueError):
+        parse_daily_trades("收盤價\n1\n")
+    assert to_price_rows(parse_daily_trades(HEADER)) == []
+
+
+def test_matches_row_wise_parser():
+    files = sorted(SAMPLE_DIRECTORY.glob("*/*.csv"))[:200]
+    if not files:
+        pytest.skip("範例資料目錄不存在")
+    for path in files:
+        assert to_price_rows(parse_daily_trades(path.read_bytes())) == read_price_rows(path)
+
+    content = HEADER + '1101,台泥,20250602,"1,000",2,3,4,5,"1,006",+1,7\n'
+    assert to_price_rows(parse_daily_trades(content)) == parse_price_rows(content.splitlines())